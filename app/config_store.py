@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import os
+import stat
+import tempfile
+import threading
 from copy import deepcopy
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
@@ -137,32 +143,131 @@ def generate_rules_from_stations(
     return normalized
 
 
-def load_rules_from_file(path: Path) -> dict[str, Any]:
-    if not path.exists():
-        return deepcopy(DEFAULT_RULES)
+@dataclass
+class _CachedRules:
+    stat_key: tuple[int, int, int]
+    digest: str
+    rules: dict[str, Any]
+    version: int
+
+
+_RULES_CACHE: dict[Path, _CachedRules] = {}
+_RULES_CACHE_LOCK = threading.Lock()
+_RULES_VERSION = 0
 
+
+def _next_rules_version() -> int:
+    global _RULES_VERSION
+    _RULES_VERSION += 1
+    return _RULES_VERSION
+
+
+def _stat_key(path: Path) -> tuple[int, int, int] | None:
     try:
-        raw = json.loads(path.read_text(encoding="utf-8"))
-    except (OSError, json.JSONDecodeError):
-        return deepcopy(DEFAULT_RULES)
+        stat = path.stat()
+    except OSError:
+        return None
+    # st_ino changes on every atomic replace, even within one mtime tick.
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
 
+
+def _parse_rules(content: bytes) -> dict[str, Any]:
+    try:
+        raw = json.loads(content.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return deepcopy(DEFAULT_RULES)
     return normalize_rules(raw if isinstance(raw, dict) else None)
 
 
+def _cached_rules(path: Path) -> _CachedRules | None:
+    key = path.resolve()
+    stat_key = _stat_key(path)
+    if stat_key is None:
+        with _RULES_CACHE_LOCK:
+            _RULES_CACHE.pop(key, None)
+        return None
+
+    with _RULES_CACHE_LOCK:
+        cached = _RULES_CACHE.get(key)
+        if cached is not None and cached.stat_key == stat_key:
+            return cached
+
+        try:
+            content = path.read_bytes()
+        except OSError:
+            return None
+        digest = hashlib.sha256(content).hexdigest()
+        if cached is not None and cached.digest == digest:
+            # Touched or rewritten with identical content: keep the version.
+            cached.stat_key = stat_key
+            return cached
+
+        cached = _CachedRules(stat_key, digest, _parse_rules(content), _next_rules_version())
+        _RULES_CACHE[key] = cached
+        return cached
+
+
+def load_rules_from_file(path: Path) -> dict[str, Any]:
+    # The normalized rules are cached per file and shared between callers, so the
+    # result must be treated as read-only.
+    cached = _cached_rules(path)
+    if cached is None:
+        return deepcopy(DEFAULT_RULES)
+    return cached.rules
+
+
+def rules_version(path: Path) -> int:
+    cached = _cached_rules(path)
+    return 0 if cached is None else cached.version
+
+
 def load_or_generate_rules(path: Path, stations: list[dict[str, Any]]) -> dict[str, Any]:
     if path.exists():
         return load_rules_from_file(path)
 
     generated = generate_rules_from_stations(stations, DEFAULT_RULES)
-    save_rules_to_file(path, generated)
-    return generated
+    return save_rules_to_file(path, generated)
+
+
+def _file_mode(path: Path) -> int:
+    # mkstemp creates 0600 files; keep the target's mode, or what open() would give.
+    try:
+        return stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
 
 
 def save_rules_to_file(path: Path, rules: dict[str, Any]) -> dict[str, Any]:
     normalized = normalize_rules(rules)
+    content = (json.dumps(normalized, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(
-        json.dumps(normalized, ensure_ascii=False, indent=2) + "\n",
-        encoding="utf-8",
-    )
+
+    # Write a sibling temp file and rename it over the target so readers in this
+    # or any other worker see either the old or the new file, never a partial one.
+    handle, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.chmod(temp_name, _file_mode(path))
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+
+    stat_key = _stat_key(path)
+    if stat_key is not None:
+        with _RULES_CACHE_LOCK:
+            _RULES_CACHE[path.resolve()] = _CachedRules(
+                stat_key,
+                hashlib.sha256(content).hexdigest(),
+                normalized,
+                _next_rules_version(),
+            )
     return normalized
@@ -1,7 +1,16 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+from typing import Any, Iterable, Iterator, TypeVar
+
+from app.metrics import record_stage, stage
+from app.pool import ConnectionPool, get_connection_pool
+from app.streaming import drain_iterables
+
+T = TypeVar("T")
 
 
 def month_range(year: int, month: int, day_start_hour: int = 9) -> tuple[datetime, datetime]:
@@ -23,13 +32,133 @@ def _import_pyodbc():
     return pyodbc
 
 
+def prefetch(iterable: Iterable[T], depth: int = 2) -> Iterator[T]:
+    return drain_iterables([iterable], depth, "record-prefetch")
+
+
+def merge_concurrently(iterables: list[Iterable[T]], depth: int = 2) -> Iterator[T]:
+    # Used to fetch the partitions of one query over separate pooled connections.
+    if len(iterables) == 1:
+        return iter(iterables[0])
+    return drain_iterables(iterables, depth, "record-partition")
+
+
+def partition_range(
+    start: datetime, end: datetime, partitions: int
+) -> list[tuple[datetime, datetime]]:
+    # Cut on whole days from `start` so a hydro day (and every slot in it) falls
+    # into exactly one window when start is a day boundary.
+    days = max((end - start).days, 1)
+    partitions = max(1, min(partitions, days))
+    step = -(-days // partitions)
+    windows: list[tuple[datetime, datetime]] = []
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + timedelta(days=step), end)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows or [(start, end)]
+
+
+_SHOWPLAN_NS = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+_SEEK_OPERATORS = ("Index Seek", "Clustered Index Seek")
+
+
+def summarize_showplan(plan_xml: str) -> dict[str, Any]:
+    root = ElementTree.fromstring(plan_xml)
+    statements = [
+        {
+            "text": (statement.get("StatementText") or "").strip(),
+            "estimated_rows": float(statement.get("StatementEstRows") or 0),
+            "subtree_cost": float(statement.get("StatementSubTreeCost") or 0),
+        }
+        for statement in root.iter(f"{_SHOWPLAN_NS}StmtSimple")
+    ]
+    operators: list[dict[str, Any]] = []
+    for rel_op in root.iter(f"{_SHOWPLAN_NS}RelOp"):
+        # The accessed object sits one level down, e.g. RelOp/IndexScan/Object.
+        target = None
+        for child in rel_op:
+            target = child.find(f"{_SHOWPLAN_NS}Object")
+            if target is not None:
+                break
+        table = index = None
+        if target is not None:
+            table = target.get("Table", "").strip("[]") or None
+            index = target.get("Index", "").strip("[]") or None
+        operators.append(
+            {
+                "physical_op": rel_op.get("PhysicalOp"),
+                "logical_op": rel_op.get("LogicalOp"),
+                "estimated_rows": float(rel_op.get("EstimateRows") or 0),
+                "table": table,
+                "index": index,
+            }
+        )
+    return {
+        "statements": statements,
+        "operators": operators,
+        "index_seek": any(op["physical_op"] in _SEEK_OPERATORS for op in operators),
+    }
+
+
+def _open_connection(connection_string: str):
+    pyodbc = _import_pyodbc()
+    return pyodbc.connect(connection_string)
+
+
+def sqlserver_pool(connection_string: str, **options: Any) -> ConnectionPool:
+    return get_connection_pool(
+        connection_string, lambda: _open_connection(connection_string), **options
+    )
+
+
+RECORD_QUERY_STRATEGIES = ("sargable", "trim")
+
+
 class SQLServerRepository:
-    def __init__(self, connection_string: str):
+    def __init__(
+        self,
+        connection_string: str,
+        pool: ConnectionPool | None = None,
+        query_strategy: str = "sargable",
+        partitions: int = 1,
+    ):
+        if query_strategy not in RECORD_QUERY_STRATEGIES:
+            raise ValueError(
+                f"query_strategy must be one of {RECORD_QUERY_STRATEGIES}, got {query_strategy!r}"
+            )
         self.connection_string = connection_string
+        self.pool = pool or sqlserver_pool(connection_string)
+        self.query_strategy = query_strategy
+        self.partitions = max(1, partitions)
+
+    def _sourcetype_predicate(self, column: str) -> str:
+        if self.query_strategy == "trim":
+            return f"LTRIM(RTRIM({column})) = ?"
+        # `=` ignores trailing blanks, so padded CHAR values still match; the cast
+        # stops pyodbc's NVARCHAR parameter from forcing a conversion of the column,
+        # which would turn the index seek back into a scan.
+        return f"{column} = CAST(? AS VARCHAR(64))"
+
+    def _record_query(self) -> str:
+        return f"""
+            SELECT
+                LTRIM(RTRIM(stationid)) AS station_id,
+                datatime
+            FROM dbo.OneDayData
+            WHERE datatime >= ?
+              AND datatime < ?
+              AND datatime IS NOT NULL
+              AND {self._sourcetype_predicate("Sourcetype")}
+        """
 
-    def _connect(self):
-        pyodbc = _import_pyodbc()
-        return pyodbc.connect(self.connection_string)
+    @contextmanager
+    def _connect(self) -> Iterator[Any]:
+        started = time.perf_counter()
+        with self.pool.connection() as conn:
+            record_stage("db_connect", time.perf_counter() - started)
+            yield conn
 
     def fetch_stations(self) -> list[dict[str, Any]]:
         query = """
@@ -41,10 +170,11 @@ class SQLServerRepository:
             ORDER BY StationID
         """
 
-        with self._connect() as conn:
+        with stage("fetch_stations") as timing, self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute(query)
             rows = cursor.fetchall()
+            timing.rows = len(rows)
 
         stations: list[dict[str, Any]] = []
         for row in rows:
@@ -57,34 +187,179 @@ class SQLServerRepository:
             )
         return stations
 
+    def probe_stations(self) -> tuple[int, int]:
+        query = """
+            SELECT
+                COUNT_BIG(*) AS station_count,
+                COALESCE(CHECKSUM_AGG(BINARY_CHECKSUM(StationID, Cname, Ctype)), 0) AS station_checksum
+            FROM dbo.Stations
+        """
+
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            row = cursor.fetchone()
+        return int(row.station_count), int(row.station_checksum)
+
+    def _iter_window_batches(
+        self,
+        start: datetime,
+        end: datetime,
+        sourcetype_filter: str,
+        batch_size: int,
+    ) -> Iterator[list[tuple[str, datetime]]]:
+        # Only time spent in the driver counts; time the consumer holds a batch
+        # between yields does not.
+        elapsed = 0.0
+        row_count = 0
+        try:
+            with self._connect() as conn:
+                started = time.perf_counter()
+                cursor = conn.cursor()
+                cursor.arraysize = batch_size
+                cursor.execute(self._record_query(), start, end, sourcetype_filter)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    elapsed += time.perf_counter() - started
+                    if not rows:
+                        break
+                    row_count += len(rows)
+                    yield [(row[0] or "", row[1]) for row in rows]
+                    started = time.perf_counter()
+        finally:
+            record_stage("fetch_records", elapsed, row_count)
+
+    def iter_record_batches(
+        self,
+        start: datetime,
+        end: datetime,
+        sourcetype_filter: str,
+        batch_size: int = 5000,
+    ) -> Iterator[list[tuple[str, datetime]]]:
+        # With partitions > 1 each sub-window runs on its own pooled connection and
+        # batches arrive in completion order, not time order.
+        windows = partition_range(start, end, self.partitions)
+        yield from merge_concurrently(
+            [
+                self._iter_window_batches(window_start, window_end, sourcetype_filter, batch_size)
+                for window_start, window_end in windows
+            ]
+        )
+
     def fetch_records(
         self,
         start: datetime,
         end: datetime,
         sourcetype_filter: str,
     ) -> list[dict[str, Any]]:
+        records: list[dict[str, Any]] = []
+        for batch in self.iter_record_batches(start, end, sourcetype_filter):
+            for station_id, data_time in batch:
+                records.append({"station_id": station_id, "datatime": data_time})
+        return records
+
+    def fetch_slot_counts(
+        self,
+        start: datetime,
+        end: datetime,
+        sourcetype_filter: str,
+        station_expected: dict[str, int],
+        day_start_hour: int,
+    ) -> list[dict[str, Any]]:
+        create_table = """
+            CREATE TABLE #station_expected (
+                station_id VARCHAR(64) COLLATE DATABASE_DEFAULT NOT NULL PRIMARY KEY,
+                expected_per_day INT NOT NULL
+            )
+        """
+        drop_table = "IF OBJECT_ID('tempdb..#station_expected') IS NOT NULL DROP TABLE #station_expected"
+        insert_row = "INSERT INTO #station_expected (station_id, expected_per_day) VALUES (?, ?)"
+        # Same math as report_logic.slot_index: shift by day_start_hour, bucket the
+        # minute of the hydro day with integer division, count distinct slots per day.
         query = """
             SELECT
-                RTRIM(stationid) AS station_id,
-                datatime
-            FROM dbo.OneDayData
-            WHERE datatime >= ?
-              AND datatime < ?
-              AND datatime IS NOT NULL
-              AND LTRIM(RTRIM(Sourcetype)) = ?
-        """
+                slots.station_id,
+                slots.hydro_day,
+                COUNT(*) AS actual
+            FROM (
+                SELECT DISTINCT
+                    e.station_id,
+                    DAY(DATEADD(HOUR, -?, d.datatime)) AS hydro_day,
+                    (DATEPART(HOUR, DATEADD(HOUR, -?, d.datatime)) * 60 + DATEPART(MINUTE, d.datatime))
+                        * e.expected_per_day / 1440 AS slot
+                FROM dbo.OneDayData AS d
+                INNER JOIN #station_expected AS e
+                    ON e.station_id = LTRIM(RTRIM(d.stationid))
+                WHERE d.datatime >= ?
+                  AND d.datatime < ?
+                  AND d.datatime IS NOT NULL
+                  AND {sourcetype_predicate}
+            ) AS slots
+            GROUP BY slots.station_id, slots.hydro_day
+        """.format(sourcetype_predicate=self._sourcetype_predicate("d.Sourcetype"))
 
-        with self._connect() as conn:
+        params = [
+            (station_id, expected_per_day)
+            for station_id, expected_per_day in station_expected.items()
+            if station_id and expected_per_day > 0
+        ]
+        if not params:
+            return []
+
+        with stage("fetch_slot_counts") as timing, self._connect() as conn:
             cursor = conn.cursor()
-            cursor.execute(query, start, end, sourcetype_filter)
+            cursor.execute(drop_table)
+            cursor.execute(create_table)
+            cursor.fast_executemany = True
+            cursor.executemany(insert_row, params)
+            cursor.execute(
+                query, day_start_hour, day_start_hour, start, end, sourcetype_filter
+            )
             rows = cursor.fetchall()
+            cursor.execute(drop_table)
+            timing.rows = len(rows)
 
-        records: list[dict[str, Any]] = []
+        counts: list[dict[str, Any]] = []
         for row in rows:
-            records.append(
+            counts.append(
                 {
                     "station_id": (row.station_id or "").strip(),
-                    "datatime": row.datatime,
+                    "day": int(row.hydro_day),
+                    "actual": int(row.actual),
                 }
             )
-        return records
+        return counts
+
+    def explain_record_query(
+        self, start: datetime, end: datetime, sourcetype_filter: str
+    ) -> dict[str, Any]:
+        windows = partition_range(start, end, self.partitions)
+        plans: list[dict[str, Any]] = []
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            # SHOWPLAN_XML compiles the statement and returns the estimated plan
+            # without executing it.
+            cursor.execute("SET SHOWPLAN_XML ON")
+            try:
+                for window_start, window_end in windows:
+                    cursor.execute(self._record_query(), window_start, window_end, sourcetype_filter)
+                    plan_xml = cursor.fetchone()[0]
+                    plans.append(
+                        {
+                            "start": window_start.isoformat(),
+                            "end": window_end.isoformat(),
+                            **summarize_showplan(plan_xml),
+                        }
+                    )
+            finally:
+                cursor.execute("SET SHOWPLAN_XML OFF")
+
+        return {
+            "query_strategy": self.query_strategy,
+            "partitions": len(windows),
+            "index_seek": all(plan["index_seek"] for plan in plans),
+            "estimated_rows": sum(
+                plan["statements"][0]["estimated_rows"] for plan in plans if plan["statements"]
+            ),
+            "windows": plans,
+        }
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Callable
+
+from app.report_logic import SlotAggregator, minute_slot_table
+
+DRILLDOWN_MAX_DAYS = 92
+
+
+@lru_cache(maxsize=None)
+def slot_minute_windows(reports_per_day: int) -> tuple[tuple[int, int], ...]:
+    # [start, end) minutes of each slot within the hydro day, read off the same
+    # minute -> slot table the aggregation uses. Slots no minute maps to (rates
+    # above one per minute) get an empty window.
+    table = minute_slot_table(reports_per_day)
+    starts = [1440] * reports_per_day
+    for minute in range(1439, -1, -1):
+        starts[table[minute]] = minute
+    windows = []
+    for slot in range(reports_per_day):
+        end = 1440 if slot == reports_per_day - 1 else starts[slot + 1]
+        windows.append((min(starts[slot], end), end))
+    return tuple(windows)
+
+
+def _slot_entries(
+    slots: list[int], windows: tuple[tuple[int, int], ...], day_start: datetime
+) -> list[dict[str, Any]]:
+    return [
+        {
+            "slot": slot,
+            "start": (day_start + timedelta(minutes=windows[slot][0])).isoformat(),
+            "end": (day_start + timedelta(minutes=windows[slot][1])).isoformat(),
+        }
+        for slot in slots
+    ]
+
+
+def station_day_slots(aggregator: SlotAggregator, station_id: str, day: date) -> dict[str, Any]:
+    # `day` is a hydro day of the aggregator's month; it starts at day_start_hour.
+    expected = aggregator.station_expected_per_day[station_id]
+    windows = slot_minute_windows(expected)
+    present = [slot for slot in aggregator.slots.slots(station_id, day.day) if slot < expected]
+    present_set = set(present)
+    missing = [slot for slot in range(expected) if slot not in present_set]
+    day_start = datetime(day.year, day.month, day.day, aggregator.day_start_hour)
+    return {
+        "date": day.isoformat(),
+        "expected": expected,
+        "actual": len(present),
+        "present": _slot_entries(present, windows, day_start),
+        "missing": _slot_entries(missing, windows, day_start),
+    }
+
+
+@dataclass
+class IndexedMonth:
+    aggregator: SlotAggregator
+    indexed_at: datetime
+
+
+class SlotDrilldownIndex:
+    # Slot bitmaps kept from report aggregation, keyed like the incremental store
+    # plus the rules fingerprint, so drill-downs never re-read raw rows. The
+    # incremental store hands over a copy after each refresh.
+    def __init__(self, max_months: int = 6, now: Callable[[], datetime] = datetime.now):
+        self.max_months = max_months
+        self._now = now
+        self._months: OrderedDict[tuple[int, int, str, str], IndexedMonth] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def put(
+        self, sourcetype_filter: str, rules_fingerprint: str, aggregator: SlotAggregator
+    ) -> IndexedMonth:
+        key = (aggregator.year, aggregator.month, sourcetype_filter, rules_fingerprint)
+        indexed = IndexedMonth(aggregator, self._now())
+        with self._lock:
+            self._months[key] = indexed
+            self._months.move_to_end(key)
+            while len(self._months) > self.max_months:
+                self._months.popitem(last=False)
+        return indexed
+
+    def get(
+        self, year: int, month: int, sourcetype_filter: str, rules_fingerprint: str
+    ) -> IndexedMonth | None:
+        with self._lock:
+            indexed = self._months.get((year, month, sourcetype_filter, rules_fingerprint))
+            if indexed is None:
+                self._misses += 1
+                return None
+            self._months.move_to_end((year, month, sourcetype_filter, rules_fingerprint))
+            self._hits += 1
+            return indexed
+
+    def invalidate(self, year: int | None = None, month: int | None = None) -> int:
+        with self._lock:
+            keys = [
+                key
+                for key in self._months
+                if (year is None or key[0] == year) and (month is None or key[1] == month)
+            ]
+            for key in keys:
+                del self._months[key]
+        return len(keys)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            items = list(self._months.items())
+            hits, misses = self._hits, self._misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "months": [
+                {
+                    "year": year,
+                    "month": month,
+                    "sourcetype_filter": sourcetype_filter,
+                    "stations": len(indexed.aggregator.station_expected_per_day),
+                    "bytes": indexed.aggregator.slots.words.itemsize
+                    * len(indexed.aggregator.slots.words),
+                    "indexed_at": indexed.indexed_at.isoformat(timespec="seconds"),
+                }
+                for (year, month, sourcetype_filter, _), indexed in items
+            ],
+        }
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import csv
+import io
+import zipfile
+from typing import Any, Callable, Iterator
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from app.metrics import stage
+from app.streaming import drain_producers
+
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+EXPORT_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+SHEET_TITLE = "月到报统计"
+CHUNK_SIZE = 64 * 1024
+PARQUET_ROW_GROUP_SIZE = 1000
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def parquet_available() -> bool:
+    return _import_pyarrow() is not None
+
+
+def _require_pyarrow():
+    pyarrow = _import_pyarrow()
+    if pyarrow is None:
+        raise RuntimeError(
+            "pyarrow is required for parquet export. Please run `uv sync --extra parquet`."
+        )
+    return pyarrow
+
+
+def report_header(report: dict[str, Any]) -> list[str]:
+    return [
+        "站名",
+        *[str(day) for day in report["day_headers"]],
+        "应到报",
+        "实到报",
+        "到报率(%)",
+    ]
+
+
+def report_rows(report: dict[str, Any]) -> Iterator[list[Any]]:
+    for row in report["rows"]:
+        yield [
+            row["station_name"],
+            *row["daily_actual"],
+            row["expected_total"],
+            row["actual_total"],
+            row["rate"],
+        ]
+
+
+class _ChunkSink:
+    # Write-only file object: zipfile and pyarrow fall back to sequential writes
+    # when the target cannot seek, so everything written is final and can be sent.
+    def __init__(self, emit: Callable[[bytes], None], chunk_size: int):
+        self._emit = emit
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        data = memoryview(data).cast("B")
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= self._chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._emit(bytes(self._buffer))
+            self._buffer.clear()
+
+    def tell(self) -> int:
+        return self._position
+
+    def seekable(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+
+def stream_writer(
+    write: Callable[[_ChunkSink], None], chunk_size: int = CHUNK_SIZE, depth: int = 4
+) -> Iterator[bytes]:
+    # Runs a push-style writer on a background thread and hands its output over as
+    # chunks; the bounded queue keeps at most `depth` chunks in memory.
+    def produce(emit: Callable[[bytes], None]) -> None:
+        sink = _ChunkSink(emit, chunk_size)
+        write(sink)
+        sink.close()
+
+    return drain_producers([produce], depth, "report-export")
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "</Types>"
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets>'
+    "</workbook>"
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    "</Relationships>"
+)
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+_XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<dimension ref="A1:{last_cell}"/><sheetData>'
+)
+_XLSX_SHEET_TAIL = "</sheetData></worksheet>"
+XLSX_ROWS_PER_WRITE = 500
+
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(row_number: int, values: list[Any], columns: list[str]) -> str:
+    cells = []
+    for column, value in zip(columns, values):
+        ref = f"{column}{row_number}"
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            # Control characters are not allowed in XML even when escaped.
+            text = escape(ILLEGAL_CHARACTERS_RE.sub("", "" if value is None else str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{text}</t></is></c>')
+        else:
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+    return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+
+def _write_xlsx(report: dict[str, Any], sink: _ChunkSink) -> None:
+    # The sheet XML goes straight into a zip entry as rows are formatted, so the
+    # first bytes leave before the last row exists and no cell objects are kept.
+    # zipfile writes data descriptors because the sink cannot seek.
+    header = report_header(report)
+    columns = [_column_letter(index) for index in range(len(header))]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK.format(title=escape(SHEET_TITLE)))
+        archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        archive.writestr("xl/styles.xml", _XLSX_STYLES)
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            last_cell = f"{columns[-1]}{len(report['rows']) + 1}"
+            sheet.write(_XLSX_SHEET_HEAD.format(last_cell=last_cell).encode("utf-8"))
+            pending = [_xlsx_row(1, header, columns)]
+            for row_number, values in enumerate(report_rows(report), start=2):
+                pending.append(_xlsx_row(row_number, values, columns))
+                if len(pending) >= XLSX_ROWS_PER_WRITE:
+                    sheet.write("".join(pending).encode("utf-8"))
+                    pending.clear()
+            pending.append(_XLSX_SHEET_TAIL)
+            sheet.write("".join(pending).encode("utf-8"))
+
+
+def _write_csv(report: dict[str, Any], sink: _ChunkSink) -> None:
+    text = io.StringIO()
+    writer = csv.writer(text)
+    # BOM so Excel opens the Chinese headers as UTF-8.
+    sink.write("\ufeff".encode("utf-8"))
+    for row in (report_header(report), *report_rows(report)):
+        writer.writerow(row)
+        if text.tell() >= CHUNK_SIZE:
+            sink.write(text.getvalue().encode("utf-8"))
+            text.seek(0)
+            text.truncate()
+    sink.write(text.getvalue().encode("utf-8"))
+
+
+def _parquet_schema(pyarrow, report: dict[str, Any]):
+    return pyarrow.schema(
+        [
+            ("station_id", pyarrow.string()),
+            ("station_name", pyarrow.string()),
+            ("ctype", pyarrow.string()),
+            ("expected_per_day", pyarrow.int64()),
+            *[(f"day_{day:02d}", pyarrow.int64()) for day in report["day_headers"]],
+            ("expected_total", pyarrow.int64()),
+            ("actual_total", pyarrow.int64()),
+            ("rate", pyarrow.float64()),
+        ]
+    )
+
+
+def _write_parquet(report: dict[str, Any], sink: _ChunkSink) -> None:
+    pyarrow = _require_pyarrow()
+    schema = _parquet_schema(pyarrow, report)
+    day_names = [f"day_{day:02d}" for day in report["day_headers"]]
+    rows = report["rows"]
+
+    with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+        for offset in range(0, len(rows), PARQUET_ROW_GROUP_SIZE):
+            group = rows[offset : offset + PARQUET_ROW_GROUP_SIZE]
+            columns: dict[str, list[Any]] = {
+                "station_id": [row["station_id"] for row in group],
+                "station_name": [row["station_name"] for row in group],
+                "ctype": [row["ctype"] for row in group],
+                "expected_per_day": [row["expected_per_day"] for row in group],
+            }
+            for index, name in enumerate(day_names):
+                columns[name] = [row["daily_actual"][index] for row in group]
+            columns["expected_total"] = [row["expected_total"] for row in group]
+            columns["actual_total"] = [row["actual_total"] for row in group]
+            columns["rate"] = [float(row["rate"]) for row in group]
+            writer.write_table(pyarrow.table(columns, schema=schema))
+
+
+_WRITERS = {
+    "xlsx": _write_xlsx,
+    "csv": _write_csv,
+    "parquet": _write_parquet,
+}
+
+
+def iter_report_export(
+    report: dict[str, Any], export_format: str = "xlsx", chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    writer = _WRITERS.get(export_format)
+    if writer is None:
+        raise ValueError(f"export format must be one of {EXPORT_FORMATS}, got {export_format!r}")
+    if export_format == "parquet":
+        _require_pyarrow()
+
+    def write(sink: _ChunkSink) -> None:
+        with stage(f"export_{export_format}", len(report["rows"])):
+            writer(report, sink)
+
+    return stream_writer(write, chunk_size=chunk_size)
+
+
+def build_report_export(report: dict[str, Any], export_format: str = "xlsx") -> bytes:
+    return b"".join(iter_report_export(report, export_format))
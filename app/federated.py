@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Protocol, runtime_checkable
+
+from app.streaming import drain_producers
+
+_SOURCE_DONE = object()
+
+
+@runtime_checkable
+class PartialResultRepository(Protocol):
+    # Repositories that may answer from a subset of their sources.
+    def failed_sources(self) -> dict[str, str]: ...
+
+
+def source_failures(repo: Any) -> dict[str, str]:
+    # Sources that timed out or failed while `repo` served this build. Anything
+    # derived from a partial result must not be cached or persisted.
+    if isinstance(repo, PartialResultRepository):
+        return repo.failed_sources()
+    return {}
+
+
+@dataclass(frozen=True)
+class ReportSource:
+    name: str
+    repository: Any
+    # Prepended to station ids, for basins whose station numbers overlap.
+    prefix: str = ""
+
+
+class FederatedRepository:
+    # RepositoryProtocol over several databases (one per basin). Every call fans
+    # out to all sources concurrently; a source that fails or misses the
+    # deadline is recorded in `failures` and left out, so the report is built
+    # from the sources that answered. Only when every source fails is the error
+    # raised. One instance serves one report build, like SQLServerRepository.
+    def __init__(self, sources: list[ReportSource], timeout: float = 60.0):
+        if not sources:
+            raise ValueError("at least one report source is required")
+        names = [source.name for source in sources]
+        if len(set(names)) != len(names):
+            raise ValueError(f"report source names must be unique, got {names}")
+        self.sources = sources
+        self.timeout = timeout
+        self.failures: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _fail(self, name: str, reason: str) -> None:
+        with self._lock:
+            self.failures.setdefault(name, reason)
+
+    def failed_sources(self) -> dict[str, str]:
+        with self._lock:
+            return dict(self.failures)
+
+    def source_status(self) -> list[dict[str, Any]]:
+        failures = self.failed_sources()
+        return [
+            {
+                "name": source.name,
+                "ok": source.name not in failures,
+                "error": failures.get(source.name),
+            }
+            for source in self.sources
+        ]
+
+    def _gather(
+        self, call: Callable[[ReportSource], Any], record: bool = True
+    ) -> list[tuple[ReportSource, Any]]:
+        # Timed-out calls keep running on their own thread until the database
+        # returns; the caller does not wait for them.
+        executor = ThreadPoolExecutor(
+            max_workers=len(self.sources), thread_name_prefix="report-source"
+        )
+        try:
+            futures = {
+                executor.submit(contextvars.copy_context().run, call, source): source
+                for source in self.sources
+            }
+            done, _ = wait(futures, timeout=self.timeout)
+        finally:
+            executor.shutdown(wait=False)
+
+        results: list[tuple[ReportSource, Any]] = []
+        errors: list[BaseException] = []
+        for future, source in futures.items():
+            if future not in done:
+                if record:
+                    self._fail(source.name, f"timed out after {self.timeout:g}s")
+                continue
+            exc = future.exception()
+            if exc is not None:
+                errors.append(exc)
+                if record:
+                    self._fail(source.name, f"{type(exc).__name__}: {exc}")
+                continue
+            results.append((source, future.result()))
+        if not results and record:
+            if errors:
+                raise errors[0]
+            raise TimeoutError(f"no report source answered within {self.timeout:g}s")
+        return results
+
+    def fetch_stations(self) -> list[dict[str, Any]]:
+        stations: list[dict[str, Any]] = []
+        for source, rows in self._gather(lambda source: source.repository.fetch_stations()):
+            for station in rows:
+                station_id = str(station.get("station_id") or "").strip()
+                stations.append(
+                    {**station, "station_id": source.prefix + station_id, "source": source.name}
+                )
+        return stations
+
+    def probe_stations(self) -> Any:
+        # Any source without a probe (or not answering) forces a full reload.
+        def probe(source: ReportSource) -> Any:
+            probe_stations = getattr(source.repository, "probe_stations", None)
+            return probe_stations() if probe_stations is not None else None
+
+        probes = self._gather(probe, record=False)
+        if len(probes) != len(self.sources) or any(probe is None for _, probe in probes):
+            return None
+        return tuple(sorted((source.name, probe) for source, probe in probes))
+
+    def fetch_records(self, start, end, sourcetype_filter: str) -> list[dict[str, Any]]:
+        records: list[dict[str, Any]] = []
+        for source, rows in self._gather(
+            lambda source: source.repository.fetch_records(start, end, sourcetype_filter)
+        ):
+            if not source.prefix:
+                records.extend(rows)
+                continue
+            for record in rows:
+                station_id = str(record.get("station_id") or "").strip()
+                records.append({**record, "station_id": source.prefix + station_id})
+        return records
+
+    def iter_record_batches(
+        self, start, end, sourcetype_filter: str, batch_size: int = 5000
+    ) -> Iterator[list[tuple[str, Any]]]:
+        # Sources stream side by side into one bounded queue; a source that sends
+        # no batch for `timeout` seconds is cut off and marked as timed out.
+        def producer(source: ReportSource) -> Callable[[Callable[[Any], None]], None]:
+            def produce(emit: Callable[[Any], None]) -> None:
+                batches = None
+                try:
+                    batches = iter(
+                        source.repository.iter_record_batches(
+                            start, end, sourcetype_filter, batch_size=batch_size
+                        )
+                    )
+                    for batch in batches:
+                        emit((source, batch))
+                    emit((source, _SOURCE_DONE))
+                except Exception as exc:
+                    emit((source, exc))
+                finally:
+                    close = getattr(batches, "close", None)
+                    if close is not None:
+                        close()
+
+            return produce
+
+        delivered = False
+        errors: list[Exception] = []
+
+        def idle(index: int) -> None:
+            self._fail(self.sources[index].name, f"timed out after {self.timeout:g}s")
+
+        items = drain_producers(
+            [producer(source) for source in self.sources],
+            depth=2,
+            name="report-source",
+            idle_timeout=self.timeout,
+            on_idle=idle,
+            join=False,
+        )
+        try:
+            for source, item in items:
+                if item is _SOURCE_DONE:
+                    delivered = True
+                    continue
+                if isinstance(item, Exception):
+                    errors.append(item)
+                    self._fail(source.name, f"{type(item).__name__}: {item}")
+                    continue
+                delivered = True
+                if source.prefix:
+                    item = [
+                        (source.prefix + station_id, data_time) for station_id, data_time in item
+                    ]
+                yield item
+        finally:
+            items.close()
+        if not delivered and len(self.failed_sources()) == len(self.sources):
+            if errors:
+                raise errors[0]
+            raise TimeoutError(f"no report source answered within {self.timeout:g}s")
+
+    def fetch_slot_counts(
+        self,
+        start,
+        end,
+        sourcetype_filter: str,
+        station_expected: dict[str, int],
+        day_start_hour: int,
+    ) -> list[dict[str, Any]]:
+        def fetch(source: ReportSource) -> list[dict[str, Any]]:
+            expected = station_expected
+            if source.prefix:
+                expected = {
+                    station_id.removeprefix(source.prefix): per_day
+                    for station_id, per_day in station_expected.items()
+                    if station_id.startswith(source.prefix)
+                }
+            return source.repository.fetch_slot_counts(
+                start, end, sourcetype_filter, expected, day_start_hour
+            )
+
+        counts: list[dict[str, Any]] = []
+        for source, rows in self._gather(fetch):
+            counts.extend(
+                {**row, "station_id": source.prefix + str(row.get("station_id") or "").strip()}
+                for row in rows
+            )
+        return counts
+
+    def explain_record_query(self, start, end, sourcetype_filter: str) -> dict[str, Any]:
+        plans = self._gather(
+            lambda source: source.repository.explain_record_query(start, end, sourcetype_filter),
+            record=False,
+        )
+        return {
+            "sources": {source.name: plan for source, plan in plans},
+            "unavailable": sorted(
+                {source.name for source in self.sources} - {source.name for source, _ in plans}
+            ),
+        }
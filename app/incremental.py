@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from app.db import month_range, prefetch
+from app.report_logic import (
+    CompiledRules,
+    SlotAggregator,
+    build_monthly_report_from_aggregator,
+    resolve_station_expected,
+    stations_fingerprint,
+)
+
+
+@dataclass
+class IncrementalMonthState:
+    rules_hash: str
+    stations_hash: str
+    aggregator: SlotAggregator
+    watermark: datetime | None = None
+    refreshes: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class IncrementalReportStore:
+    def __init__(
+        self,
+        overlap_minutes: float = 10.0,
+        max_months: int = 2,
+        batch_size: int = 5000,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self.overlap = timedelta(minutes=overlap_minutes)
+        self.max_months = max_months
+        self.batch_size = batch_size
+        self._now = now
+        self._states: OrderedDict[tuple[int, int, str], IncrementalMonthState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state_for(
+        self,
+        key: tuple[int, int, str],
+        rules: CompiledRules,
+        stations: list[dict[str, Any]],
+        stations_hash: str,
+        full: bool,
+    ) -> IncrementalMonthState:
+        year, month, _ = key
+        with self._lock:
+            state = self._states.get(key)
+            stale = (
+                state is None
+                or full
+                or state.rules_hash != rules.fingerprint
+                or state.stations_hash != stations_hash
+            )
+            if stale:
+                aggregator = SlotAggregator(
+                    resolve_station_expected(stations, rules), year, month, rules.day_start_hour
+                )
+                state = IncrementalMonthState(rules.fingerprint, stations_hash, aggregator)
+                self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_months:
+                self._states.popitem(last=False)
+            return state
+
+    def refresh(
+        self,
+        repo: Any,
+        stations: list[dict[str, Any]],
+        rules: CompiledRules,
+        sourcetype_filter: str,
+        year: int,
+        month: int,
+        aggregation: str = "python",
+        full: bool = False,
+        slot_sink: Callable[[SlotAggregator], None] | None = None,
+    ) -> dict[str, Any]:
+        stations_hash = stations_fingerprint(stations)
+        state = self._state_for(
+            (year, month, sourcetype_filter), rules, stations, stations_hash, full
+        )
+
+        with state.lock:
+            start, end = month_range(year, month, day_start_hour=rules.day_start_hour)
+            if state.watermark is not None:
+                start = max(start, state.watermark - self.overlap)
+
+            aggregator = state.aggregator
+            fetched_at = self._now()
+            if aggregation == "stream":
+                batches = repo.iter_record_batches(
+                    start, end, sourcetype_filter, batch_size=self.batch_size
+                )
+                for batch in prefetch(batches):
+                    aggregator.add_batch(batch)
+            else:
+                aggregator.add_records(repo.fetch_records(start, end, sourcetype_filter))
+
+            # A future-dated row (clock skew at a station) must not move the
+            # watermark past rows that have not arrived yet.
+            if aggregator.max_data_time is not None:
+                state.watermark = min(aggregator.max_data_time, fetched_at)
+            state.refreshes += 1
+            if slot_sink is not None:
+                # The drill-down index gets a copy; the store keeps adding to its own.
+                slot_sink(aggregator.copy())
+            return build_monthly_report_from_aggregator(stations, aggregator, rules)
+
+    def invalidate(self, year: int | None = None, month: int | None = None) -> int:
+        with self._lock:
+            keys = [
+                key
+                for key in self._states
+                if (year is None or key[0] == year) and (month is None or key[1] == month)
+            ]
+            for key in keys:
+                del self._states[key]
+        return len(keys)
+
+    def stats(self) -> list[dict[str, Any]]:
+        with self._lock:
+            items = list(self._states.items())
+        return [
+            {
+                "year": year,
+                "month": month,
+                "sourcetype_filter": sourcetype_filter,
+                "watermark": state.watermark.isoformat() if state.watermark else None,
+                "refreshes": state.refreshes,
+                "rows_seen": state.aggregator.rows_seen,
+            }
+            for (year, month, sourcetype_filter), state in items
+        ]
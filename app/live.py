@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Callable
+
+from app.federated import source_failures
+from app.metrics import stage
+from app.report_logic import (
+    CompiledRules,
+    minute_slot_table,
+    resolve_station_expected,
+    stations_fingerprint,
+)
+from app.responses import encode_json
+
+# (repository, stations, compiled rules, sourcetype filter) for one poll.
+LiveSource = Callable[[], tuple[Any, list[dict[str, Any]], CompiledRules, str]]
+
+
+def hydro_day_of(moment: datetime, day_start_hour: int) -> date:
+    return (moment - timedelta(hours=day_start_hour)).date()
+
+
+@dataclass
+class LiveDayState:
+    key: tuple[Any, ...]
+    hydro_day: date
+    day_start: datetime
+    station_expected: dict[str, int]
+    station_names: dict[str, str]
+    present: dict[str, set[int]] = field(default_factory=dict)
+    watermark: datetime | None = None
+
+    def add(self, station_id: str, data_time: Any, now: datetime) -> int | None:
+        # Returns the slot when this row is the first arrival in it. The watermark
+        # never passes `now`, so a future-dated row cannot hide later arrivals.
+        expected = self.station_expected.get(station_id)
+        if expected is None or not isinstance(data_time, datetime):
+            return None
+        watermark = min(data_time, now)
+        if self.watermark is None or watermark > self.watermark:
+            self.watermark = watermark
+        minutes = (data_time - self.day_start).total_seconds() // 60
+        if not 0 <= minutes < 1440:
+            return None
+        slot = minute_slot_table(expected)[int(minutes)]
+        slots = self.present.setdefault(station_id, set())
+        if slot in slots:
+            return None
+        slots.add(slot)
+        return slot
+
+    def snapshot(self, now: datetime) -> dict[str, Any]:
+        return {
+            "hydro_day": self.hydro_day.isoformat(),
+            "day_start": self.day_start.isoformat(),
+            "day_end": (self.day_start + timedelta(days=1)).isoformat(),
+            "now": now.isoformat(timespec="seconds"),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "stations": [
+                {
+                    "station_id": station_id,
+                    "station_name": self.station_names[station_id],
+                    "expected_per_day": expected,
+                    "present": sorted(self.present.get(station_id, ())),
+                }
+                for station_id, expected in self.station_expected.items()
+            ],
+        }
+
+
+class LiveSubscriber:
+    # One connected client. Events are handed over from the poller thread via
+    # the client's event loop; a client too slow to drain its queue is marked
+    # as lagging and gets a fresh snapshot instead of the events it missed.
+    def __init__(self, monitor: LiveArrivalMonitor, max_queue: int):
+        self.monitor = monitor
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[tuple[str, dict[str, Any]]] = asyncio.Queue(max_queue)
+        self.lagging = False
+
+    def offer(self, event: str, data: dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            self.lagging = True
+
+    async def next(self) -> tuple[str, dict[str, Any]]:
+        if self.lagging:
+            self.lagging = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            snapshot = self.monitor.snapshot()
+            if snapshot is not None:
+                return "snapshot", snapshot
+        return await self.queue.get()
+
+
+class LiveArrivalMonitor:
+    # One poller per worker process, however many clients are connected: it
+    # reads only rows newer than its watermark (minus an overlap for late rows)
+    # within the current hydro day and fans the newly filled slots out to all
+    # subscribers. The thread runs while anyone is subscribed.
+    def __init__(
+        self,
+        source: LiveSource,
+        poll_seconds: float = 30.0,
+        overlap_minutes: float = 10.0,
+        batch_size: int = 5000,
+        max_queue: int = 256,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self._source = source
+        self.poll_seconds = poll_seconds
+        self.overlap = timedelta(minutes=overlap_minutes)
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._now = now
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subscribers: set[LiveSubscriber] = set()
+        self._state: LiveDayState | None = None
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self._polls = 0
+        self._rows = 0
+        self._last_poll: datetime | None = None
+        self._last_error: str | None = None
+
+    def snapshot(self) -> dict[str, Any] | None:
+        with self._lock:
+            if self._state is None:
+                return None
+            return self._state.snapshot(self._now())
+
+    def subscribe(self) -> LiveSubscriber:
+        # Called on the client's event loop.
+        subscriber = LiveSubscriber(self, self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._state is not None:
+                subscriber.offer("snapshot", self._state.snapshot(self._now()))
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._loop, name="live-poller", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: LiveSubscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._wake.set()
+
+    def _broadcast(self, event: str, data: dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event, data)
+            except RuntimeError:
+                # The client's loop is gone; its stream cleanup unsubscribes it.
+                continue
+
+    def poll_once(self) -> int:
+        repo, stations, rules, sourcetype_filter = self._source()
+        now = self._now()
+        hydro_day = hydro_day_of(now, rules.day_start_hour)
+        key = (hydro_day, sourcetype_filter, rules.fingerprint, stations_fingerprint(stations))
+
+        with self._lock:
+            state = self._state
+        reset = state is None or state.key != key
+        if reset:
+            station_expected = resolve_station_expected(stations, rules)
+            names = {
+                str(item.get("station_id") or "").strip(): str(item.get("cname") or "").strip()
+                for item in stations
+            }
+            state = LiveDayState(
+                key,
+                hydro_day,
+                datetime(hydro_day.year, hydro_day.month, hydro_day.day, rules.day_start_hour),
+                station_expected,
+                {
+                    station_id: names.get(station_id) or station_id
+                    for station_id in station_expected
+                },
+            )
+
+        previous_watermark = state.watermark
+        start = state.day_start
+        if previous_watermark is not None:
+            start = max(start, previous_watermark - self.overlap)
+        arrivals: list[tuple[str, int]] = []
+        with stage("live_poll") as timing:
+            rows = 0
+            for batch in repo.iter_record_batches(
+                start, state.day_start + timedelta(days=1), sourcetype_filter, self.batch_size
+            ):
+                rows += len(batch)
+                with self._lock:
+                    for station_id, data_time in batch:
+                        slot = state.add(station_id, data_time, now)
+                        if slot is not None:
+                            arrivals.append((station_id, slot))
+            timing.rows = rows
+        if source_failures(repo):
+            # Read the window again next time; slots already seen are not resent.
+            state.watermark = previous_watermark
+
+        with self._lock:
+            self._state = state
+            self._polls += 1
+            self._rows += rows
+            self._last_poll = now
+        if reset:
+            self._broadcast("snapshot", state.snapshot(now))
+        elif arrivals:
+            self._broadcast(
+                "arrivals",
+                {
+                    "hydro_day": hydro_day.isoformat(),
+                    "now": now.isoformat(timespec="seconds"),
+                    "watermark": state.watermark.isoformat() if state.watermark else None,
+                    "arrivals": arrivals,
+                },
+            )
+        return len(arrivals)
+
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                if self._stopping or not self._subscribers:
+                    self._thread = None
+                    return
+                self._wake.clear()
+            try:
+                self.poll_once()
+                self._last_error = None
+            except Exception as exc:
+                self._last_error = f"{type(exc).__name__}: {exc}"
+            self._wake.wait(self.poll_seconds)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            state = self._state
+            last_poll = self._last_poll
+            stats = {
+                "subscribers": len(self._subscribers),
+                "running": self._thread is not None,
+                "poll_seconds": self.poll_seconds,
+                "polls": self._polls,
+                "rows": self._rows,
+                "last_error": self._last_error,
+            }
+        stats["last_poll"] = last_poll.isoformat(timespec="seconds") if last_poll else None
+        stats["hydro_day"] = state.hydro_day.isoformat() if state else None
+        stats["watermark"] = state.watermark.isoformat() if state and state.watermark else None
+        return stats
+
+
+def format_event(event: str, data: dict[str, Any]) -> bytes:
+    return b"event: " + event.encode("ascii") + b"\ndata: " + encode_json(data) + b"\n\n"
+
+
+async def live_events(
+    monitor: LiveArrivalMonitor, heartbeat_seconds: float = 15.0
+) -> AsyncIterator[bytes]:
+    # Server-Sent Events stream; the comment lines keep proxies from closing an
+    # idle connection between polls.
+    subscriber = monitor.subscribe()
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            try:
+                event, data = await asyncio.wait_for(subscriber.next(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            yield format_event(event, data)
+    finally:
+        monitor.unsubscribe(subscriber)
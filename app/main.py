@@ -1,11 +1,18 @@
 from __future__ import annotations
 
-import io
+import contextvars
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from functools import partial
 from pathlib import Path
-from typing import Any, Callable
+from typing import Any, AsyncIterator, Callable, Iterator
 
 from fastapi import Body, FastAPI, HTTPException, Query, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -13,100 +20,769 @@ from app.config_store import (
     generate_rules_from_stations,
     load_or_generate_rules,
     load_rules_from_file,
+    rules_version,
     save_rules_to_file,
 )
-from app.db import SQLServerRepository, month_range
-from app.report_logic import build_monthly_report, resolve_day_start_hour
-from app.settings import SETTINGS, build_sqlserver_connection_string
+from app.db import SQLServerRepository, month_range, prefetch, sqlserver_pool
+from app.drilldown import (
+    DRILLDOWN_MAX_DAYS,
+    IndexedMonth,
+    SlotDrilldownIndex,
+    station_day_slots,
+)
+from app.export import EXPORT_MEDIA_TYPES, iter_report_export, parquet_available
+from app.federated import FederatedRepository, ReportSource, source_failures
+from app.incremental import IncrementalReportStore
+from app.live import LiveArrivalMonitor, live_events
+from app.metrics import (
+    RequestMetricsMiddleware,
+    StageTimer,
+    collect_stages,
+    configure_metrics,
+    metrics_enabled,
+    render_metrics,
+    stage,
+)
+from app.mirror import MirrorRepository, RecordMirror
+from app.pool import pool_stats
+from app.report_cache import ReportCache, report_cache_key
+from app.report_logic import (
+    CompiledRules,
+    SlotAggregator,
+    build_monthly_report,
+    build_monthly_report_from_batches,
+    build_monthly_report_from_counts,
+    compile_rules,
+    resolve_day_start_hour,
+    resolve_station_expected,
+    stations_fingerprint,
+    summarize_range_report,
+)
+from app.report_vectorized import (
+    build_monthly_report_columnar,
+    columnar_from_batches,
+    columnar_from_records,
+    numpy_available,
+)
+from app.report_view import (
+    MAX_PAGE_SIZE,
+    REPORT_SORT_KEYS,
+    ReportView,
+    apply_report_view,
+    parse_ctypes,
+)
+from app.responses import (
+    columnar_report,
+    etag_matches,
+    json_response,
+    not_modified,
+)
+from app.rollup import (
+    DailyRollupStore,
+    RollupScheduler,
+    monthly_slot_counts,
+    roll_up_closed_days,
+)
+from app.shared_cache import SharedCache
+from app.settings import (
+    SETTINGS,
+    Settings,
+    build_sqlserver_connection_string,
+    report_source_settings,
+    sqlserver_pool_options,
+)
+from app.singleflight import ReportOverloadedError, SingleFlightScheduler
+from app.station_catalog import StationCatalog
 
 BASE_DIR = Path(__file__).resolve().parent.parent
+REPORT_AGGREGATIONS = ("python", "stream", "sql")
+REPORT_ENGINES = ("python", "numpy")
+REPORT_SORT_PATTERN = f"^(-?({'|'.join(REPORT_SORT_KEYS)}))?$"
 
 
 class RepositoryProtocol:
     def fetch_stations(self) -> list[dict[str, Any]]:
         raise NotImplementedError
 
+    def probe_stations(self) -> Any:
+        raise NotImplementedError
+
     def fetch_records(self, start, end, sourcetype_filter: str) -> list[dict[str, Any]]:
         raise NotImplementedError
 
+    def iter_record_batches(
+        self, start, end, sourcetype_filter: str, batch_size: int = 5000
+    ) -> Iterator[list[tuple[str, Any]]]:
+        raise NotImplementedError
+
+    def fetch_slot_counts(
+        self,
+        start,
+        end,
+        sourcetype_filter: str,
+        station_expected: dict[str, int],
+        day_start_hour: int,
+    ) -> list[dict[str, Any]]:
+        raise NotImplementedError
+
+    def explain_record_query(self, start, end, sourcetype_filter: str) -> dict[str, Any]:
+        raise NotImplementedError
+
+
+def _sqlserver_repository(settings: Settings) -> SQLServerRepository:
+    connection_string = build_sqlserver_connection_string(settings)
+    pool = sqlserver_pool(connection_string, **sqlserver_pool_options(settings))
+    return SQLServerRepository(
+        connection_string,
+        pool=pool,
+        query_strategy=settings.record_query_strategy,
+        partitions=settings.record_query_partitions,
+    )
+
+
+def _default_repository_factory() -> RepositoryProtocol:
+    sources = report_source_settings(SETTINGS)
+    if not sources:
+        return _sqlserver_repository(SETTINGS)
+    return FederatedRepository(
+        [
+            ReportSource(name, _sqlserver_repository(settings), prefix)
+            for name, prefix, settings in sources
+        ],
+        timeout=SETTINGS.db_source_timeout,
+    )
+
+
+def record_mirror_from_settings() -> RecordMirror:
+    return RecordMirror(
+        Path(SETTINGS.mirror_path or (BASE_DIR / "cache" / "onedaydata.sqlite3")),
+        initial_days=SETTINGS.mirror_initial_days,
+        resync_days=SETTINGS.mirror_resync_days,
+        chunk_days=SETTINGS.mirror_chunk_days,
+    )
+
+
+def report_cache_from_settings() -> ReportCache:
+    return ReportCache(
+        Path(SETTINGS.report_cache_path or (BASE_DIR / "cache" / "reports.sqlite3")),
+        max_bytes=SETTINGS.report_cache_max_mb * 1024 * 1024,
+        settle_hours=SETTINGS.report_cache_settle_hours,
+    )
+
+
+def invalidate_cached_reports(
+    year: int | None,
+    month: int | None,
+    report_cache: ReportCache | None,
+    shared_cache: SharedCache | None,
+) -> int:
+    removed = 0
+    if report_cache is not None:
+        removed += report_cache.invalidate(year, month)
+    if shared_cache is not None:
+        # Shared report keys start with "YYYY-MM/"; a month alone matches every year.
+        pattern = (f"{year:04d}" if year is not None else "????") + "-"
+        pattern += f"{month:02d}/*" if month is not None else "*"
+        removed += shared_cache.invalidate("report", pattern=pattern)
+    return removed
+
+
+def synced_months(result: dict[str, Any]) -> list[tuple[int, int]]:
+    # Months whose rows a mirror sync replaced; a hydro month can start on the
+    # previous calendar day.
+    first = datetime.fromisoformat(result["start"]) - timedelta(days=1)
+    last = datetime.fromisoformat(result["until"])
+    return month_span(first.year, first.month, last.year, last.month)
+
+
+def shared_cache_from_settings() -> SharedCache:
+    return SharedCache(
+        Path(SETTINGS.shared_cache_path or (BASE_DIR / "cache" / "shared.sqlite3")),
+        lease_seconds=SETTINGS.shared_lease_seconds,
+        wait_seconds=SETTINGS.shared_build_wait,
+    )
+
+
+def daily_rollups_from_settings() -> DailyRollupStore:
+    return DailyRollupStore(
+        Path(SETTINGS.rollup_path or (BASE_DIR / "cache" / "rollups.sqlite3")),
+        settle_minutes=SETTINGS.rollup_settle_minutes,
+    )
+
+
+def _settled_report_etag(
+    repo: RepositoryProtocol,
+    config_path: Path,
+    year: int,
+    month: int,
+    variant: str,
+    cache: ReportCache | None,
+    catalog: StationCatalog | None = None,
+) -> str | None:
+    # A settled month's report is determined by its cache key inputs and the
+    # stored build, so the tag changes when the entry is invalidated and rebuilt
+    # (e.g. after a backfill). Open or uncached months return None and are
+    # tagged from their content. `variant` names the representation.
+    if cache is None:
+        return None
+    rules, stations = _load_rules_and_stations(repo, config_path, catalog)
+    sourcetype_filter = rules["sourcetype_filter"]
+    rules = compile_rules(rules)
+    if not cache.is_month_closed(year, month, rules.day_start_hour):
+        return None
+    key = report_cache_key(
+        year,
+        month,
+        sourcetype_filter,
+        rules.day_start_hour,
+        rules.fingerprint,
+        stations_fingerprint(stations),
+    )
+    created_at = cache.created_at(key)
+    if created_at is None:
+        return None
+    digest = hashlib.sha256(f"{key}:{created_at!r}:{variant}".encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _run_with_stage_timer(func: Callable[[], Any]) -> tuple[Any, StageTimer]:
+    with collect_stages() as timer:
+        result = func()
+    return result, timer
+
+
+def _fetch_stations(
+    repo: RepositoryProtocol, catalog: StationCatalog | None = None, revalidate: bool = False
+) -> list[dict[str, Any]]:
+    if catalog is None:
+        return repo.fetch_stations()
+    return catalog.get(repo, revalidate=revalidate)
+
+
+def _load_rules_and_stations(
+    repo: RepositoryProtocol, config_path: Path, catalog: StationCatalog | None = None
+) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    with stage("stations"):
+        stations = _fetch_stations(repo, catalog)
+    with stage("rules"):
+        rules = load_or_generate_rules(config_path, stations)
+    return rules, stations
 
-def _default_repository_factory() -> SQLServerRepository:
-    connection_string = build_sqlserver_connection_string(SETTINGS)
-    return SQLServerRepository(connection_string)
 
 def load_or_generate_rules_with_repo(
-    repo: RepositoryProtocol, config_path: Path
+    repo: RepositoryProtocol, config_path: Path, catalog: StationCatalog | None = None
 ) -> dict[str, Any]:
-    stations = repo.fetch_stations()
-    return load_or_generate_rules(config_path, stations)
+    # Stations are only needed when the rules file has to be generated.
+    if config_path.exists():
+        return load_rules_from_file(config_path)
+    return load_or_generate_rules(config_path, _fetch_stations(repo, catalog))
 
 def regenerate_rules_with_repo(
-    repo: RepositoryProtocol, config_path: Path
+    repo: RepositoryProtocol, config_path: Path, catalog: StationCatalog | None = None
 ) -> dict[str, Any]:
-    stations = repo.fetch_stations()
+    stations = _fetch_stations(repo, catalog, revalidate=True)
     base_rules = load_rules_from_file(config_path)
     regenerated = generate_rules_from_stations(stations, base_rules)
     return save_rules_to_file(config_path, regenerated)
 
 
-def _build_report(repo: RepositoryProtocol, config_path: Path, year: int, month: int) -> dict[str, Any]:
-    rules = load_or_generate_rules_with_repo(repo, config_path)
+def _compute_report(
+    repo: RepositoryProtocol,
+    stations: list[dict[str, Any]],
+    rules: CompiledRules,
+    sourcetype_filter: str,
+    year: int,
+    month: int,
+    aggregation: str,
+    engine: str,
+    rollups: DailyRollupStore | None = None,
+    slot_sink: Callable[[SlotAggregator], None] | None = None,
+) -> dict[str, Any]:
+    if rollups is not None:
+        slot_counts = monthly_slot_counts(
+            rollups, repo, stations, rules, sourcetype_filter, year, month
+        )
+        return build_monthly_report_from_counts(stations, slot_counts, year, month, rules)
+
     day_start_hour = resolve_day_start_hour(rules)
     start, end = month_range(year, month, day_start_hour=day_start_hour)
 
-    stations = repo.fetch_stations()
-    records = repo.fetch_records(start, end, rules["sourcetype_filter"])
-    return build_monthly_report(stations, records, year, month, rules)
+    if aggregation == "sql":
+        station_expected = resolve_station_expected(stations, rules)
+        slot_counts = repo.fetch_slot_counts(
+            start, end, sourcetype_filter, station_expected, day_start_hour
+        )
+        return build_monthly_report_from_counts(stations, slot_counts, year, month, rules)
+
+    vectorized = engine == "numpy" and numpy_available()
+
+    if aggregation == "stream":
+        batches = prefetch(
+            repo.iter_record_batches(
+                start, end, sourcetype_filter, batch_size=SETTINGS.record_batch_size
+            )
+        )
+        if vectorized:
+            columns = columnar_from_batches(batches)
+            return build_monthly_report_columnar(stations, columns, year, month, rules)
+        return build_monthly_report_from_batches(
+            stations, batches, year, month, rules, slot_sink
+        )
+
+    records = repo.fetch_records(start, end, sourcetype_filter)
+    if vectorized:
+        columns = columnar_from_records(records)
+        return build_monthly_report_columnar(stations, columns, year, month, rules)
+    return build_monthly_report(stations, records, year, month, rules, slot_sink)
+
+
+def _report_for_month(
+    repo: RepositoryProtocol,
+    stations: list[dict[str, Any]],
+    rules: CompiledRules,
+    sourcetype_filter: str,
+    year: int,
+    month: int,
+    aggregation: str = "python",
+    engine: str = "python",
+    cache: ReportCache | None = None,
+    incremental: IncrementalReportStore | None = None,
+    full_refresh: bool = False,
+    rollups: DailyRollupStore | None = None,
+    slot_sink: Callable[[SlotAggregator], None] | None = None,
+    shared: SharedCache | None = None,
+) -> dict[str, Any]:
+    if shared is not None:
+        # One worker process builds a month while the others wait for and reuse
+        # its result, keyed by the same inputs as the report cache.
+        key = report_cache_key(
+            year,
+            month,
+            sourcetype_filter,
+            rules.day_start_hour,
+            rules.fingerprint,
+            stations_fingerprint(stations),
+        )
+        build = partial(
+            _report_for_month,
+            repo,
+            stations,
+            rules,
+            sourcetype_filter,
+            year,
+            month,
+            aggregation,
+            engine,
+            cache,
+            incremental,
+            full_refresh,
+            rollups,
+            slot_sink,
+        )
+        with stage("shared_cache"):
+            return shared.get_or_build(
+                "report",
+                f"{year:04d}-{month:02d}/{key}",
+                build,
+                SETTINGS.shared_report_ttl,
+                refresh=full_refresh,
+                cacheable=lambda report: not source_failures(repo),
+            )
+
+    cache_key = None
+    if cache is not None and cache.is_month_closed(year, month, rules.day_start_hour):
+        stations_hash = stations_fingerprint(stations)
+        cache_key = report_cache_key(
+            year, month, sourcetype_filter, rules.day_start_hour, rules.fingerprint, stations_hash
+        )
+        with stage("cache_get"):
+            cached = None if full_refresh else cache.get(cache_key)
+        if cached is not None:
+            return cached
+    elif (
+        incremental is not None
+        and aggregation != "sql"
+        and datetime.now() < month_range(year, month, day_start_hour=rules.day_start_hour)[1]
+    ):
+        with stage("incremental_refresh"):
+            report = incremental.refresh(
+                repo,
+                stations,
+                rules,
+                sourcetype_filter,
+                year,
+                month,
+                aggregation,
+                full=full_refresh,
+                slot_sink=slot_sink,
+            )
+        if source_failures(repo):
+            # The watermark moved past rows of the missing sources; start over.
+            incremental.invalidate(year, month)
+        return report
 
+    report = _compute_report(
+        repo,
+        stations,
+        rules,
+        sourcetype_filter,
+        year,
+        month,
+        aggregation,
+        engine,
+        rollups,
+        slot_sink,
+    )
+    if cache_key is not None and not source_failures(repo):
+        with stage("cache_put"):
+            cache.put(cache_key, report, sourcetype_filter, rules.fingerprint, stations_hash)
+    return report
 
-def _build_excel(report: dict[str, Any]) -> bytes:
-    try:
-        from openpyxl import Workbook
-    except ImportError as exc:  # pragma: no cover - runtime dependency
-        raise RuntimeError(
-            "openpyxl is required for export. Please run `uv sync` to install dependencies."
-        ) from exc
 
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "月到报统计"
+def _drilldown_sink(
+    drilldown: SlotDrilldownIndex | None,
+    repo: RepositoryProtocol,
+    sourcetype_filter: str,
+    rules: CompiledRules,
+) -> Callable[[SlotAggregator], None] | None:
+    if drilldown is None:
+        return None
 
-    header = [
-        "站名",
-        *[str(day) for day in report["day_headers"]],
-        "应到报",
-        "实到报",
-        "到报率(%)",
-    ]
-    sheet.append(header)
+    def sink(aggregator: SlotAggregator) -> None:
+        if not source_failures(repo):
+            drilldown.put(sourcetype_filter, rules.fingerprint, aggregator)
 
-    for row in report["rows"]:
-        sheet.append(
-            [
-                row["station_name"],
-                *row["daily_actual"],
-                row["expected_total"],
-                row["actual_total"],
-                row["rate"],
-            ]
+    return sink
+
+
+def _with_source_status(report: dict[str, Any], repo: RepositoryProtocol) -> dict[str, Any]:
+    # Federated builds list each source, so a partial report is visible as such.
+    source_status = getattr(repo, "source_status", None)
+    status = source_status() if source_status is not None else None
+    if status is None:
+        return report
+    return {**report, "partial": not all(item["ok"] for item in status), "sources": status}
+
+
+def _build_report(
+    repo: RepositoryProtocol,
+    config_path: Path,
+    year: int,
+    month: int,
+    aggregation: str = "python",
+    engine: str = "python",
+    cache: ReportCache | None = None,
+    incremental: IncrementalReportStore | None = None,
+    full_refresh: bool = False,
+    catalog: StationCatalog | None = None,
+    rollups: DailyRollupStore | None = None,
+    drilldown: SlotDrilldownIndex | None = None,
+    shared: SharedCache | None = None,
+) -> dict[str, Any]:
+    rules, stations = _load_rules_and_stations(repo, config_path, catalog)
+    sourcetype_filter = rules["sourcetype_filter"]
+    rules = compile_rules(rules)
+    slot_sink = _drilldown_sink(drilldown, repo, sourcetype_filter, rules)
+    report = _report_for_month(
+        repo,
+        stations,
+        rules,
+        sourcetype_filter,
+        year,
+        month,
+        aggregation,
+        engine,
+        cache,
+        incremental,
+        full_refresh,
+        rollups,
+        slot_sink,
+        shared,
+    )
+    return _with_source_status(report, repo)
+
+
+def month_span(
+    start_year: int, start_month: int, end_year: int, end_month: int
+) -> list[tuple[int, int]]:
+    months: list[tuple[int, int]] = []
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _build_range_report(
+    repo: RepositoryProtocol,
+    config_path: Path,
+    months: list[tuple[int, int]],
+    aggregation: str = "python",
+    engine: str = "python",
+    cache: ReportCache | None = None,
+    incremental: IncrementalReportStore | None = None,
+    max_workers: int = 4,
+    catalog: StationCatalog | None = None,
+    rollups: DailyRollupStore | None = None,
+    drilldown: SlotDrilldownIndex | None = None,
+    shared: SharedCache | None = None,
+) -> dict[str, Any]:
+    rules, stations = _load_rules_and_stations(repo, config_path, catalog)
+    sourcetype_filter = rules["sourcetype_filter"]
+    rules = compile_rules(rules)
+    slot_sink = _drilldown_sink(drilldown, repo, sourcetype_filter, rules)
+
+    def build_month(year_month: tuple[int, int]) -> dict[str, Any]:
+        year, month = year_month
+        return _report_for_month(
+            repo,
+            stations,
+            rules,
+            sourcetype_filter,
+            year,
+            month,
+            aggregation,
+            engine,
+            cache,
+            incremental,
+            rollups=rollups,
+            slot_sink=slot_sink,
+            shared=shared,
+        )
+
+    # Each worker checks out its own pooled connection, so months are fetched and
+    # aggregated concurrently; max_workers should stay within DB_POOL_SIZE.
+    workers = max(1, min(max_workers, len(months)))
+    # One context copy per month so each worker reports stages to the caller's timer.
+    contexts = [contextvars.copy_context() for _ in months]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="range-report") as executor:
+        monthly_reports = list(
+            executor.map(lambda context, month: context.run(build_month, month), contexts, months)
+        )
+    with stage("summarize"):
+        report = summarize_range_report(monthly_reports)
+    return _with_source_status(report, repo)
+
+
+def _indexed_month(
+    repo: RepositoryProtocol,
+    stations: list[dict[str, Any]],
+    rules: CompiledRules,
+    sourcetype_filter: str,
+    year: int,
+    month: int,
+    drilldown: SlotDrilldownIndex,
+    station_expected: dict[str, int],
+) -> IndexedMonth:
+    indexed = drilldown.get(year, month, sourcetype_filter, rules.fingerprint)
+    if indexed is not None and all(
+        indexed.aggregator.station_expected_per_day.get(station_id) == expected
+        for station_id, expected in station_expected.items()
+    ):
+        return indexed
+
+    # Not loaded yet (or indexed before a station change): aggregate the month
+    # once, the way a streamed report build would, and keep its bitmap.
+    start, end = month_range(year, month, day_start_hour=rules.day_start_hour)
+    with stage("aggregate") as timing:
+        aggregator = SlotAggregator(
+            resolve_station_expected(stations, rules), year, month, rules.day_start_hour
+        )
+        batches = repo.iter_record_batches(
+            start, end, sourcetype_filter, batch_size=SETTINGS.record_batch_size
+        )
+        for batch in prefetch(batches):
+            aggregator.add_batch(batch)
+        timing.rows = aggregator.rows_seen
+    if source_failures(repo):
+        return IndexedMonth(aggregator, datetime.now())
+    return drilldown.put(sourcetype_filter, rules.fingerprint, aggregator)
+
+
+def _slot_drilldown_inputs(
+    repo: RepositoryProtocol,
+    config_path: Path,
+    station_id: str,
+    catalog: StationCatalog | None = None,
+) -> tuple[CompiledRules, str, list[dict[str, Any]], dict[str, Any]] | None:
+    rules, stations = _load_rules_and_stations(repo, config_path, catalog)
+    station = next(
+        (item for item in stations if str(item.get("station_id") or "").strip() == station_id),
+        None,
+    )
+    if station is None:
+        return None
+    return compile_rules(rules), rules["sourcetype_filter"], stations, station
+
+
+def _assemble_slot_drilldown(
+    station_id: str,
+    station: dict[str, Any],
+    expected_per_day: int,
+    rules: CompiledRules,
+    first: date,
+    last: date,
+    indexed_months: dict[tuple[int, int], IndexedMonth],
+) -> dict[str, Any]:
+    days: list[dict[str, Any]] = []
+    months: list[dict[str, Any]] = []
+    day = first
+    while day <= last:
+        indexed = indexed_months[(day.year, day.month)]
+        months.append(
+            {
+                "year": day.year,
+                "month": day.month,
+                "indexed_at": indexed.indexed_at.isoformat(timespec="seconds"),
+            }
         )
+        while day <= last and (day.year, day.month) == (months[-1]["year"], months[-1]["month"]):
+            days.append(station_day_slots(indexed.aggregator, station_id, day))
+            day += timedelta(days=1)
 
-    output = io.BytesIO()
-    workbook.save(output)
-    return output.getvalue()
+    return {
+        "station_id": station_id,
+        "station_name": str(station.get("cname") or "").strip() or station_id,
+        "expected_per_day": expected_per_day,
+        "day_start_hour": rules.day_start_hour,
+        "months": months,
+        "days": days,
+    }
 
 
 def create_app(
     config_path: Path | None = None,
     repository_factory: Callable[[], RepositoryProtocol] | None = None,
+    report_aggregation: str | None = None,
+    report_engine: str | None = None,
+    report_cache: ReportCache | None = None,
+    incremental_store: IncrementalReportStore | None = None,
+    station_catalog: StationCatalog | None = None,
+    record_mirror: RecordMirror | None = None,
+    daily_rollups: DailyRollupStore | None = None,
+    slot_drilldown: SlotDrilldownIndex | None = None,
+    live_monitor: LiveArrivalMonitor | None = None,
+    shared_cache: SharedCache | None = None,
 ) -> FastAPI:
-    app = FastAPI(title="水情月到报统计")
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        scheduler = app.state.rollup_scheduler
+        if scheduler is not None:
+            scheduler.start()
+        try:
+            yield
+        finally:
+            if scheduler is not None:
+                scheduler.stop()
+            app.state.live_monitor.stop()
+
+    app = FastAPI(title="水情月到报统计", lifespan=lifespan)
+    configure_metrics(SETTINGS.metrics_enabled)
+    app.add_middleware(RequestMetricsMiddleware)
 
     templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
     app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
     app.state.config_path = config_path or (BASE_DIR / "config" / "report_rules.json")
-    app.state.repository_factory = repository_factory or _default_repository_factory
+    live_repository_factory = repository_factory or _default_repository_factory
+    if record_mirror is None and SETTINGS.mirror_enabled:
+        record_mirror = record_mirror_from_settings()
+    app.state.record_mirror = record_mirror
+    app.state.live_repository_factory = live_repository_factory
+    if record_mirror is None:
+        app.state.repository_factory = live_repository_factory
+    else:
+        offline = SETTINGS.mirror_offline
+        app.state.repository_factory = lambda: MirrorRepository(
+            record_mirror, None if offline else live_repository_factory()
+        )
+
+    aggregation = (report_aggregation or SETTINGS.report_aggregation).strip().lower()
+    if aggregation not in REPORT_AGGREGATIONS:
+        raise ValueError(
+            f"report_aggregation must be one of {REPORT_AGGREGATIONS}, got {aggregation!r}"
+        )
+    app.state.report_aggregation = aggregation
+
+    engine = (report_engine or SETTINGS.report_engine).strip().lower()
+    if engine not in REPORT_ENGINES:
+        raise ValueError(f"report_engine must be one of {REPORT_ENGINES}, got {engine!r}")
+    app.state.report_engine = engine
+
+    if report_cache is None and SETTINGS.report_cache_enabled:
+        report_cache = report_cache_from_settings()
+    app.state.report_cache = report_cache
+
+    if incremental_store is None and SETTINGS.incremental_enabled:
+        incremental_store = IncrementalReportStore(
+            overlap_minutes=SETTINGS.incremental_overlap_minutes,
+            max_months=SETTINGS.incremental_max_months,
+            batch_size=SETTINGS.record_batch_size,
+        )
+    app.state.incremental_store = incremental_store
+    if shared_cache is None and SETTINGS.shared_cache_enabled:
+        shared_cache = shared_cache_from_settings()
+    app.state.shared_cache = shared_cache
+    app.state.station_catalog = station_catalog or StationCatalog(
+        SETTINGS.station_catalog_ttl, shared=shared_cache
+    )
+    app.state.slot_drilldown = slot_drilldown or SlotDrilldownIndex(SETTINGS.drilldown_max_months)
+
+    if daily_rollups is None and SETTINGS.rollup_enabled:
+        daily_rollups = daily_rollups_from_settings()
+    app.state.daily_rollups = daily_rollups
+
+    def run_rollups() -> datetime:
+        repo = app.state.repository_factory()
+        rules, stations = _load_rules_and_stations(
+            repo, app.state.config_path, app.state.station_catalog
+        )
+        sourcetype_filter = rules["sourcetype_filter"]
+        rules = compile_rules(rules)
+        if shared_cache is None:
+            run_rollup_days(repo, stations, rules, sourcetype_filter)
+        else:
+            # Every worker runs a scheduler; the first to take the lease rolls the
+            # days up into the shared store, the others skip this close.
+            with shared_cache.lease("rollups") as owner:
+                if owner:
+                    run_rollup_days(repo, stations, rules, sourcetype_filter)
+        return daily_rollups.next_close(rules.day_start_hour)
+
+    def run_rollup_days(
+        repo: RepositoryProtocol,
+        stations: list[dict[str, Any]],
+        rules: CompiledRules,
+        sourcetype_filter: str,
+    ) -> None:
+        # Re-check a few recent days so runs missed while the service was down
+        # (or a rules change) are caught up.
+        last = daily_rollups.last_closed_day(rules.day_start_hour)
+        first = last - timedelta(days=SETTINGS.rollup_lookback_days - 1)
+        roll_up_closed_days(daily_rollups, repo, stations, rules, sourcetype_filter, first, last)
+
+    app.state.rollup_scheduler = (
+        RollupScheduler(run_rollups)
+        if daily_rollups is not None and SETTINGS.rollup_scheduler_enabled
+        else None
+    )
+    def live_source() -> tuple[RepositoryProtocol, list[dict[str, Any]], CompiledRules, str]:
+        repo = app.state.repository_factory()
+        rules, stations = _load_rules_and_stations(
+            repo, app.state.config_path, app.state.station_catalog
+        )
+        return repo, stations, compile_rules(rules), rules["sourcetype_filter"]
+
+    app.state.live_monitor = live_monitor or LiveArrivalMonitor(
+        live_source,
+        poll_seconds=SETTINGS.live_poll_seconds,
+        overlap_minutes=SETTINGS.live_overlap_minutes,
+        batch_size=SETTINGS.record_batch_size,
+    )
+    app.state.report_scheduler = SingleFlightScheduler(
+        max_concurrent=SETTINGS.report_max_concurrent,
+        max_pending=SETTINGS.report_max_pending,
+    )
 
     @app.get("/")
     def home(request: Request):
@@ -115,7 +791,9 @@ def create_app(
     @app.get("/api/config")
     def get_config() -> dict[str, Any]:
         repo = app.state.repository_factory()
-        return load_or_generate_rules_with_repo(repo, app.state.config_path)
+        return load_or_generate_rules_with_repo(
+            repo, app.state.config_path, app.state.station_catalog
+        )
 
     @app.put("/api/config")
     def update_config(payload: dict[str, Any] = Body(...)) -> dict[str, Any]:
@@ -124,43 +802,422 @@ def create_app(
     @app.post("/api/config/regenerate")
     def regenerate_config() -> dict[str, Any]:
         repo = app.state.repository_factory()
-        return regenerate_rules_with_repo(repo, app.state.config_path)
+        return regenerate_rules_with_repo(repo, app.state.config_path, app.state.station_catalog)
 
-    @app.get("/api/report/monthly")
-    def monthly_report(
+    @app.get("/api/db/pool")
+    def db_pool_stats() -> dict[str, Any]:
+        return {"pools": pool_stats()}
+
+    @app.get("/api/db/explain")
+    def explain_record_query(
         year: int = Query(..., ge=2000, le=2100),
         month: int = Query(..., ge=1, le=12),
     ) -> dict[str, Any]:
+        repo = app.state.repository_factory()
+        if not hasattr(repo, "explain_record_query"):
+            raise HTTPException(
+                status_code=404, detail="repository does not support query plan diagnostics"
+            )
+        rules = load_or_generate_rules_with_repo(
+            repo, app.state.config_path, app.state.station_catalog
+        )
+        start, end = month_range(year, month, day_start_hour=resolve_day_start_hour(rules))
+        try:
+            return repo.explain_record_query(start, end, rules["sourcetype_filter"])
+        except Exception as exc:  # pragma: no cover - integration path
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+    @app.get("/api/mirror")
+    def record_mirror_stats() -> dict[str, Any]:
+        if app.state.record_mirror is None:
+            return {"enabled": False}
+        return app.state.record_mirror.stats()
+
+    @app.post("/api/mirror/sync")
+    def sync_record_mirror(since: date | None = Query(None)) -> dict[str, Any]:
+        if app.state.record_mirror is None:
+            raise HTTPException(status_code=404, detail="record mirror is not enabled")
+        repo = app.state.live_repository_factory()
+        rules = load_or_generate_rules_with_repo(
+            repo, app.state.config_path, app.state.station_catalog
+        )
+        try:
+            result = app.state.record_mirror.sync(
+                repo,
+                rules["sourcetype_filter"],
+                datetime.combine(since, datetime.min.time()) if since else None,
+                batch_size=SETTINGS.record_batch_size,
+            )
+        except Exception as exc:  # pragma: no cover - integration path
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+        # Resynced rows may differ from what cached reports were built from.
+        for year, month in synced_months(result):
+            drop_cached_reports(year, month)
+        return result
+
+    @app.get("/api/stations/cache")
+    def station_catalog_stats() -> dict[str, Any]:
+        return app.state.station_catalog.stats()
+
+    @app.delete("/api/stations/cache")
+    def invalidate_station_catalog() -> dict[str, Any]:
+        app.state.station_catalog.invalidate()
+        return app.state.station_catalog.stats()
+
+    async def scheduled(
+        key: tuple[Any, ...], func: Callable[[], Any]
+    ) -> tuple[Any, StageTimer, float]:
+        started = time.perf_counter()
         try:
-            repo = app.state.repository_factory()
-            return _build_report(repo, app.state.config_path, year, month)
+            result, timer = await app.state.report_scheduler.run(
+                key, partial(_run_with_stage_timer, func)
+            )
+        except ReportOverloadedError as exc:
+            raise HTTPException(
+                status_code=503,
+                detail=str(exc),
+                headers={"Retry-After": str(SETTINGS.report_retry_after)},
+            ) from exc
+        except HTTPException:
+            raise
         except Exception as exc:  # pragma: no cover - integration path
             raise HTTPException(status_code=500, detail=str(exc)) from exc
+        return result, timer, time.perf_counter() - started
+
+    def timed_response(
+        request: Request,
+        payload: Any,
+        timer: StageTimer,
+        waited: float,
+        etag: str | None = None,
+    ) -> Response:
+        response, timings = json_response(
+            payload,
+            accept_encoding=request.headers.get("accept-encoding"),
+            etag=etag,
+            if_none_match=request.headers.get("if-none-match"),
+            etag_from_content=True,
+        )
+        if metrics_enabled():
+            # Coalesced callers share one timer, so their queue time can be negative.
+            queue = max(waited - timer.elapsed, 0.0)
+            response.headers["Server-Timing"] = timer.server_timing({"queue": queue, **timings})
+        return response
+
+    def settled_etag(year: int, month: int, variant: str) -> str | None:
+        try:
+            return _settled_report_etag(
+                app.state.repository_factory(),
+                app.state.config_path,
+                year,
+                month,
+                variant,
+                app.state.report_cache,
+                app.state.station_catalog,
+            )
+        except Exception:
+            # Only a shortcut: the scheduled build reports database errors properly.
+            return None
+
+    def build_monthly(year: int, month: int, engine: str, full_refresh: bool) -> dict[str, Any]:
+        repo = app.state.repository_factory()
+        return _build_report(
+            repo,
+            app.state.config_path,
+            year,
+            month,
+            app.state.report_aggregation,
+            engine,
+            app.state.report_cache,
+            app.state.incremental_store,
+            full_refresh=full_refresh,
+            catalog=app.state.station_catalog,
+            rollups=app.state.daily_rollups,
+            drilldown=app.state.slot_drilldown,
+            shared=app.state.shared_cache,
+        )
+
+    async def monthly(
+        year: int, month: int, engine: str | None, full_refresh: bool = False
+    ) -> tuple[dict[str, Any], StageTimer, float]:
+        # Engines produce identical reports, so the engine is not part of the key.
+        key = ("monthly", year, month, rules_version(app.state.config_path), full_refresh)
+        return await scheduled(
+            key,
+            partial(build_monthly, year, month, engine or app.state.report_engine, full_refresh),
+        )
+
+    @app.get("/api/report/monthly")
+    async def monthly_report(
+        request: Request,
+        year: int = Query(..., ge=2000, le=2100),
+        month: int = Query(..., ge=1, le=12),
+        engine: str | None = Query(None, pattern="^(python|numpy)$"),
+        refresh: str = Query("auto", pattern="^(auto|full)$"),
+        shape: str = Query("rows", pattern="^(rows|columnar)$"),
+        sort: str = Query("", pattern=REPORT_SORT_PATTERN),
+        ctype: str | None = Query(None),
+        station_prefix: str = Query(""),
+        min_rate: float | None = Query(None, ge=0, le=100),
+        max_rate: float | None = Query(None, ge=0, le=100),
+        offset: int = Query(0, ge=0),
+        limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    ) -> Response:
+        # Filters, sort and page are applied to the built (shared, cached) report,
+        # so every view of a month costs one build.
+        view = ReportView(
+            parse_ctypes(ctype),
+            station_prefix.strip(),
+            min_rate,
+            max_rate,
+            sort,
+            offset,
+            limit,
+        )
+        full_refresh = refresh == "full"
+        variant = f"{shape}:{view.token()}"
+        etag = None
+        if not full_refresh:
+            # Settled, cached months are tagged from their stored build, so a
+            # revalidation is answered before anything is built.
+            etag = await run_in_threadpool(settled_etag, year, month, variant)
+            if etag is not None and etag_matches(request.headers.get("if-none-match"), etag):
+                return not_modified(etag)
+        report, timer, waited = await monthly(year, month, engine, full_refresh)
+        if report.get("partial"):
+            # Must not share the tag of the complete report.
+            etag = None
+        elif etag is None:
+            # The build may just have stored (or replaced) the month's entry.
+            etag = await run_in_threadpool(settled_etag, year, month, variant)
+        with stage("view"):
+            report = apply_report_view(report, view)
+        payload = columnar_report(report) if shape == "columnar" else report
+        return timed_response(request, payload, timer, waited, etag)
 
     @app.get("/api/report/monthly/export")
-    def export_monthly_report(
+    async def export_monthly_report(
         year: int = Query(..., ge=2000, le=2100),
         month: int = Query(..., ge=1, le=12),
+        engine: str | None = Query(None, pattern="^(python|numpy)$"),
+        format: str = Query("xlsx", pattern="^(xlsx|csv|parquet)$"),
     ) -> StreamingResponse:
-        try:
-            repo = app.state.repository_factory()
-            report = _build_report(repo, app.state.config_path, year, month)
-        except Exception as exc:  # pragma: no cover - integration path
-            raise HTTPException(status_code=500, detail=str(exc)) from exc
+        if format == "parquet" and not parquet_available():
+            raise HTTPException(
+                status_code=400,
+                detail="parquet export requires pyarrow. Please run `uv sync --extra parquet`.",
+            )
+        report, timer, waited = await monthly(year, month, engine)
+        filename = f"monthly-report-{year}-{month:02d}.{format}"
+        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+        if metrics_enabled():
+            # The export itself streams after the headers, so only the build is listed.
+            headers["Server-Timing"] = timer.server_timing(
+                {"queue": max(waited - timer.elapsed, 0.0)}
+            )
+
+        # A sync iterator: Starlette drains it in the threadpool chunk by chunk.
+        return StreamingResponse(
+            iter_report_export(report, format),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers=headers,
+        )
+
+    def build_range(months: list[tuple[int, int]]) -> dict[str, Any]:
+        repo = app.state.repository_factory()
+        return _build_range_report(
+            repo,
+            app.state.config_path,
+            months,
+            app.state.report_aggregation,
+            app.state.report_engine,
+            app.state.report_cache,
+            app.state.incremental_store,
+            max_workers=SETTINGS.range_report_workers,
+            catalog=app.state.station_catalog,
+            rollups=app.state.daily_rollups,
+            drilldown=app.state.slot_drilldown,
+            shared=app.state.shared_cache,
+        )
+
+    async def range_report(request: Request, months: list[tuple[int, int]]) -> Response:
+        if len(months) > SETTINGS.range_report_max_months:
+            raise HTTPException(
+                status_code=400,
+                detail=f"range covers {len(months)} months, limit is {SETTINGS.range_report_max_months}",
+            )
+        key = ("range", tuple(months), rules_version(app.state.config_path))
+        return timed_response(request, *await scheduled(key, partial(build_range, months)))
+
+    @app.get("/api/report/range")
+    async def monthly_range_report(
+        request: Request,
+        start_year: int = Query(..., ge=2000, le=2100),
+        start_month: int = Query(..., ge=1, le=12),
+        end_year: int = Query(..., ge=2000, le=2100),
+        end_month: int = Query(..., ge=1, le=12),
+    ) -> Response:
+        months = month_span(start_year, start_month, end_year, end_month)
+        if not months:
+            raise HTTPException(status_code=400, detail="start month must not be after end month")
+        return await range_report(request, months)
 
-        content = _build_excel(report)
-        filename = f"monthly-report-{year}-{month:02d}.xlsx"
+    @app.get("/api/report/annual")
+    async def annual_report(
+        request: Request, year: int = Query(..., ge=2000, le=2100)
+    ) -> Response:
+        return await range_report(request, month_span(year, 1, year, 12))
 
+    @app.get("/metrics", include_in_schema=False)
+    def metrics() -> PlainTextResponse:
+        return PlainTextResponse(
+            render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+    @app.get("/api/report/scheduler")
+    def report_scheduler_stats() -> dict[str, Any]:
+        return app.state.report_scheduler.stats()
+
+    @app.get("/api/report/cache")
+    def report_cache_stats() -> dict[str, Any]:
+        if app.state.report_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **app.state.report_cache.stats()}
+
+    @app.delete("/api/report/cache")
+    def invalidate_report_cache(
+        year: int | None = Query(None, ge=2000, le=2100),
+        month: int | None = Query(None, ge=1, le=12),
+    ) -> dict[str, Any]:
+        return {"removed": drop_cached_reports(year, month)}
+
+    def drop_cached_reports(year: int | None, month: int | None) -> int:
+        removed = invalidate_cached_reports(
+            year, month, app.state.report_cache, app.state.shared_cache
+        )
+        if app.state.incremental_store is not None:
+            removed += app.state.incremental_store.invalidate(year, month)
+        removed += app.state.slot_drilldown.invalidate(year, month)
+        return removed
+
+    @app.get("/api/cache/shared")
+    def shared_cache_stats() -> dict[str, Any]:
+        if app.state.shared_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **app.state.shared_cache.stats()}
+
+    @app.get("/api/report/slots")
+    async def slot_drilldown_report(
+        station_id: str = Query(..., min_length=1),
+        start: date = Query(...),
+        end: date | None = Query(None),
+    ) -> dict[str, Any]:
+        end = end or start
+        if end < start:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        if (end - start).days >= DRILLDOWN_MAX_DAYS:
+            raise HTTPException(
+                status_code=400, detail=f"range is limited to {DRILLDOWN_MAX_DAYS} days"
+            )
+        station_id = station_id.strip()
+        repo = app.state.repository_factory()
+        with stage("drilldown"):
+            inputs = await run_in_threadpool(
+                _slot_drilldown_inputs,
+                repo,
+                app.state.config_path,
+                station_id,
+                app.state.station_catalog,
+            )
+            if inputs is None:
+                raise HTTPException(status_code=404, detail=f"unknown station {station_id!r}")
+            rules, sourcetype_filter, stations, station = inputs
+            station_expected = resolve_station_expected([station], rules)
+            stations_hash = stations_fingerprint(stations)
+
+            def index_month(year: int, month: int) -> tuple[IndexedMonth, dict[str, Any]]:
+                indexed = _indexed_month(
+                    repo,
+                    stations,
+                    rules,
+                    sourcetype_filter,
+                    year,
+                    month,
+                    app.state.slot_drilldown,
+                    station_expected,
+                )
+                # Callers that joined this build get the builder's source status.
+                return indexed, _with_source_status({}, repo)
+
+            # Cold months are aggregated once however many requests ask for them.
+            indexed_months: dict[tuple[int, int], IndexedMonth] = {}
+            status: dict[str, Any] = {}
+            for year, month in month_span(start.year, start.month, end.year, end.month):
+                key = ("slots", year, month, sourcetype_filter, rules.fingerprint, stations_hash)
+                (indexed, month_status), _, _ = await scheduled(
+                    key, partial(index_month, year, month)
+                )
+                indexed_months[(year, month)] = indexed
+                if not status or month_status.get("partial"):
+                    status = month_status
+            result = _assemble_slot_drilldown(
+                station_id,
+                station,
+                station_expected[station_id],
+                rules,
+                start,
+                end,
+                indexed_months,
+            )
+        return {**result, **status}
+
+    @app.get("/api/report/slots/index")
+    def slot_drilldown_stats() -> dict[str, Any]:
+        return app.state.slot_drilldown.stats()
+
+    @app.get("/api/report/rollups")
+    def daily_rollup_stats() -> dict[str, Any]:
+        if app.state.daily_rollups is None:
+            return {"enabled": False}
+        stats = app.state.daily_rollups.stats()
+        if app.state.rollup_scheduler is not None:
+            stats["scheduler"] = app.state.rollup_scheduler.stats()
+        return stats
+
+    @app.delete("/api/report/rollups")
+    def invalidate_daily_rollups() -> dict[str, Any]:
+        if app.state.daily_rollups is None:
+            return {"enabled": False}
+        return {"deleted_days": app.state.daily_rollups.invalidate()}
+
+    @app.get("/api/live/stream")
+    def live_stream() -> StreamingResponse:
+        # Every client shares the worker's single poller, so clients do not add
+        # database queries.
         return StreamingResponse(
-            io.BytesIO(content),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            live_events(app.state.live_monitor, SETTINGS.live_heartbeat_seconds),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
+    @app.get("/api/live")
+    def live_monitor_stats() -> dict[str, Any]:
+        return app.state.live_monitor.stats()
+
+    @app.get("/api/report/incremental")
+    def incremental_report_stats() -> dict[str, Any]:
+        if app.state.incremental_store is None:
+            return {"enabled": False, "months": []}
+        return {"enabled": True, "months": app.state.incremental_store.stats()}
+
     @app.exception_handler(HTTPException)
     async def http_exception_handler(request: Request, exc: HTTPException):
         if request.url.path.startswith("/api/"):
-            return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+            return JSONResponse(
+                status_code=exc.status_code,
+                content={"detail": exc.detail},
+                headers=exc.headers,
+            )
         raise exc
 
     return app
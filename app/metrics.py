@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (non-cumulative, last is +Inf), sum, count].
+        self._series: dict[tuple[str, ...], list[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[labels] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[Histogram] = []
+
+    def register(self, metric: Histogram) -> Histogram:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "hydro_report_stage_duration_seconds",
+        "Time spent in each report build stage.",
+        ("stage",),
+    )
+)
+STAGE_ROWS = REGISTRY.register(
+    Histogram(
+        "hydro_report_stage_rows",
+        "Rows handled per report build stage.",
+        ("stage",),
+        buckets=ROW_BUCKETS,
+    )
+)
+HTTP_SECONDS = REGISTRY.register(
+    Histogram(
+        "hydro_http_request_duration_seconds",
+        "HTTP request latency until the response starts.",
+        ("method", "route", "status"),
+    )
+)
+
+_enabled = True
+_current_timer: ContextVar[StageTimer | None] = ContextVar("stage_timer", default=None)
+
+
+def configure_metrics(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def metrics_enabled() -> bool:
+    return _enabled
+
+
+class StageTimer:
+    # Collects the stages of one report build. Stages recorded from worker
+    # threads land here as long as the thread runs in a copy of the build context.
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._stages: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, rows: int | None = None) -> None:
+        with self._lock:
+            stage = self._stages.setdefault(name, [0.0, 0, 0])
+            stage[0] += seconds
+            stage[1] += 1
+            stage[2] += rows or 0
+
+    def summary(self) -> list[dict[str, Any]]:
+        with self._lock:
+            items = list(self._stages.items())
+        return [
+            {"stage": name, "seconds": seconds, "count": count, "rows": rows}
+            for name, (seconds, count, rows) in items
+        ]
+
+    def server_timing(self, extra: dict[str, float] | None = None) -> str:
+        entries = []
+        for stage in self.summary():
+            entry = f"{stage['stage']};dur={stage['seconds'] * 1000:.1f}"
+            details = []
+            if stage["count"] > 1:
+                details.append(f"n={stage['count']}")
+            if stage["rows"]:
+                details.append(f"rows={stage['rows']}")
+            if details:
+                entry += f';desc="{" ".join(details)}"'
+            entries.append(entry)
+        for name, seconds in (extra or {}).items():
+            entries.append(f"{name};dur={seconds * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def record_stage(name: str, seconds: float, rows: int | None = None) -> None:
+    if not _enabled:
+        return
+    STAGE_SECONDS.observe(seconds, name)
+    if rows is not None:
+        STAGE_ROWS.observe(rows, name)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.record(name, seconds, rows)
+
+
+class _Stage:
+    __slots__ = ("name", "rows", "_started")
+
+    def __init__(self, name: str, rows: int | None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self) -> _Stage:
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        record_stage(self.name, time.perf_counter() - self._started, self.rows)
+
+
+class _NullStage:
+    __slots__ = ("rows",)
+
+    def __enter__(self) -> _NullStage:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str, rows: int | None = None) -> _Stage | _NullStage:
+    # Set `.rows` on the returned object inside the block to report a row count.
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, rows)
+
+
+@contextmanager
+def collect_stages() -> Iterator[StageTimer]:
+    timer = StageTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        timer.elapsed = time.perf_counter() - timer.started
+        _current_timer.reset(token)
+
+
+class RequestMetricsMiddleware:
+    # Plain ASGI middleware: observes time to the response start, labelled with
+    # the matched route template so path parameters do not explode the series.
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not _enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def send_with_metrics(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                route = getattr(scope.get("route"), "path", "unmatched")
+                HTTP_SECONDS.observe(
+                    time.perf_counter() - started, scope["method"], route, str(message["status"])
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_metrics)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from app.federated import source_failures
+from app.metrics import record_stage, stage
+from app.report_logic import slot_index
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_seconds(value: datetime) -> int:
+    return int((value - _EPOCH).total_seconds())
+
+
+def _from_seconds(value: int) -> datetime:
+    return _EPOCH + timedelta(seconds=value)
+
+
+def _day_floor(value: datetime) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def slot_counts_from_batches(
+    batches: Iterable[list[tuple[str, datetime]]],
+    station_expected: dict[str, int],
+    day_start_hour: int,
+) -> list[dict[str, Any]]:
+    # Same result shape and slot arithmetic as SQLServerRepository.fetch_slot_counts.
+    slots: set[tuple[str, int, int]] = set()
+    shift = timedelta(hours=day_start_hour)
+    for batch in batches:
+        for station_id, data_time in batch:
+            expected = station_expected.get(station_id)
+            if expected is None:
+                continue
+            day = (data_time - shift).day
+            slots.add((station_id, day, slot_index(data_time, expected, day_start_hour)))
+
+    counts: dict[tuple[str, int], int] = {}
+    for station_id, day, _ in slots:
+        counts[(station_id, day)] = counts.get((station_id, day), 0) + 1
+    return [
+        {"station_id": station_id, "day": day, "actual": actual}
+        for (station_id, day), actual in counts.items()
+    ]
+
+
+class RecordMirror:
+    # Local SQLite copy of the OneDayData columns the reports use. Rows are
+    # replaced in whole-day partitions: every sync re-reads the last
+    # `resync_days` days before the previous high-water mark so late inserts
+    # into already mirrored days are picked up. Times are stored as whole
+    # seconds since 1970-01-01 (naive, server local time).
+    def __init__(
+        self,
+        path: Path,
+        initial_days: int = 92,
+        resync_days: int = 2,
+        chunk_days: int = 7,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self.path = Path(path)
+        self.initial_days = initial_days
+        self.resync_days = resync_days
+        self.chunk_days = max(1, chunk_days)
+        self._now = now
+        self._init_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self._initialize()
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _initialize(self) -> None:
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS mirror_records (
+                        sourcetype TEXT NOT NULL,
+                        ts INTEGER NOT NULL,
+                        station_id TEXT NOT NULL
+                    )
+                    """
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_mirror_records_sourcetype_ts "
+                    "ON mirror_records (sourcetype, ts)"
+                )
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS mirror_state (
+                        sourcetype TEXT PRIMARY KEY,
+                        synced_from INTEGER NOT NULL,
+                        synced_until INTEGER NOT NULL,
+                        synced_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS mirror_stations (
+                        station_id TEXT PRIMARY KEY,
+                        cname TEXT NOT NULL,
+                        ctype TEXT NOT NULL
+                    )
+                    """
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def coverage(self, sourcetype_filter: str) -> tuple[datetime, datetime] | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT synced_from, synced_until FROM mirror_state WHERE sourcetype = ?",
+                (sourcetype_filter,),
+            ).fetchone()
+        if row is None:
+            return None
+        return _from_seconds(row[0]), _from_seconds(row[1])
+
+    def sync(
+        self,
+        repo: Any,
+        sourcetype_filter: str,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        batch_size: int = 5000,
+    ) -> dict[str, Any]:
+        # `since` only applies to the first sync of a source type (or to extend
+        # the mirror further back); later syncs continue from the high-water mark.
+        with self._sync_lock:
+            started = time.perf_counter()
+            until = until or self._now()
+            coverage = self.coverage(sourcetype_filter)
+            if coverage is None:
+                start = _day_floor(since or until - timedelta(days=self.initial_days))
+            else:
+                start = max(coverage[0], _day_floor(coverage[1]) - timedelta(days=self.resync_days))
+                if since is not None and _day_floor(since) < coverage[0]:
+                    start = _day_floor(since)
+
+            rows = 0
+            window_start = start
+            while window_start < until:
+                window_end = min(window_start + timedelta(days=self.chunk_days), until)
+                # Everything from `start` to `window_end` is now stored; the
+                # recorded coverage only grows while it stays one contiguous range.
+                if coverage is None:
+                    coverage = (start, window_end)
+                elif window_end >= coverage[0]:
+                    coverage = (min(coverage[0], start), max(coverage[1], window_end))
+                rows += self._replace_window(
+                    repo,
+                    sourcetype_filter,
+                    window_start,
+                    window_end,
+                    coverage if window_end >= coverage[0] else None,
+                    batch_size,
+                )
+                window_start = window_end
+            self._sync_stations(repo)
+
+            return {
+                "sourcetype_filter": sourcetype_filter,
+                "start": start.isoformat(),
+                "until": until.isoformat(),
+                "rows": rows,
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+
+    def _replace_window(
+        self,
+        repo: Any,
+        sourcetype_filter: str,
+        start: datetime,
+        end: datetime,
+        coverage: tuple[datetime, datetime] | None,
+        batch_size: int,
+    ) -> int:
+        # One transaction per window: readers see either the old or the new copy
+        # of these days, and the coverage only moves once they are stored.
+        rows = 0
+        with stage("mirror_sync") as timer, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM mirror_records WHERE sourcetype = ? AND ts >= ? AND ts < ?",
+                (sourcetype_filter, _to_seconds(start), _to_seconds(end)),
+            )
+            for batch in repo.iter_record_batches(
+                start, end, sourcetype_filter, batch_size=batch_size
+            ):
+                conn.executemany(
+                    "INSERT INTO mirror_records (sourcetype, ts, station_id) VALUES (?, ?, ?)",
+                    [
+                        (sourcetype_filter, _to_seconds(data_time), station_id)
+                        for station_id, data_time in batch
+                    ],
+                )
+                rows += len(batch)
+            failures = source_failures(repo)
+            if failures:
+                # Rolls the window back: a partial copy must never count as mirrored.
+                raise RuntimeError(f"mirror sync aborted, sources failed: {failures}")
+            if coverage is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO mirror_state "
+                    "(sourcetype, synced_from, synced_until, synced_at) VALUES (?, ?, ?, ?)",
+                    (
+                        sourcetype_filter,
+                        _to_seconds(coverage[0]),
+                        _to_seconds(coverage[1]),
+                        time.time(),
+                    ),
+                )
+            timer.rows = rows
+        return rows
+
+    def _sync_stations(self, repo: Any) -> None:
+        stations = repo.fetch_stations()
+        failures = source_failures(repo)
+        if failures:
+            raise RuntimeError(f"station sync aborted, sources failed: {failures}")
+        with self._connect() as conn:
+            conn.execute("DELETE FROM mirror_stations")
+            conn.executemany(
+                "INSERT OR REPLACE INTO mirror_stations (station_id, cname, ctype) "
+                "VALUES (?, ?, ?)",
+                [(item["station_id"], item["cname"], item["ctype"]) for item in stations],
+            )
+
+    def fetch_stations(self) -> list[dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT station_id, cname, ctype FROM mirror_stations ORDER BY station_id"
+            ).fetchall()
+        return [{"station_id": row[0], "cname": row[1], "ctype": row[2]} for row in rows]
+
+    def iter_record_batches(
+        self,
+        start: datetime,
+        end: datetime,
+        sourcetype_filter: str,
+        batch_size: int = 5000,
+    ) -> Iterator[list[tuple[str, datetime]]]:
+        elapsed = 0.0
+        row_count = 0
+        try:
+            with self._connect() as conn:
+                started = time.perf_counter()
+                cursor = conn.execute(
+                    "SELECT station_id, ts FROM mirror_records "
+                    "WHERE sourcetype = ? AND ts >= ? AND ts < ?",
+                    (sourcetype_filter, _to_seconds(start), _to_seconds(end)),
+                )
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    batch = [(station_id, _from_seconds(ts)) for station_id, ts in rows]
+                    elapsed += time.perf_counter() - started
+                    if not batch:
+                        break
+                    row_count += len(batch)
+                    yield batch
+                    started = time.perf_counter()
+        finally:
+            record_stage("mirror_read", elapsed, row_count)
+
+    def stats(self) -> dict[str, Any]:
+        with self._connect() as conn:
+            states = conn.execute(
+                "SELECT sourcetype, synced_from, synced_until, synced_at FROM mirror_state "
+                "ORDER BY sourcetype"
+            ).fetchall()
+            counts = dict(
+                conn.execute(
+                    "SELECT sourcetype, COUNT(*) FROM mirror_records GROUP BY sourcetype"
+                ).fetchall()
+            )
+            stations = conn.execute("SELECT COUNT(*) FROM mirror_stations").fetchone()[0]
+        return {
+            "enabled": True,
+            "path": str(self.path),
+            "stations": stations,
+            "sources": [
+                {
+                    "sourcetype_filter": sourcetype,
+                    "synced_from": _from_seconds(synced_from).isoformat(),
+                    "synced_until": _from_seconds(synced_until).isoformat(),
+                    "synced_at": datetime.fromtimestamp(synced_at).isoformat(timespec="seconds"),
+                    "rows": counts.get(sourcetype, 0),
+                }
+                for sourcetype, synced_from, synced_until, synced_at in states
+            ],
+        }
+
+
+class MirrorRepository:
+    # RepositoryProtocol that reads the mirrored part of a time range from the
+    # local store and only the rest (normally the tail of the current month)
+    # from the live database. Without a live repository it serves whatever the
+    # mirror holds.
+    def __init__(self, mirror: RecordMirror, live: Any | None = None):
+        self.mirror = mirror
+        self.live = live
+
+    def _segments(
+        self,
+        start: datetime,
+        end: datetime,
+        sourcetype_filter: str,
+        day_start_hour: int | None = None,
+    ) -> list[tuple[datetime, datetime, Any]]:
+        coverage = self.mirror.coverage(sourcetype_filter)
+        if coverage is None:
+            return [(start, end, self.live)] if self.live is not None else []
+        low, high = max(start, coverage[0]), min(end, coverage[1])
+        if day_start_hour is not None and self.live is not None:
+            # Slot counts are per hydro day, so the mirrored part must consist of
+            # whole hydro days for the two sources' counts to be disjoint.
+            shift = timedelta(hours=day_start_hour)
+            aligned_low = _day_floor(low - shift) + shift
+            low = aligned_low if aligned_low >= low else aligned_low + timedelta(days=1)
+            high = _day_floor(high - shift) + shift
+        if low >= high:
+            return [(start, end, self.live)] if self.live is not None else []
+
+        segments = [(low, high, self.mirror)]
+        if start < low:
+            segments.insert(0, (start, low, self.live))
+        if high < end:
+            segments.append((high, end, self.live))
+        return [segment for segment in segments if segment[2] is not None]
+
+    def failed_sources(self) -> dict[str, str]:
+        return source_failures(self.live)
+
+    def source_status(self) -> list[dict[str, Any]] | None:
+        source_status = getattr(self.live, "source_status", None)
+        return source_status() if source_status is not None else None
+
+    def fetch_stations(self) -> list[dict[str, Any]]:
+        if self.live is not None:
+            return self.live.fetch_stations()
+        return self.mirror.fetch_stations()
+
+    def probe_stations(self) -> Any:
+        if self.live is not None and hasattr(self.live, "probe_stations"):
+            return self.live.probe_stations()
+        return tuple(sorted(tuple(item.values()) for item in self.mirror.fetch_stations()))
+
+    def iter_record_batches(
+        self, start: datetime, end: datetime, sourcetype_filter: str, batch_size: int = 5000
+    ) -> Iterator[list[tuple[str, datetime]]]:
+        for segment_start, segment_end, source in self._segments(start, end, sourcetype_filter):
+            yield from source.iter_record_batches(
+                segment_start, segment_end, sourcetype_filter, batch_size=batch_size
+            )
+
+    def fetch_records(
+        self, start: datetime, end: datetime, sourcetype_filter: str
+    ) -> list[dict[str, Any]]:
+        records: list[dict[str, Any]] = []
+        for segment_start, segment_end, source in self._segments(start, end, sourcetype_filter):
+            if source is self.mirror:
+                batches = source.iter_record_batches(segment_start, segment_end, sourcetype_filter)
+                for batch in batches:
+                    records.extend(
+                        {"station_id": station_id, "datatime": data_time}
+                        for station_id, data_time in batch
+                    )
+            else:
+                records.extend(source.fetch_records(segment_start, segment_end, sourcetype_filter))
+        return records
+
+    def fetch_slot_counts(
+        self,
+        start: datetime,
+        end: datetime,
+        sourcetype_filter: str,
+        station_expected: dict[str, int],
+        day_start_hour: int,
+    ) -> list[dict[str, Any]]:
+        counts: list[dict[str, Any]] = []
+        segments = self._segments(start, end, sourcetype_filter, day_start_hour)
+        for segment_start, segment_end, source in segments:
+            if source is self.mirror:
+                counts.extend(
+                    slot_counts_from_batches(
+                        source.iter_record_batches(segment_start, segment_end, sourcetype_filter),
+                        station_expected,
+                        day_start_hour,
+                    )
+                )
+            else:
+                counts.extend(
+                    source.fetch_slot_counts(
+                        segment_start,
+                        segment_end,
+                        sourcetype_filter,
+                        station_expected,
+                        day_start_hour,
+                    )
+                )
+        return counts
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.config_store import load_rules_from_file
+    from app.settings import SETTINGS
+    from app.main import (
+        BASE_DIR,
+        _default_repository_factory,
+        invalidate_cached_reports,
+        record_mirror_from_settings,
+        report_cache_from_settings,
+        shared_cache_from_settings,
+        synced_months,
+    )
+
+    parser = argparse.ArgumentParser(description="Mirror OneDayData into the local store")
+    parser.add_argument(
+        "--sourcetype-filter", help="default: sourcetype_filter from the rules file"
+    )
+    parser.add_argument("--since", type=date.fromisoformat, help="first day to mirror, YYYY-MM-DD")
+    parser.add_argument("--config", type=Path, default=BASE_DIR / "config" / "report_rules.json")
+    args = parser.parse_args(argv)
+
+    sourcetype_filter = (
+        args.sourcetype_filter or load_rules_from_file(args.config)["sourcetype_filter"]
+    )
+    since = datetime.combine(args.since, datetime.min.time()) if args.since else None
+    result = record_mirror_from_settings().sync(
+        _default_repository_factory(),
+        sourcetype_filter,
+        since,
+        batch_size=SETTINGS.record_batch_size,
+    )
+    # Cached reports of the resynced months were built from the old rows.
+    report_cache = report_cache_from_settings() if SETTINGS.report_cache_enabled else None
+    shared_cache = shared_cache_from_settings() if SETTINGS.shared_cache_enabled else None
+    for year, month in synced_months(result):
+        invalidate_cached_reports(year, month, report_cache, shared_cache)
+    print(
+        f"mirrored {result['rows']} rows for Sourcetype={sourcetype_filter} "
+        f"from {result['start']} until {result['until']} in {result['seconds']}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+
+class PoolTimeoutError(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: int = 5,
+        checkout_timeout: float = 30.0,
+        idle_timeout: float = 300.0,
+        pre_ping: bool = True,
+        ping_query: str = "SELECT 1",
+        name: str = "default",
+    ):
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive integer")
+        self._connect = connect
+        self.name = name
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.ping_query = ping_query
+
+        self._cond = threading.Condition()
+        self._idle: deque[tuple[Any, float]] = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._wait_count = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    def _evict_idle_locked(self, now: float) -> list[Any]:
+        evicted: list[Any] = []
+        if self.idle_timeout <= 0:
+            return evicted
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._discarded += 1
+            evicted.append(conn)
+        return evicted
+
+    @staticmethod
+    def _close_quietly(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _ping(self, conn: Any) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchall()
+        except Exception:
+            return False
+        return True
+
+    def acquire(self) -> Any:
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        waited = False
+
+        while True:
+            conn = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                evicted = self._evict_idle_locked(time.monotonic())
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"timed out after {self.checkout_timeout:.1f}s waiting for a database "
+                            f"connection (pool size {self.max_size})"
+                        )
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                    if self._closed:
+                        raise RuntimeError("connection pool is closed")
+
+                if self._idle:
+                    conn, _ = self._idle.pop()
+                else:
+                    create = True
+                    self._size += 1
+                self._in_use += 1
+
+            for stale in evicted:
+                self._close_quietly(stale)
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+                with self._cond:
+                    self._created += 1
+            elif self.pre_ping and not self._ping(conn):
+                self._close_quietly(conn)
+                self._forget()
+                continue
+
+            waited_seconds = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                if waited:
+                    self._wait_count += 1
+                    self._wait_seconds_total += waited_seconds
+                    self._wait_seconds_max = max(self._wait_seconds_max, waited_seconds)
+            return conn
+
+    def _forget(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        if discard or self._closed:
+            self._close_quietly(conn)
+            self._forget()
+            return
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            checkouts = self._checkouts
+            wait_avg = self._wait_seconds_total / checkouts if checkouts else 0.0
+            return {
+                "name": self.name,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": checkouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "timeouts": self._timeouts,
+                "wait_count": self._wait_count,
+                "wait_seconds_total": round(self._wait_seconds_total, 6),
+                "wait_seconds_max": round(self._wait_seconds_max, 6),
+                "wait_seconds_avg": round(wait_avg, 6),
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+
+_POOLS: dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_connection_pool(
+    key: str, connect: Callable[[], Any], **options: Any
+) -> ConnectionPool:
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(connect, **options)
+            _POOLS[key] = pool
+        return pool
+
+
+def pool_stats() -> list[dict[str, Any]]:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return [pool.stats() for pool in pools]
+
+
+def close_all_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from app.db import month_range
+
+
+def report_cache_key(
+    year: int,
+    month: int,
+    sourcetype_filter: str,
+    day_start_hour: int,
+    rules_hash: str,
+    stations_hash: str,
+) -> str:
+    payload = json.dumps(
+        [year, month, sourcetype_filter, day_start_hour, rules_hash, stations_hash],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 256 * 1024 * 1024,
+        settle_hours: float = 72.0,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.settle_hours = settle_hours
+        self._now = now
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self._initialize()
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _initialize(self) -> None:
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS report_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        year INTEGER NOT NULL,
+                        month INTEGER NOT NULL,
+                        sourcetype_filter TEXT NOT NULL,
+                        day_start_hour INTEGER NOT NULL,
+                        rules_hash TEXT NOT NULL,
+                        stations_hash TEXT NOT NULL,
+                        payload BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_report_cache_last_access "
+                    "ON report_cache (last_access)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ix_report_cache_year_month "
+                    "ON report_cache (year, month)"
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def is_month_closed(self, year: int, month: int, day_start_hour: int) -> bool:
+        _, end = month_range(year, month, day_start_hour=day_start_hour)
+        return self._now() >= end + timedelta(hours=self.settle_hours)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload FROM report_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE report_cache SET last_access = ? WHERE cache_key = ?",
+                (time.time(), key),
+            )
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def created_at(self, key: str) -> float | None:
+        # Identifies the stored build; it changes whenever the entry is rebuilt.
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT created_at FROM report_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def put(
+        self,
+        key: str,
+        report: dict[str, Any],
+        sourcetype_filter: str,
+        rules_hash: str,
+        stations_hash: str,
+    ) -> None:
+        payload = zlib.compress(
+            json.dumps(report, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        )
+        if len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO report_cache (
+                    cache_key, year, month, sourcetype_filter, day_start_hour,
+                    rules_hash, stations_hash, payload, size, created_at, last_access
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    key,
+                    report["year"],
+                    report["month"],
+                    sourcetype_filter,
+                    report["day_start_hour"],
+                    rules_hash,
+                    stations_hash,
+                    payload,
+                    len(payload),
+                    now,
+                    now,
+                ),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM report_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute(
+            "SELECT cache_key, size FROM report_cache ORDER BY last_access ASC"
+        ).fetchall()
+        expired: list[tuple[str]] = []
+        for cache_key, size in rows:
+            if total <= self.max_bytes:
+                break
+            expired.append((cache_key,))
+            total -= size
+        conn.executemany("DELETE FROM report_cache WHERE cache_key = ?", expired)
+
+    def invalidate(self, year: int | None = None, month: int | None = None) -> int:
+        clauses: list[str] = []
+        params: list[Any] = []
+        if year is not None:
+            clauses.append("year = ?")
+            params.append(year)
+        if month is not None:
+            clauses.append("month = ?")
+            params.append(month)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            cursor = conn.execute(f"DELETE FROM report_cache{where}", params)
+            return cursor.rowcount
+
+    def stats(self) -> dict[str, Any]:
+        with self._connect() as conn:
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM report_cache"
+            ).fetchone()
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "settle_hours": self.settle_hours,
+        }
@@ -1,8 +1,17 @@
 from __future__ import annotations
 
 import calendar
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Any
+from functools import lru_cache
+from typing import Any, Callable, Iterable
+
+from app.metrics import stage
+from app.slot_store import SlotBitmap
 
 
 def _clean_text(value: Any) -> str:
@@ -28,37 +37,15 @@ def _normalize_int_mapping(raw: Any) -> dict[str, int]:
     return mapping
 
 
-def resolve_daily_expected(station_id: str, ctype: str, rules: dict[str, Any]) -> int:
-    station_daily_expected = _normalize_int_mapping(rules.get("station_daily_expected"))
-    station_overrides = _normalize_int_mapping(rules.get("station_overrides"))
-    ctype_daily_expected = _normalize_int_mapping(rules.get("ctype_daily_expected"))
-    ctype_defaults = _normalize_int_mapping(rules.get("ctype_defaults"))
-
-    station_key = _clean_text(station_id)
-    ctype_key = _clean_text(ctype)
-
-    if station_key in station_daily_expected:
-        return station_daily_expected[station_key]
-    if station_key in station_overrides:
-        return station_overrides[station_key]
-    if ctype_key in ctype_defaults:
-        return ctype_defaults[ctype_key]
-    if "*" in ctype_defaults:
-        return ctype_defaults["*"]
-    if ctype_key in ctype_daily_expected:
-        return ctype_daily_expected[ctype_key]
-
-    default_daily_expected = rules.get("default_daily_expected", 24)
+def _parse_default_daily_expected(raw: Any) -> int:
     try:
-        parsed_default = int(default_daily_expected)
+        parsed_default = int(raw)
     except (TypeError, ValueError):
         parsed_default = 24
-
     return parsed_default if parsed_default > 0 else 24
 
 
-def resolve_day_start_hour(rules: dict[str, Any]) -> int:
-    raw = rules.get("day_start_hour", 9)
+def _parse_day_start_hour(raw: Any) -> int:
     try:
         parsed = int(raw)
     except (TypeError, ValueError):
@@ -68,26 +55,143 @@ def resolve_day_start_hour(rules: dict[str, Any]) -> int:
     return 9
 
 
+@lru_cache(maxsize=None)
+def minute_slot_table(reports_per_day: int) -> tuple[int, ...]:
+    if reports_per_day <= 0:
+        raise ValueError("reports_per_day must be a positive integer")
+    return tuple(
+        min((minute_of_day * reports_per_day) // 1440, reports_per_day - 1)
+        for minute_of_day in range(1440)
+    )
+
+
+@dataclass(frozen=True)
+class CompiledRules:
+    fingerprint: str
+    default_daily_expected: int
+    day_start_hour: int
+    station_daily_expected: dict[str, int]
+    station_overrides: dict[str, int]
+    ctype_defaults: dict[str, int]
+    ctype_daily_expected: dict[str, int]
+    station_expected: dict[str, int] = field(repr=False)
+    _ctype_expected: dict[str, int] = field(default_factory=dict, repr=False)
+
+    def expected_for(self, station_id: str, ctype: str) -> int:
+        expected = self.station_expected.get(station_id)
+        if expected is not None:
+            return expected
+        expected = self._ctype_expected.get(ctype)
+        if expected is None:
+            expected = self._resolve_ctype(ctype)
+            self._ctype_expected[ctype] = expected
+        return expected
+
+    def _resolve_ctype(self, ctype: str) -> int:
+        if ctype in self.ctype_defaults:
+            return self.ctype_defaults[ctype]
+        if "*" in self.ctype_defaults:
+            return self.ctype_defaults["*"]
+        if ctype in self.ctype_daily_expected:
+            return self.ctype_daily_expected[ctype]
+        return self.default_daily_expected
+
+    def slot_table(self, reports_per_day: int) -> tuple[int, ...]:
+        return minute_slot_table(reports_per_day)
+
+
+def rules_fingerprint(rules: dict[str, Any]) -> str:
+    payload = json.dumps(rules, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stations_fingerprint(stations: Iterable[dict[str, Any]]) -> str:
+    digest = hashlib.sha256()
+    for station in stations:
+        station_id = _clean_text(station.get("station_id"))
+        if not station_id:
+            continue
+        fields = (station_id, _clean_text(station.get("cname")), _clean_text(station.get("ctype")))
+        digest.update("\x1f".join(fields).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def _compile_rules(rules: dict[str, Any], fingerprint: str) -> CompiledRules:
+    station_daily_expected = _normalize_int_mapping(rules.get("station_daily_expected"))
+    station_overrides = _normalize_int_mapping(rules.get("station_overrides"))
+
+    # station_daily_expected wins over station_overrides, so merge it last.
+    station_expected = dict(station_overrides)
+    station_expected.update(station_daily_expected)
+
+    compiled = CompiledRules(
+        fingerprint=fingerprint,
+        default_daily_expected=_parse_default_daily_expected(rules.get("default_daily_expected", 24)),
+        day_start_hour=_parse_day_start_hour(rules.get("day_start_hour", 9)),
+        station_daily_expected=station_daily_expected,
+        station_overrides=station_overrides,
+        ctype_defaults=_normalize_int_mapping(rules.get("ctype_defaults")),
+        ctype_daily_expected=_normalize_int_mapping(rules.get("ctype_daily_expected")),
+        station_expected=station_expected,
+    )
+    for reports_per_day in set(station_expected.values()):
+        minute_slot_table(reports_per_day)
+    return compiled
+
+
+_COMPILED_RULES: OrderedDict[str, CompiledRules] = OrderedDict()
+_COMPILED_RULES_LOCK = threading.Lock()
+_COMPILED_RULES_MAX = 8
+
+
+def compile_rules(rules: dict[str, Any] | CompiledRules) -> CompiledRules:
+    if isinstance(rules, CompiledRules):
+        return rules
+
+    fingerprint = rules_fingerprint(rules)
+    with _COMPILED_RULES_LOCK:
+        compiled = _COMPILED_RULES.get(fingerprint)
+        if compiled is not None:
+            _COMPILED_RULES.move_to_end(fingerprint)
+            return compiled
+
+    compiled = _compile_rules(rules, fingerprint)
+    with _COMPILED_RULES_LOCK:
+        _COMPILED_RULES[fingerprint] = compiled
+        while len(_COMPILED_RULES) > _COMPILED_RULES_MAX:
+            _COMPILED_RULES.popitem(last=False)
+    return compiled
+
+
+def resolve_daily_expected(
+    station_id: str, ctype: str, rules: dict[str, Any] | CompiledRules
+) -> int:
+    compiled = rules if isinstance(rules, CompiledRules) else _compile_rules(rules, "")
+    return compiled.expected_for(_clean_text(station_id), _clean_text(ctype))
+
+
+def resolve_day_start_hour(rules: dict[str, Any] | CompiledRules) -> int:
+    if isinstance(rules, CompiledRules):
+        return rules.day_start_hour
+    return _parse_day_start_hour(rules.get("day_start_hour", 9))
+
+
 def slot_index(data_time: datetime, reports_per_day: int, day_start_hour: int = 0) -> int:
     if reports_per_day <= 0:
         raise ValueError("reports_per_day must be a positive integer")
 
     minute_of_day = (((data_time.hour - day_start_hour) % 24) * 60) + data_time.minute
-    slot_minutes = 1440 / reports_per_day
-    index = int(minute_of_day // slot_minutes)
+    # Integer arithmetic keeps slot boundaries exact for rates that do not divide 1440
+    # and matches the push-down query in SQLServerRepository.fetch_slot_counts.
+    index = (minute_of_day * reports_per_day) // 1440
     return min(index, reports_per_day - 1)
 
 
-def build_monthly_report(
-    stations: list[dict[str, Any]],
-    records: list[dict[str, Any]],
-    year: int,
-    month: int,
-    rules: dict[str, Any],
-) -> dict[str, Any]:
-    days_in_month = calendar.monthrange(year, month)[1]
-    day_start_hour = resolve_day_start_hour(rules)
-
+def _normalize_stations(
+    stations: list[dict[str, Any]], rules: dict[str, Any] | CompiledRules
+) -> tuple[list[dict[str, str]], dict[str, int]]:
+    compiled = compile_rules(rules)
     normalized_stations: list[dict[str, str]] = []
     station_expected_per_day: dict[str, int] = {}
 
@@ -98,7 +202,7 @@ def build_monthly_report(
 
         station_name = _clean_text(station.get("cname")) or station_id
         ctype = _clean_text(station.get("ctype"))
-        expected_per_day = resolve_daily_expected(station_id, ctype, rules)
+        expected_per_day = compiled.expected_for(station_id, ctype)
 
         normalized_stations.append(
             {
@@ -109,62 +213,321 @@ def build_monthly_report(
         )
         station_expected_per_day[station_id] = expected_per_day
 
-    arrived_slots: dict[tuple[str, int], set[int]] = {}
-    valid_station_ids = set(station_expected_per_day)
-
-    for record in records:
-        station_id = _clean_text(record.get("station_id"))
-        if station_id not in valid_station_ids:
-            continue
-
-        data_time = record.get("datatime")
+    return normalized_stations, station_expected_per_day
+
+
+def resolve_station_expected(
+    stations: list[dict[str, Any]], rules: dict[str, Any] | CompiledRules
+) -> dict[str, int]:
+    _, station_expected_per_day = _normalize_stations(stations, rules)
+    return station_expected_per_day
+
+
+class SlotAggregator:
+    def __init__(
+        self,
+        station_expected_per_day: dict[str, int],
+        year: int,
+        month: int,
+        day_start_hour: int,
+    ):
+        self.station_expected_per_day = station_expected_per_day
+        self.year = year
+        self.month = month
+        self.day_start_hour = day_start_hour
+        self.rows_seen = 0
+        self.max_data_time: datetime | None = None
+        self._shift = timedelta(hours=day_start_hour)
+        self.slots = SlotBitmap(
+            station_expected_per_day,
+            calendar.monthrange(year, month)[1],
+            max(station_expected_per_day.values(), default=1),
+        )
+        # station_id -> (first word of the station's cells, minute -> slot table)
+        self._stations = {
+            station_id: (
+                self.slots.positions[station_id] * self.slots.days * self.slots.words_per_cell,
+                minute_slot_table(expected_per_day),
+            )
+            for station_id, expected_per_day in station_expected_per_day.items()
+        }
+
+    def add(self, station_id: str, data_time: Any) -> None:
+        self.rows_seen += 1
+        station = self._stations.get(station_id)
+        if station is None:
+            return
         if not isinstance(data_time, datetime):
-            continue
+            return
+        if self.max_data_time is None or data_time > self.max_data_time:
+            self.max_data_time = data_time
+
+        shifted_time = data_time - self._shift
+        if shifted_time.year != self.year or shifted_time.month != self.month:
+            return
+
+        base, slot_table = station
+        slot = slot_table[shifted_time.hour * 60 + shifted_time.minute]
+        width = self.slots.words_per_cell
+        self.slots.words[base + (shifted_time.day - 1) * width + (slot >> 6)] |= 1 << (slot & 63)
+
+    def add_batch(self, batch: Iterable[tuple[str, Any]]) -> None:
+        add = self.add
+        for station_id, data_time in batch:
+            add(station_id, data_time)
+
+    def add_records(self, records: Iterable[dict[str, Any]]) -> None:
+        add = self.add
+        for record in records:
+            add(_clean_text(record.get("station_id")), record.get("datatime"))
+
+    def merge(self, other: SlotAggregator) -> SlotAggregator:
+        self.slots.union_update(other.slots)
+        self.rows_seen += other.rows_seen
+        if other.max_data_time is not None and (
+            self.max_data_time is None or other.max_data_time > self.max_data_time
+        ):
+            self.max_data_time = other.max_data_time
+        return self
+
+    def copy(self) -> SlotAggregator:
+        clone = SlotAggregator.__new__(SlotAggregator)
+        clone.__dict__.update(self.__dict__)
+        clone.slots = self.slots.copy()
+        return clone
+
+    def daily_counts(self) -> dict[tuple[str, int], int]:
+        return {(station_id, day): count for station_id, day, count in self.slots.iter_counts()}
+
+
+def aggregate_slot_counts(
+    records: Iterable[dict[str, Any]],
+    station_expected_per_day: dict[str, int],
+    year: int,
+    month: int,
+    day_start_hour: int,
+) -> dict[tuple[str, int], int]:
+    aggregator = SlotAggregator(station_expected_per_day, year, month, day_start_hour)
+    aggregator.add_records(records)
+    return aggregator.daily_counts()
 
-        shifted_time = data_time - timedelta(hours=day_start_hour)
-        if shifted_time.year != year or shifted_time.month != month:
-            continue
 
-        day = shifted_time.day
-        expected_per_day = station_expected_per_day[station_id]
-        slot = slot_index(data_time, expected_per_day, day_start_hour=day_start_hour)
+def _rate(actual_total: int, expected_total: int) -> float:
+    return round((actual_total / expected_total) * 100, 1) if expected_total else 0.0
 
-        key = (station_id, day)
-        if key not in arrived_slots:
-            arrived_slots[key] = set()
-        arrived_slots[key].add(slot)
 
-    rows: list[dict[str, Any]] = []
+def _daily_actuals_from_counts(
+    normalized_stations: list[dict[str, str]],
+    daily_counts: dict[tuple[str, int], int],
+    days_in_month: int,
+) -> list[list[int]]:
+    daily_actuals: list[list[int]] = []
     for station in normalized_stations:
         station_id = station["station_id"]
-        expected_per_day = station_expected_per_day[station_id]
+        daily_actuals.append(
+            [daily_counts.get((station_id, day), 0) for day in range(1, days_in_month + 1)]
+        )
+    return daily_actuals
 
-        daily_actual: list[int] = []
-        for day in range(1, days_in_month + 1):
-            daily_actual.append(len(arrived_slots.get((station_id, day), set())))
 
-        expected_total = expected_per_day * days_in_month
-        actual_total = sum(daily_actual)
-        rate = round((actual_total / expected_total) * 100, 1) if expected_total else 0.0
+def _assemble_report(
+    normalized_stations: list[dict[str, str]],
+    station_expected_per_day: dict[str, int],
+    daily_counts: dict[tuple[str, int], int] | list[list[int]],
+    year: int,
+    month: int,
+    day_start_hour: int,
+) -> dict[str, Any]:
+    with stage("assemble", len(normalized_stations)):
+        days_in_month = calendar.monthrange(year, month)[1]
+        if isinstance(daily_counts, dict):
+            daily_actuals = _daily_actuals_from_counts(
+                normalized_stations, daily_counts, days_in_month
+            )
+        else:
+            daily_actuals = daily_counts
+
+        rows: list[dict[str, Any]] = []
+        for station, daily_actual in zip(normalized_stations, daily_actuals):
+            station_id = station["station_id"]
+            expected_per_day = station_expected_per_day[station_id]
+
+            expected_total = expected_per_day * days_in_month
+            actual_total = sum(daily_actual)
+            rate = _rate(actual_total, expected_total)
+
+            rows.append(
+                {
+                    "station_id": station_id,
+                    "station_name": station["cname"],
+                    "ctype": station["ctype"],
+                    "expected_per_day": expected_per_day,
+                    "daily_actual": daily_actual,
+                    "expected_total": expected_total,
+                    "actual_total": actual_total,
+                    "rate": rate,
+                }
+            )
+
+        return {
+            "year": year,
+            "month": month,
+            "day_start_hour": day_start_hour,
+            "days_in_month": days_in_month,
+            "day_headers": list(range(1, days_in_month + 1)),
+            "rows": rows,
+        }
+
 
+def build_monthly_report(
+    stations: list[dict[str, Any]],
+    records: Iterable[dict[str, Any]],
+    year: int,
+    month: int,
+    rules: dict[str, Any] | CompiledRules,
+    slot_sink: Callable[[SlotAggregator], None] | None = None,
+) -> dict[str, Any]:
+    day_start_hour = resolve_day_start_hour(rules)
+    normalized_stations, station_expected_per_day = _normalize_stations(stations, rules)
+    with stage("aggregate") as timing:
+        aggregator = SlotAggregator(station_expected_per_day, year, month, day_start_hour)
+        aggregator.add_records(records)
+        daily_counts = aggregator.daily_counts()
+        timing.rows = aggregator.rows_seen
+    if slot_sink is not None:
+        slot_sink(aggregator)
+    return _assemble_report(
+        normalized_stations, station_expected_per_day, daily_counts, year, month, day_start_hour
+    )
+
+
+def build_monthly_report_from_batches(
+    stations: list[dict[str, Any]],
+    batches: Iterable[Iterable[tuple[str, Any]]],
+    year: int,
+    month: int,
+    rules: dict[str, Any] | CompiledRules,
+    slot_sink: Callable[[SlotAggregator], None] | None = None,
+) -> dict[str, Any]:
+    day_start_hour = resolve_day_start_hour(rules)
+    normalized_stations, station_expected_per_day = _normalize_stations(stations, rules)
+    with stage("aggregate") as timing:
+        aggregator = SlotAggregator(station_expected_per_day, year, month, day_start_hour)
+        for batch in batches:
+            aggregator.add_batch(batch)
+        daily_counts = aggregator.daily_counts()
+        timing.rows = aggregator.rows_seen
+    if slot_sink is not None:
+        slot_sink(aggregator)
+    return _assemble_report(
+        normalized_stations,
+        station_expected_per_day,
+        daily_counts,
+        year,
+        month,
+        day_start_hour,
+    )
+
+
+def build_monthly_report_from_aggregator(
+    stations: list[dict[str, Any]],
+    aggregator: SlotAggregator,
+    rules: dict[str, Any] | CompiledRules,
+) -> dict[str, Any]:
+    normalized_stations, station_expected_per_day = _normalize_stations(stations, rules)
+    return _assemble_report(
+        normalized_stations,
+        station_expected_per_day,
+        aggregator.daily_counts(),
+        aggregator.year,
+        aggregator.month,
+        aggregator.day_start_hour,
+    )
+
+
+def build_monthly_report_from_counts(
+    stations: list[dict[str, Any]],
+    slot_counts: Iterable[dict[str, Any]],
+    year: int,
+    month: int,
+    rules: dict[str, Any] | CompiledRules,
+) -> dict[str, Any]:
+    day_start_hour = resolve_day_start_hour(rules)
+    normalized_stations, station_expected_per_day = _normalize_stations(stations, rules)
+
+    daily_counts: dict[tuple[str, int], int] = {}
+    for item in slot_counts:
+        station_id = _clean_text(item.get("station_id"))
+        if station_id not in station_expected_per_day:
+            continue
+        try:
+            day = int(item.get("day"))
+            actual = int(item.get("actual"))
+        except (TypeError, ValueError):
+            continue
+        key = (station_id, day)
+        daily_counts[key] = daily_counts.get(key, 0) + actual
+
+    return _assemble_report(
+        normalized_stations, station_expected_per_day, daily_counts, year, month, day_start_hour
+    )
+
+
+def summarize_range_report(monthly_reports: list[dict[str, Any]]) -> dict[str, Any]:
+    months: list[dict[str, Any]] = []
+    station_rows: dict[str, dict[str, Any]] = {}
+
+    for report in monthly_reports:
+        expected_total = 0
+        actual_total = 0
+        for row in report["rows"]:
+            expected_total += row["expected_total"]
+            actual_total += row["actual_total"]
+
+            summary = station_rows.get(row["station_id"])
+            if summary is None:
+                summary = station_rows[row["station_id"]] = {
+                    "station_id": row["station_id"],
+                    "station_name": row["station_name"],
+                    "ctype": row["ctype"],
+                    "monthly_expected": [0] * len(monthly_reports),
+                    "monthly_actual": [0] * len(monthly_reports),
+                }
+            summary["monthly_expected"][len(months)] = row["expected_total"]
+            summary["monthly_actual"][len(months)] = row["actual_total"]
+
+        months.append(
+            {
+                "year": report["year"],
+                "month": report["month"],
+                "days_in_month": report["days_in_month"],
+                "station_count": len(report["rows"]),
+                "expected_total": expected_total,
+                "actual_total": actual_total,
+                "rate": _rate(actual_total, expected_total),
+            }
+        )
+
+    rows: list[dict[str, Any]] = []
+    for summary in station_rows.values():
+        expected_total = sum(summary["monthly_expected"])
+        actual_total = sum(summary["monthly_actual"])
         rows.append(
             {
-                "station_id": station_id,
-                "station_name": station["cname"],
-                "ctype": station["ctype"],
-                "expected_per_day": expected_per_day,
-                "daily_actual": daily_actual,
+                **summary,
                 "expected_total": expected_total,
                 "actual_total": actual_total,
-                "rate": rate,
+                "rate": _rate(actual_total, expected_total),
             }
         )
 
+    expected_total = sum(month["expected_total"] for month in months)
+    actual_total = sum(month["actual_total"] for month in months)
     return {
-        "year": year,
-        "month": month,
-        "day_start_hour": day_start_hour,
-        "days_in_month": days_in_month,
-        "day_headers": list(range(1, days_in_month + 1)),
+        "months": months,
+        "month_headers": [f"{month['year']}-{month['month']:02d}" for month in months],
+        "expected_total": expected_total,
+        "actual_total": actual_total,
+        "rate": _rate(actual_total, expected_total),
         "rows": rows,
     }
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import calendar
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable
+
+from app.metrics import stage
+from app.report_logic import (
+    CompiledRules,
+    SlotAggregator,
+    _assemble_report,
+    _clean_text,
+    _normalize_stations,
+    resolve_day_start_hour,
+)
+
+EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = EPOCH.toordinal()
+_MISSING_MINUTE = -(2**63)
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def numpy_available() -> bool:
+    return _import_numpy() is not None
+
+
+def _require_numpy():
+    numpy = _import_numpy()
+    if numpy is None:
+        raise RuntimeError(
+            "numpy is required for the vectorized engine. Please run `uv sync --extra fast`."
+        )
+    return numpy
+
+
+@dataclass
+class ColumnarRecords:
+    # station_codes index into station_ids; epoch_minutes are naive local times in
+    # whole minutes since 1970-01-01, which is all the slot math needs.
+    station_ids: list[str]
+    station_codes: Any
+    epoch_minutes: Any
+
+    def __len__(self) -> int:
+        return len(self.station_codes)
+
+
+def _epoch_minute(value: Any) -> int:
+    if not isinstance(value, datetime):
+        return _MISSING_MINUTE
+    return (value.toordinal() - _EPOCH_ORDINAL) * 1440 + value.hour * 60 + value.minute
+
+
+def columnar_from_batches(batches: Iterable[Iterable[tuple[str, Any]]]) -> ColumnarRecords:
+    np = _require_numpy()
+    station_positions: dict[str, int] = {}
+    intern = station_positions.setdefault
+    code_chunks = []
+    minute_chunks = []
+
+    with stage("columnar") as timing:
+        for batch in batches:
+            batch = list(batch)
+            if not batch:
+                continue
+            ids, times = zip(*batch)
+            # numpy's own datetime parsing is several times slower than ordinal arithmetic
+            # on Python datetimes, so both columns are filled with fromiter.
+            codes = np.fromiter(
+                (intern(station_id, len(station_positions)) for station_id in ids),
+                dtype=np.int32,
+                count=len(ids),
+            )
+            minutes = np.fromiter(map(_epoch_minute, times), dtype=np.int64, count=len(times))
+            valid = minutes != _MISSING_MINUTE
+            code_chunks.append(codes[valid])
+            minute_chunks.append(minutes[valid])
+        timing.rows = sum(len(chunk) for chunk in code_chunks)
+
+    if code_chunks:
+        codes = np.concatenate(code_chunks)
+        minutes = np.concatenate(minute_chunks)
+    else:
+        codes = np.empty(0, dtype=np.int32)
+        minutes = np.empty(0, dtype=np.int64)
+    return ColumnarRecords(
+        station_ids=list(station_positions), station_codes=codes, epoch_minutes=minutes
+    )
+
+
+def columnar_from_records(records: Iterable[dict[str, Any]]) -> ColumnarRecords:
+    batch = [(_clean_text(record.get("station_id")), record.get("datatime")) for record in records]
+    return columnar_from_batches([batch])
+
+
+def _fallback_report(
+    stations: list[dict[str, Any]],
+    columns: ColumnarRecords,
+    year: int,
+    month: int,
+    rules: dict[str, Any] | CompiledRules,
+) -> dict[str, Any]:
+    day_start_hour = resolve_day_start_hour(rules)
+    normalized_stations, station_expected_per_day = _normalize_stations(stations, rules)
+    aggregator = SlotAggregator(station_expected_per_day, year, month, day_start_hour)
+    aggregator.add_batch(
+        (columns.station_ids[int(code)], EPOCH + timedelta(minutes=int(minute)))
+        for code, minute in zip(columns.station_codes, columns.epoch_minutes)
+    )
+    return _assemble_report(
+        normalized_stations,
+        station_expected_per_day,
+        aggregator.daily_counts(),
+        year,
+        month,
+        day_start_hour,
+    )
+
+
+def build_monthly_report_columnar(
+    stations: list[dict[str, Any]],
+    columns: ColumnarRecords,
+    year: int,
+    month: int,
+    rules: dict[str, Any] | CompiledRules,
+) -> dict[str, Any]:
+    np = _import_numpy()
+    if np is None:
+        return _fallback_report(stations, columns, year, month, rules)
+
+    day_start_hour = resolve_day_start_hour(rules)
+    days_in_month = calendar.monthrange(year, month)[1]
+    normalized_stations, station_expected_per_day = _normalize_stations(stations, rules)
+
+    report_ids = list(station_expected_per_day)
+    report_positions = {station_id: index for index, station_id in enumerate(report_ids)}
+    station_count = len(report_ids)
+    counts = np.zeros((station_count, days_in_month), dtype=np.int64)
+
+    with stage("aggregate", len(columns)):
+        if station_count and len(columns):
+            expected = np.fromiter(
+                (station_expected_per_day[station_id] for station_id in report_ids),
+                dtype=np.int64,
+                count=station_count,
+            )
+            code_to_position = np.fromiter(
+                (report_positions.get(station_id, -1) for station_id in columns.station_ids),
+                dtype=np.int64,
+                count=len(columns.station_ids),
+            )
+
+            positions = code_to_position[np.asarray(columns.station_codes)]
+            shifted = np.asarray(columns.epoch_minutes, dtype=np.int64) - day_start_hour * 60
+            month_start = (date(year, month, 1) - EPOCH.date()).days
+            day_offset = shifted // 1440 - month_start
+            keep = (positions >= 0) & (day_offset >= 0) & (day_offset < days_in_month)
+
+            positions = positions[keep]
+            day_offset = day_offset[keep]
+            record_expected = expected[positions]
+            slots = (shifted[keep] % 1440) * record_expected // 1440
+
+            max_expected = int(expected.max())
+            packed = np.sort((positions * days_in_month + day_offset) * max_expected + slots)
+            # Sort-then-compare instead of np.unique: NumPy 2's hash-based unique is far
+            # slower than a plain sort for dense int64 keys.
+            if len(packed):
+                first = np.empty(len(packed), dtype=bool)
+                first[0] = True
+                np.not_equal(packed[1:], packed[:-1], out=first[1:])
+                packed = packed[first]
+            counts = np.bincount(
+                packed // max_expected, minlength=station_count * days_in_month
+            ).reshape(station_count, days_in_month)
+
+    matrix = counts.tolist()
+    daily_actuals = [
+        list(matrix[report_positions[station["station_id"]]]) for station in normalized_stations
+    ]
+    return _assemble_report(
+        normalized_stations,
+        station_expected_per_day,
+        daily_actuals,
+        year,
+        month,
+        day_start_hour,
+    )
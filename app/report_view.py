@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+REPORT_SORT_KEYS = ("station_id", "rate", "actual_total", "expected_total")
+MAX_PAGE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class ReportView:
+    # Filters, order and page applied to a built report's rows. `sort` is a row
+    # field, prefixed with "-" for descending; ties keep the report's order.
+    ctypes: tuple[str, ...] = ()
+    station_prefix: str = ""
+    min_rate: float | None = None
+    max_rate: float | None = None
+    sort: str = ""
+    offset: int = 0
+    limit: int | None = None
+
+    def __post_init__(self):
+        if self.sort and self.sort.removeprefix("-") not in REPORT_SORT_KEYS:
+            raise ValueError(f"sort must be one of {REPORT_SORT_KEYS}, got {self.sort!r}")
+        if self.offset < 0:
+            raise ValueError("offset must not be negative")
+        if self.limit is not None and not 0 < self.limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    @property
+    def is_identity(self) -> bool:
+        return self == ReportView()
+
+    def token(self) -> str:
+        # Stable text form, used to tell apart ETags of different views.
+        return "|".join(
+            str(value)
+            for value in (
+                ",".join(self.ctypes),
+                self.station_prefix,
+                self.min_rate,
+                self.max_rate,
+                self.sort,
+                self.offset,
+                self.limit,
+            )
+        )
+
+
+def parse_ctypes(raw: str | None) -> tuple[str, ...]:
+    return tuple(sorted({part.strip() for part in (raw or "").split(",") if part.strip()}))
+
+
+def apply_report_view(report: dict[str, Any], view: ReportView) -> dict[str, Any]:
+    if view.is_identity:
+        return report
+
+    rows = report["rows"]
+    if view.ctypes:
+        ctypes = set(view.ctypes)
+        rows = [row for row in rows if row["ctype"] in ctypes]
+    if view.station_prefix:
+        rows = [row for row in rows if row["station_id"].startswith(view.station_prefix)]
+    if view.min_rate is not None:
+        rows = [row for row in rows if row["rate"] >= view.min_rate]
+    if view.max_rate is not None:
+        rows = [row for row in rows if row["rate"] < view.max_rate]
+    if view.sort:
+        field = view.sort.removeprefix("-")
+        rows = sorted(rows, key=lambda row: row[field], reverse=view.sort.startswith("-"))
+
+    total_rows = len(rows)
+    end = total_rows if view.limit is None else view.offset + view.limit
+    paged = {key: value for key, value in report.items() if key != "rows"}
+    paged["rows"] = rows[view.offset : end]
+    paged["station_count"] = len(report["rows"])
+    paged["total_rows"] = total_rows
+    paged["offset"] = view.offset
+    paged["limit"] = view.limit
+    return paged
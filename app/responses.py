@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import time
+from typing import Any
+
+from fastapi.responses import Response
+
+from app.metrics import record_stage
+
+REPORT_SHAPES = ("rows", "columnar")
+ROW_COLUMNS = (
+    "station_id",
+    "station_name",
+    "ctype",
+    "expected_per_day",
+    "expected_total",
+    "actual_total",
+    "rate",
+)
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+
+
+def _import_orjson():
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def _import_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def columnar_report(report: dict[str, Any]) -> dict[str, Any]:
+    # One array per row field plus a station x day matrix, instead of repeating
+    # every key for every station.
+    rows = report["rows"]
+    columnar = {key: value for key, value in report.items() if key != "rows"}
+    columnar["shape"] = "columnar"
+    columnar["columns"] = {column: [row[column] for row in rows] for column in ROW_COLUMNS}
+    columnar["daily_actual"] = [row["daily_actual"] for row in rows]
+    return columnar
+
+
+def encode_json(payload: Any) -> bytes:
+    # orjson (optional, `uv sync --extra fast`) is several times faster than
+    # the json module; both emit the same compact UTF-8 text.
+    orjson = _import_orjson()
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(
+        payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    accepted: dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    candidates = ("br", "gzip") if _import_brotli() is not None else ("gzip",)
+    for encoding in candidates:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return _import_brotli().compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def content_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # Compressed representations carry "<tag>-<coding>"; any representation of
+    # the same report counts as a match.
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    base = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        tag = candidate.strip().removeprefix("W/").strip('"')
+        if tag == base or tag.rsplit("-", 1)[0] == base:
+            return True
+    return False
+
+
+def not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    return Response(
+        status_code=304,
+        headers={
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+            **(headers or {}),
+        },
+    )
+
+
+def json_response(
+    payload: Any,
+    accept_encoding: str | None = None,
+    etag: str | None = None,
+    if_none_match: str | None = None,
+    etag_from_content: bool = False,
+    headers: dict[str, str] | None = None,
+) -> tuple[Response, dict[str, float]]:
+    # Returns the response and the serialize/compress timings for Server-Timing.
+    # Without an input-derived `etag`, `etag_from_content` tags the encoded body
+    # so clients can still revalidate and skip the transfer.
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+    body = encode_json(payload)
+    timings["serialize"] = time.perf_counter() - started
+    record_stage("serialize", timings["serialize"])
+
+    if etag is None and etag_from_content:
+        etag = content_etag(body)
+    if etag is not None and etag_matches(if_none_match, etag):
+        return not_modified(etag, headers), timings
+
+    response_headers = {"Vary": "Accept-Encoding", **(headers or {})}
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding is not None:
+        started = time.perf_counter()
+        body = compress(body, encoding)
+        timings["compress"] = time.perf_counter() - started
+        record_stage("compress", timings["compress"])
+        response_headers["Content-Encoding"] = encoding
+    if etag is not None:
+        # Each content coding is a different representation, so it gets its own tag.
+        tag = etag.strip('"')
+        response_headers["ETag"] = f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+        response_headers["Cache-Control"] = "no-cache"
+
+    return Response(body, media_type="application/json", headers=response_headers), timings
@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+import argparse
+import calendar
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from app.federated import source_failures
+from app.metrics import stage
+from app.report_logic import CompiledRules, resolve_station_expected
+
+
+def rollup_key(
+    rules: CompiledRules, stations: list[dict[str, Any]], sourcetype_filter: str
+) -> str:
+    # The rules version as far as slot counts are concerned: the expected rate
+    # of every station, the hydro day boundary and the source type. Edits that
+    # do not change these (names, unrelated ctype defaults) keep the rollups.
+    payload = json.dumps(
+        [
+            sourcetype_filter,
+            rules.day_start_hour,
+            sorted(resolve_station_expected(stations, rules).items()),
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def hydro_day_window(day: date, day_start_hour: int) -> tuple[datetime, datetime]:
+    start = datetime(day.year, day.month, day.day, day_start_hour)
+    return start, start + timedelta(days=1)
+
+
+class DailyRollupStore:
+    # Per hydro day and station distinct-slot counts in a local SQLite file. A
+    # day is only rolled up once it has closed and `settle_minutes` have passed
+    # for late inserts; `rollup_days` records which days are complete so a day
+    # without any reports is told apart from one that was never computed.
+    def __init__(
+        self,
+        path: Path,
+        settle_minutes: float = 30.0,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self.path = Path(path)
+        self.settle = timedelta(minutes=settle_minutes)
+        self._now = now
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self._initialize()
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _initialize(self) -> None:
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS rollup_days (
+                        rollup_key TEXT NOT NULL,
+                        hydro_day TEXT NOT NULL,
+                        computed_at REAL NOT NULL,
+                        PRIMARY KEY (rollup_key, hydro_day)
+                    )
+                    """
+                )
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS daily_rollups (
+                        rollup_key TEXT NOT NULL,
+                        hydro_day TEXT NOT NULL,
+                        station_id TEXT NOT NULL,
+                        actual INTEGER NOT NULL,
+                        PRIMARY KEY (rollup_key, hydro_day, station_id)
+                    )
+                    """
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def is_day_closed(self, day: date, day_start_hour: int) -> bool:
+        return self._now() >= hydro_day_window(day, day_start_hour)[1] + self.settle
+
+    def last_closed_day(self, day_start_hour: int) -> date:
+        shifted = self._now() - self.settle - timedelta(hours=day_start_hour)
+        return shifted.date() - timedelta(days=1)
+
+    def next_close(self, day_start_hour: int) -> datetime:
+        following = self.last_closed_day(day_start_hour) + timedelta(days=2)
+        return hydro_day_window(following, day_start_hour)[0] + self.settle
+
+    def get(self, key: str, first: date, last: date) -> tuple[set[date], list[dict[str, Any]]]:
+        bounds = (key, first.isoformat(), last.isoformat())
+        with self._connect() as conn:
+            days = conn.execute(
+                "SELECT hydro_day FROM rollup_days "
+                "WHERE rollup_key = ? AND hydro_day BETWEEN ? AND ?",
+                bounds,
+            ).fetchall()
+            rows = conn.execute(
+                "SELECT hydro_day, station_id, actual FROM daily_rollups "
+                "WHERE rollup_key = ? AND hydro_day BETWEEN ? AND ?",
+                bounds,
+            ).fetchall()
+        counts = [
+            {"station_id": station_id, "day": date.fromisoformat(hydro_day).day, "actual": actual}
+            for hydro_day, station_id, actual in rows
+        ]
+        return {date.fromisoformat(row[0]) for row in days}, counts
+
+    def put(self, key: str, days: list[date], counts: list[dict[str, Any]]) -> None:
+        # `days` lie in one month; `counts` number them by day of month, as
+        # fetch_slot_counts does.
+        by_number = {day.day: day.isoformat() for day in days}
+        now = time.time()
+        with self._connect() as conn:
+            for day in days:
+                conn.execute(
+                    "DELETE FROM daily_rollups WHERE rollup_key = ? AND hydro_day = ?",
+                    (key, day.isoformat()),
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_rollups (rollup_key, hydro_day, station_id, actual) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (key, by_number[item["day"]], item["station_id"], int(item["actual"]))
+                    for item in counts
+                    if item["day"] in by_number
+                ],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO rollup_days (rollup_key, hydro_day, computed_at) "
+                "VALUES (?, ?, ?)",
+                [(key, day.isoformat(), now) for day in days],
+            )
+
+    def invalidate(self, key: str | None = None) -> int:
+        where, params = ("WHERE rollup_key = ?", (key,)) if key else ("", ())
+        with self._connect() as conn:
+            conn.execute(f"DELETE FROM daily_rollups {where}", params)
+            return conn.execute(f"DELETE FROM rollup_days {where}", params).rowcount
+
+    def stats(self) -> dict[str, Any]:
+        with self._connect() as conn:
+            versions = conn.execute(
+                "SELECT rollup_key, COUNT(*), MIN(hydro_day), MAX(hydro_day) FROM rollup_days "
+                "GROUP BY rollup_key ORDER BY MAX(computed_at) DESC"
+            ).fetchall()
+            rows = conn.execute("SELECT COUNT(*) FROM daily_rollups").fetchone()[0]
+        return {
+            "enabled": True,
+            "path": str(self.path),
+            "settle_minutes": self.settle.total_seconds() / 60,
+            "rows": rows,
+            "versions": [
+                {"rollup_key": key, "days": days, "first_day": first, "last_day": last}
+                for key, days, first, last in versions
+            ],
+        }
+
+
+def _contiguous_runs(days: list[date]) -> list[list[date]]:
+    runs: list[list[date]] = []
+    for day in sorted(days):
+        if runs and day - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def compute_rollups(
+    store: DailyRollupStore,
+    repo: Any,
+    stations: list[dict[str, Any]],
+    rules: CompiledRules,
+    sourcetype_filter: str,
+    days: list[date],
+) -> list[dict[str, Any]]:
+    # One pushed-down slot count query per run of consecutive days within a
+    # month; fetch_slot_counts numbers days within the month, so runs never
+    # cross a month boundary.
+    key = rollup_key(rules, stations, sourcetype_filter)
+    station_expected = resolve_station_expected(stations, rules)
+    counts: list[dict[str, Any]] = []
+    by_month: dict[tuple[int, int], list[date]] = {}
+    for day in days:
+        by_month.setdefault((day.year, day.month), []).append(day)
+
+    for month_days in by_month.values():
+        for run in _contiguous_runs(month_days):
+            start = hydro_day_window(run[0], rules.day_start_hour)[0]
+            end = hydro_day_window(run[-1], rules.day_start_hour)[1]
+            with stage("rollup_compute", len(run)):
+                run_counts = repo.fetch_slot_counts(
+                    start, end, sourcetype_filter, station_expected, rules.day_start_hour
+                )
+            if not source_failures(repo):
+                store.put(key, run, run_counts)
+            counts.extend(run_counts)
+    return counts
+
+
+def monthly_slot_counts(
+    store: DailyRollupStore,
+    repo: Any,
+    stations: list[dict[str, Any]],
+    rules: CompiledRules,
+    sourcetype_filter: str,
+    year: int,
+    month: int,
+) -> list[dict[str, Any]]:
+    # Closed days come from the rollup table (computing and storing any that
+    # are missing); only days still open are counted from raw records.
+    days = [date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+    closed = [day for day in days if store.is_day_closed(day, rules.day_start_hour)]
+    key = rollup_key(rules, stations, sourcetype_filter)
+
+    with stage("rollup_read", len(closed)):
+        stored_days, counts = store.get(key, days[0], days[-1]) if closed else (set(), [])
+    missing = [day for day in closed if day not in stored_days]
+    if missing:
+        counts += compute_rollups(store, repo, stations, rules, sourcetype_filter, missing)
+
+    if len(closed) < len(days):
+        start = hydro_day_window(days[len(closed)], rules.day_start_hour)[0]
+        end = hydro_day_window(days[-1], rules.day_start_hour)[1]
+        counts += repo.fetch_slot_counts(
+            start,
+            end,
+            sourcetype_filter,
+            resolve_station_expected(stations, rules),
+            rules.day_start_hour,
+        )
+    return counts
+
+
+def roll_up_closed_days(
+    store: DailyRollupStore,
+    repo: Any,
+    stations: list[dict[str, Any]],
+    rules: CompiledRules,
+    sourcetype_filter: str,
+    first: date,
+    last: date | None = None,
+) -> list[date]:
+    last = min(last or date.max, store.last_closed_day(rules.day_start_hour))
+    if first > last:
+        return []
+    key = rollup_key(rules, stations, sourcetype_filter)
+    stored_days, _ = store.get(key, first, last)
+    missing = [
+        first + timedelta(days=offset)
+        for offset in range((last - first).days + 1)
+        if first + timedelta(days=offset) not in stored_days
+    ]
+    if missing:
+        compute_rollups(store, repo, stations, rules, sourcetype_filter, missing)
+    return missing
+
+
+class RollupScheduler:
+    # Background thread that calls `run` shortly after each hydro day closes.
+    # `run` rolls up whatever is missing and returns when it should be called
+    # next; failures are kept for stats() and retried after `retry_seconds`.
+    def __init__(
+        self,
+        run: Callable[[], datetime],
+        max_sleep_seconds: float = 3600.0,
+        retry_seconds: float = 300.0,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self._run = run
+        self.max_sleep_seconds = max_sleep_seconds
+        self.retry_seconds = retry_seconds
+        self._now = now
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._runs = 0
+        self._last_run: datetime | None = None
+        self._next_run: datetime | None = None
+        self._last_error: str | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="daily-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> None:
+        try:
+            due = self._run()
+            self._last_error = None
+            delay = (due - self._now()).total_seconds()
+        except Exception as exc:
+            self._last_error = f"{type(exc).__name__}: {exc}"
+            delay = self.retry_seconds
+        self._runs += 1
+        self._last_run = self._now()
+        delay = min(max(delay, 1.0), self.max_sleep_seconds)
+        self._next_run = self._last_run + timedelta(seconds=delay)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait((self._next_run - self._now()).total_seconds())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._thread is not None,
+            "runs": self._runs,
+            "last_run": self._last_run.isoformat(timespec="seconds") if self._last_run else None,
+            "next_run": self._next_run.isoformat(timespec="seconds") if self._next_run else None,
+            "last_error": self._last_error,
+        }
+
+
+def _month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.main import (
+        BASE_DIR,
+        _default_repository_factory,
+        _load_rules_and_stations,
+        daily_rollups_from_settings,
+    )
+    from app.report_logic import compile_rules
+
+    parser = argparse.ArgumentParser(description="Daily rollup maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill = subcommands.add_parser("backfill", help="roll up every closed day of a month range")
+    backfill.add_argument("start", type=_month, help="first month, YYYY-MM")
+    backfill.add_argument(
+        "end", type=_month, nargs="?", help="last month, YYYY-MM (default: start)"
+    )
+    backfill.add_argument("--config", type=Path, default=BASE_DIR / "config" / "report_rules.json")
+    args = parser.parse_args(argv)
+
+    store = daily_rollups_from_settings()
+    repo = _default_repository_factory()
+    rules, stations = _load_rules_and_stations(repo, args.config)
+    sourcetype_filter = rules["sourcetype_filter"]
+    rules = compile_rules(rules)
+
+    last_month = args.end or args.start
+    last = date(
+        last_month.year,
+        last_month.month,
+        calendar.monthrange(last_month.year, last_month.month)[1],
+    )
+    started = time.perf_counter()
+    computed = roll_up_closed_days(
+        store, repo, stations, rules, sourcetype_filter, args.start, last
+    )
+    print(
+        f"rolled up {len(computed)} days from {args.start:%Y-%m} to {last_month:%Y-%m} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 
 
 @dataclass
@@ -12,6 +13,51 @@ class Settings:
     db_user: str = os.getenv("DB_USER", "sa")
     db_password: str = os.getenv("DB_PASSWORD", "xiangsiersheng")
     db_driver: str = os.getenv("DB_DRIVER", "ODBC Driver 18 for SQL Server")
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_idle_timeout: float = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "1") != "0"
+    db_sources: str = os.getenv("DB_SOURCES", "")
+    db_source_timeout: float = float(os.getenv("DB_SOURCE_TIMEOUT", "60"))
+    report_aggregation: str = os.getenv("REPORT_AGGREGATION", "python")
+    report_engine: str = os.getenv("REPORT_ENGINE", "python")
+    record_query_strategy: str = os.getenv("RECORD_QUERY_STRATEGY", "sargable")
+    record_query_partitions: int = int(os.getenv("RECORD_QUERY_PARTITIONS", "1"))
+    record_batch_size: int = int(os.getenv("RECORD_BATCH_SIZE", "5000"))
+    report_cache_enabled: bool = os.getenv("REPORT_CACHE_ENABLED", "1") != "0"
+    report_cache_path: str = os.getenv("REPORT_CACHE_PATH", "")
+    report_cache_max_mb: int = int(os.getenv("REPORT_CACHE_MAX_MB", "256"))
+    report_cache_settle_hours: float = float(os.getenv("REPORT_CACHE_SETTLE_HOURS", "72"))
+    incremental_enabled: bool = os.getenv("INCREMENTAL_REFRESH_ENABLED", "1") != "0"
+    incremental_overlap_minutes: float = float(os.getenv("INCREMENTAL_OVERLAP_MINUTES", "10"))
+    report_max_concurrent: int = int(os.getenv("REPORT_MAX_CONCURRENT", "4"))
+    report_max_pending: int = int(os.getenv("REPORT_MAX_PENDING", "16"))
+    report_retry_after: int = int(os.getenv("REPORT_RETRY_AFTER", "5"))
+    range_report_workers: int = int(os.getenv("RANGE_REPORT_WORKERS", "4"))
+    range_report_max_months: int = int(os.getenv("RANGE_REPORT_MAX_MONTHS", "36"))
+    incremental_max_months: int = int(os.getenv("INCREMENTAL_MAX_MONTHS", "2"))
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "1") != "0"
+    mirror_enabled: bool = os.getenv("MIRROR_ENABLED", "0") != "0"
+    mirror_offline: bool = os.getenv("MIRROR_OFFLINE", "0") != "0"
+    mirror_path: str = os.getenv("MIRROR_PATH", "")
+    mirror_initial_days: int = int(os.getenv("MIRROR_INITIAL_DAYS", "92"))
+    mirror_resync_days: int = int(os.getenv("MIRROR_RESYNC_DAYS", "2"))
+    mirror_chunk_days: int = int(os.getenv("MIRROR_CHUNK_DAYS", "7"))
+    rollup_enabled: bool = os.getenv("ROLLUP_ENABLED", "0") != "0"
+    rollup_path: str = os.getenv("ROLLUP_PATH", "")
+    rollup_settle_minutes: float = float(os.getenv("ROLLUP_SETTLE_MINUTES", "30"))
+    rollup_lookback_days: int = int(os.getenv("ROLLUP_LOOKBACK_DAYS", "3"))
+    rollup_scheduler_enabled: bool = os.getenv("ROLLUP_SCHEDULER_ENABLED", "1") != "0"
+    drilldown_max_months: int = int(os.getenv("DRILLDOWN_MAX_MONTHS", "6"))
+    live_poll_seconds: float = float(os.getenv("LIVE_POLL_SECONDS", "30"))
+    live_overlap_minutes: float = float(os.getenv("LIVE_OVERLAP_MINUTES", "10"))
+    live_heartbeat_seconds: float = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+    shared_cache_enabled: bool = os.getenv("SHARED_CACHE_ENABLED", "0") != "0"
+    shared_cache_path: str = os.getenv("SHARED_CACHE_PATH", "")
+    shared_report_ttl: float = float(os.getenv("SHARED_REPORT_TTL", "30"))
+    shared_build_wait: float = float(os.getenv("SHARED_BUILD_WAIT", "120"))
+    shared_lease_seconds: float = float(os.getenv("SHARED_LEASE_SECONDS", "300"))
+    station_catalog_ttl: float = float(os.getenv("STATION_CATALOG_TTL", "300"))
 
 
 SETTINGS = Settings()
@@ -26,3 +72,39 @@ def build_sqlserver_connection_string(settings: Settings = SETTINGS) -> str:
         f"PWD={settings.db_password};"
         "TrustServerCertificate=yes;"
     )
+
+
+def sqlserver_pool_options(settings: Settings = SETTINGS) -> dict[str, object]:
+    return {
+        "max_size": settings.db_pool_size,
+        "checkout_timeout": settings.db_pool_timeout,
+        "idle_timeout": settings.db_pool_idle_timeout,
+        "pre_ping": settings.db_pool_pre_ping,
+        "name": f"{settings.db_host},{settings.db_port}/{settings.db_name}",
+    }
+
+
+_SOURCE_FIELDS = {
+    "host": "db_host",
+    "port": "db_port",
+    "database": "db_name",
+    "user": "db_user",
+    "password": "db_password",
+    "driver": "db_driver",
+}
+
+
+def report_source_settings(settings: Settings = SETTINGS) -> list[tuple[str, str, Settings]]:
+    # DB_SOURCES: JSON list of {"name", "host", "port", "database", "user",
+    # "password", "driver", "prefix"}; omitted fields fall back to DB_*.
+    if not settings.db_sources.strip():
+        return []
+    sources: list[tuple[str, str, Settings]] = []
+    for entry in json.loads(settings.db_sources):
+        overrides = {
+            field: str(entry[key]) for key, field in _SOURCE_FIELDS.items() if key in entry
+        }
+        sources.append(
+            (str(entry["name"]), str(entry.get("prefix", "")), replace(settings, **overrides))
+        )
+    return sources
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+
+class SharedCache:
+    # Cache tier shared by all worker processes on the host: one SQLite file
+    # (WAL) holding JSON entries per namespace with an expiry, plus named leases
+    # that give cross-process single-flight. A lease whose owner died simply
+    # expires. Counters in stats() are per process.
+    def __init__(
+        self,
+        path: Path,
+        lease_seconds: float = 300.0,
+        wait_seconds: float = 120.0,
+        poll_seconds: float = 0.05,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_seconds = poll_seconds
+        self._clock = clock
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._builds = 0
+        self._waited = 0
+        self._wait_timeouts = 0
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self._initialize()
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _initialize(self) -> None:
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS shared_cache (
+                        namespace TEXT NOT NULL,
+                        cache_key TEXT NOT NULL,
+                        payload BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL,
+                        PRIMARY KEY (namespace, cache_key)
+                    )
+                    """
+                )
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS shared_leases (
+                        name TEXT PRIMARY KEY,
+                        owner TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def get(self, namespace: str, key: str, newer_than: float | None = None) -> Any | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, created_at FROM shared_cache "
+                "WHERE namespace = ? AND cache_key = ? AND expires_at > ?",
+                (namespace, key, self._clock()),
+            ).fetchone()
+        if row is None or (newer_than is not None and row[1] < newer_than):
+            return None
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        payload = zlib.compress(
+            json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        )
+        now = self._clock()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_cache "
+                "(namespace, cache_key, payload, size, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, payload, len(payload), now, now + ttl),
+            )
+
+    def invalidate(
+        self, namespace: str | None = None, prefix: str = "", pattern: str | None = None
+    ) -> int:
+        # `pattern` is an SQLite GLOB over cache keys, for filters a prefix cannot express.
+        clauses: list[str] = []
+        params: list[Any] = []
+        if namespace is not None:
+            clauses.append("namespace = ?")
+            params.append(namespace)
+        if prefix:
+            clauses.append("substr(cache_key, 1, ?) = ?")
+            params.extend([len(prefix), prefix])
+        if pattern is not None:
+            clauses.append("cache_key GLOB ?")
+            params.append(pattern)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            return conn.execute(f"DELETE FROM shared_cache{where}", params).rowcount
+
+    def acquire(self, name: str, seconds: float | None = None) -> str | None:
+        # Returns the owner token when the lease was free or expired.
+        token = f"{os.getpid()}:{uuid.uuid4().hex}"
+        now = self._clock()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO shared_leases (name, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE
+                SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE shared_leases.expires_at <= ?
+                """,
+                (name, token, now + (seconds or self.lease_seconds), now),
+            )
+            return token if cursor.rowcount == 1 else None
+
+    def release(self, name: str, token: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM shared_leases WHERE name = ? AND owner = ?", (name, token))
+
+    @contextmanager
+    def lease(self, name: str, seconds: float | None = None) -> Iterator[bool]:
+        token = self.acquire(name, seconds)
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                self.release(name, token)
+
+    def get_or_build(
+        self,
+        namespace: str,
+        key: str,
+        build: Callable[[], Any],
+        ttl: float,
+        refresh: bool = False,
+        cacheable: Callable[[Any], bool] | None = None,
+    ) -> Any:
+        # Cross-process single-flight: the worker holding the lease builds, the
+        # others poll for its result. A refresh only accepts a result built after
+        # it was asked for. Waiters give up after wait_seconds and build alone.
+        newer_than = self._clock() if refresh else None
+        if not refresh:
+            value = self.get(namespace, key)
+            if value is not None:
+                self._count("_hits")
+                return value
+        self._count("_misses")
+
+        def build_and_store() -> Any:
+            value = build()
+            self._count("_builds")
+            if cacheable is None or cacheable(value):
+                self.put(namespace, key, value, ttl)
+            return value
+
+        lease_name = f"{namespace}:{key}"
+        deadline = time.monotonic() + self.wait_seconds
+        delay = self.poll_seconds
+        waited = False
+        while True:
+            with self.lease(lease_name) as owner:
+                if owner:
+                    # Another worker may have finished between our read and the lease.
+                    value = self.get(namespace, key, newer_than)
+                    if value is not None:
+                        return value
+                    return build_and_store()
+            if not waited:
+                waited = True
+                self._count("_waited")
+            if time.monotonic() >= deadline:
+                self._count("_wait_timeouts")
+                return build_and_store()
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            value = self.get(namespace, key, newer_than)
+            if value is not None:
+                return value
+
+    def stats(self) -> dict[str, Any]:
+        now = self._clock()
+        with self._connect() as conn:
+            namespaces = conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM shared_cache "
+                "WHERE expires_at > ? GROUP BY namespace ORDER BY namespace",
+                (now,),
+            ).fetchall()
+            leases = conn.execute(
+                "SELECT COUNT(*) FROM shared_leases WHERE expires_at > ?", (now,)
+            ).fetchone()[0]
+        with self._stats_lock:
+            counters = {
+                "hits": self._hits,
+                "misses": self._misses,
+                "builds": self._builds,
+                "waited": self._waited,
+                "wait_timeouts": self._wait_timeouts,
+            }
+        return {
+            "path": str(self.path),
+            "namespaces": [
+                {"namespace": namespace, "entries": entries, "bytes": size}
+                for namespace, entries, size in namespaces
+            ],
+            "active_leases": leases,
+            "process": {"pid": os.getpid(), **counters},
+        }
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+
+class ReportOverloadedError(RuntimeError):
+    pass
+
+
+class SingleFlightScheduler:
+    def __init__(self, max_concurrent: int = 4, max_pending: int = 16):
+        if max_concurrent <= 0:
+            raise ValueError("max_concurrent must be a positive integer")
+        self.max_concurrent = max_concurrent
+        self.max_pending = max(max_pending, 0)
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._running = 0
+        self._started = 0
+        self._coalesced = 0
+        self._rejected = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running event loop.
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    async def _execute(self, func: Callable[[], Any]) -> Any:
+        async with self._get_semaphore():
+            self._running += 1
+            try:
+                return await run_in_threadpool(func)
+            finally:
+                self._running -= 1
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self._coalesced += 1
+        else:
+            if len(self._inflight) >= self.max_concurrent + self.max_pending:
+                self._rejected += 1
+                raise ReportOverloadedError(
+                    f"{len(self._inflight)} report builds are already running or queued"
+                )
+            task = asyncio.ensure_future(self._execute(func))
+            self._inflight[key] = task
+            self._started += 1
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+        # Shield so a disconnecting client does not cancel a build other callers share.
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_pending": self.max_pending,
+            "running": self._running,
+            "inflight": len(self._inflight),
+            "started": self._started,
+            "coalesced": self._coalesced,
+            "rejected": self._rejected,
+        }
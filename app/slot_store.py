@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from array import array
+from typing import Iterable, Iterator
+
+_WORD_BITS = 64
+
+
+class SlotBitmap:
+    # One fixed-width bitmask per (station, day) cell, stored station-major in a
+    # single array of 64-bit words: cell (position, day) starts at
+    # ((position * days) + day - 1) * words_per_cell.
+    def __init__(self, station_ids: Iterable[str], days: int, max_slots: int):
+        if days <= 0:
+            raise ValueError("days must be a positive integer")
+        if max_slots <= 0:
+            raise ValueError("max_slots must be a positive integer")
+        self.station_ids = list(dict.fromkeys(station_ids))
+        self.positions = {station_id: index for index, station_id in enumerate(self.station_ids)}
+        self.days = days
+        self.max_slots = max_slots
+        self.words_per_cell = (max_slots + _WORD_BITS - 1) // _WORD_BITS
+        self.words = array("Q", bytes(8 * len(self.station_ids) * days * self.words_per_cell))
+
+    def _offset(self, position: int, day: int) -> int:
+        return ((position * self.days) + day - 1) * self.words_per_cell
+
+    def add(self, position: int, day: int, slot: int) -> None:
+        index = self._offset(position, day) + (slot >> 6)
+        self.words[index] |= 1 << (slot & 63)
+
+    def add_slot(self, station_id: str, day: int, slot: int) -> bool:
+        position = self.positions.get(station_id)
+        if position is None or not 1 <= day <= self.days or not 0 <= slot < self.max_slots:
+            return False
+        self.add(position, day, slot)
+        return True
+
+    def contains(self, station_id: str, day: int, slot: int) -> bool:
+        position = self.positions.get(station_id)
+        if position is None or not 1 <= day <= self.days or not 0 <= slot < self.max_slots:
+            return False
+        word = self.words[self._offset(position, day) + (slot >> 6)]
+        return bool(word >> (slot & 63) & 1)
+
+    def count(self, station_id: str, day: int) -> int:
+        position = self.positions.get(station_id)
+        if position is None or not 1 <= day <= self.days:
+            return 0
+        offset = self._offset(position, day)
+        return sum(word.bit_count() for word in self.words[offset : offset + self.words_per_cell])
+
+    def slots(self, station_id: str, day: int) -> list[int]:
+        position = self.positions.get(station_id)
+        if position is None or not 1 <= day <= self.days:
+            return []
+        offset = self._offset(position, day)
+        present: list[int] = []
+        for word_index in range(self.words_per_cell):
+            word = self.words[offset + word_index]
+            base = word_index * _WORD_BITS
+            while word:
+                low_bit = word & -word
+                present.append(base + low_bit.bit_length() - 1)
+                word ^= low_bit
+        return present
+
+    def daily_counts(self, station_id: str) -> list[int]:
+        return [self.count(station_id, day) for day in range(1, self.days + 1)]
+
+    def iter_counts(self) -> Iterator[tuple[str, int, int]]:
+        words = self.words
+        width = self.words_per_cell
+        for position, station_id in enumerate(self.station_ids):
+            for day in range(1, self.days + 1):
+                offset = self._offset(position, day)
+                if width == 1:
+                    count = words[offset].bit_count()
+                else:
+                    count = sum(word.bit_count() for word in words[offset : offset + width])
+                if count:
+                    yield station_id, day, count
+
+    def _check_compatible(self, other: SlotBitmap) -> None:
+        if (
+            self.station_ids != other.station_ids
+            or self.days != other.days
+            or self.words_per_cell != other.words_per_cell
+        ):
+            raise ValueError("slot bitmaps have different station, day or slot layouts")
+
+    def union_update(self, other: SlotBitmap) -> SlotBitmap:
+        self._check_compatible(other)
+        # One big-int OR over the whole buffer is much faster than a per-word loop.
+        merged = int.from_bytes(self.words.tobytes(), "little") | int.from_bytes(
+            other.words.tobytes(), "little"
+        )
+        self.words = array("Q", merged.to_bytes(len(self.words) * 8, "little"))
+        return self
+
+    def __ior__(self, other: SlotBitmap) -> SlotBitmap:
+        return self.union_update(other)
+
+    def copy(self) -> SlotBitmap:
+        clone = SlotBitmap.__new__(SlotBitmap)
+        clone.station_ids = list(self.station_ids)
+        clone.positions = dict(self.positions)
+        clone.days = self.days
+        clone.max_slots = self.max_slots
+        clone.words_per_cell = self.words_per_cell
+        clone.words = array("Q", self.words)
+        return clone
+
+    def to_bytes(self) -> bytes:
+        return self.words.tobytes()
+
+    @classmethod
+    def from_bytes(
+        cls, station_ids: Iterable[str], days: int, max_slots: int, payload: bytes
+    ) -> SlotBitmap:
+        bitmap = cls(station_ids, days, max_slots)
+        words = array("Q")
+        words.frombytes(payload)
+        if len(words) != len(bitmap.words):
+            raise ValueError("payload does not match the slot bitmap layout")
+        bitmap.words = words
+        return bitmap
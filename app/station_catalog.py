@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Any, Callable
+
+from app.federated import source_failures
+from app.shared_cache import SharedCache
+
+_SHARED_KEY = "catalog"
+
+
+class StationCatalog:
+    # Process-wide copy of dbo.Stations. Within the TTL no query is issued; once it
+    # expires the repository's probe_stations() (row count + checksum) decides
+    # whether the full table has to be read again. Returned lists are shared and
+    # must be treated as read-only. With a shared cache, a list another worker
+    # loaded is reused when its probe still matches.
+    def __init__(
+        self,
+        ttl_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        shared: SharedCache | None = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._shared = shared
+        self._lock = threading.Lock()
+        self._stations: list[dict[str, Any]] | None = None
+        self._probe: Any = None
+        self._checked_at = 0.0
+        self._version = 0
+        self._hits = 0
+        self._probes = 0
+        self._fetches = 0
+        self._shared_hits = 0
+
+    @staticmethod
+    def _probe_repo(repo: Any) -> Any:
+        probe = getattr(repo, "probe_stations", None)
+        if probe is None:
+            return None
+        return probe()
+
+    def _load(self, repo: Any, use_shared: bool = True) -> list[dict[str, Any]]:
+        # Probe before fetching: a change racing the fetch then shows up as a
+        # mismatch on the next check instead of being masked.
+        probe = self._probe_repo(repo)
+        stations = self._shared_stations(probe) if use_shared else None
+        if stations is None:
+            stations = repo.fetch_stations()
+            self._fetches += 1
+            if source_failures(repo):
+                # Stations of a source that did not answer are missing; serve the
+                # list for this build only.
+                return stations
+            if self._shared is not None:
+                self._shared.put(
+                    "stations",
+                    _SHARED_KEY,
+                    {"probe": probe, "stations": stations},
+                    self.ttl_seconds,
+                )
+        if stations != self._stations:
+            self._version += 1
+        self._stations = stations
+        self._probe = probe
+        self._checked_at = self._clock()
+        return stations
+
+    def _shared_stations(self, probe: Any) -> list[dict[str, Any]] | None:
+        if self._shared is None:
+            return None
+        entry = self._shared.get("stations", _SHARED_KEY)
+        # Probes come back from JSON, so compare them in that form.
+        if entry is None or entry["probe"] != json.loads(json.dumps(probe)):
+            return None
+        self._shared_hits += 1
+        return entry["stations"]
+
+    def get(self, repo: Any, revalidate: bool = False) -> list[dict[str, Any]]:
+        with self._lock:
+            if self._stations is None:
+                return self._load(repo, use_shared=not revalidate)
+
+            if not revalidate and self._clock() - self._checked_at < self.ttl_seconds:
+                self._hits += 1
+                return self._stations
+
+            if self._probe is not None:
+                self._probes += 1
+                if self._probe_repo(repo) == self._probe:
+                    self._checked_at = self._clock()
+                    return self._stations
+            return self._load(repo, use_shared=not revalidate)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stations = None
+            self._probe = None
+        if self._shared is not None:
+            self._shared.invalidate("stations")
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            cached = self._stations is not None
+            return {
+                "cached": cached,
+                "stations": len(self._stations) if cached else 0,
+                "version": self._version,
+                "ttl_seconds": self.ttl_seconds,
+                "age_seconds": round(self._clock() - self._checked_at, 3) if cached else None,
+                "hits": self._hits,
+                "probes": self._probes,
+                "fetches": self._fetches,
+                "shared_hits": self._shared_hits,
+            }
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import contextvars
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+# A producer pushes its items through `emit`; emit raises ConsumerGone once the
+# consumer has stopped reading, which unwinds the producer.
+Producer = Callable[[Callable[[Any], None]], None]
+
+_PRODUCER_DONE = object()
+
+
+class ConsumerGone(Exception):
+    pass
+
+
+class _ProducerFailure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def drain_producers(
+    producers: list[Producer],
+    depth: int,
+    name: str,
+    idle_timeout: float | None = None,
+    on_idle: Callable[[int], None] | None = None,
+    join: bool = True,
+) -> Iterator[Any]:
+    # One thread per producer feeds a bounded queue (`depth` items per producer);
+    # items are yielded in arrival order and the first producer error is raised
+    # to the consumer. Producers run in a copy of the caller's context so stage
+    # timings reach its collector. A producer that sends nothing for
+    # idle_timeout seconds is dropped and reported to on_idle (by index), or
+    # raises TimeoutError without one. join=False leaves producers that are
+    # stuck (e.g. in a database call) to finish on their own.
+    buffer: queue.Queue[Any] = queue.Queue(maxsize=max(depth, 1) * len(producers))
+    stop = threading.Event()
+    dropped: set[int] = set()
+
+    def emitter(index: int) -> Callable[[Any], None]:
+        def emit(item: Any) -> None:
+            while not stop.is_set() and index not in dropped:
+                try:
+                    buffer.put((index, item), timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            raise ConsumerGone()
+
+        return emit
+
+    def run(index: int, produce: Producer) -> None:
+        emit = emitter(index)
+        try:
+            produce(emit)
+            emit(_PRODUCER_DONE)
+        except ConsumerGone:
+            return
+        except BaseException as exc:
+            try:
+                emit(_ProducerFailure(exc))
+            except ConsumerGone:
+                return
+
+    threads = [
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(run, index, produce),
+            name=name if len(producers) == 1 else f"{name}-{index}",
+            daemon=True,
+        )
+        for index, produce in enumerate(producers)
+    ]
+    last_seen = {index: time.monotonic() for index in range(len(producers))}
+    for thread in threads:
+        thread.start()
+    try:
+        while last_seen:
+            wait = None
+            if idle_timeout is not None:
+                wait = max(min(last_seen.values()) + idle_timeout - time.monotonic(), 0.0)
+            try:
+                index, item = buffer.get(timeout=wait)
+            except queue.Empty:
+                now = time.monotonic()
+                for index, seen in list(last_seen.items()):
+                    if now - seen < idle_timeout:
+                        continue
+                    if on_idle is None:
+                        raise TimeoutError(f"{name} sent nothing for {idle_timeout:g}s") from None
+                    del last_seen[index]
+                    dropped.add(index)
+                    on_idle(index)
+                continue
+            if index not in last_seen:
+                continue
+            if item is _PRODUCER_DONE:
+                del last_seen[index]
+                continue
+            if isinstance(item, _ProducerFailure):
+                raise item.exc
+            last_seen[index] = time.monotonic()
+            yield item
+    finally:
+        stop.set()
+        if join:
+            for thread in threads:
+                thread.join()
+
+
+def iterable_producer(iterable: Iterable[T]) -> Producer:
+    def produce(emit: Callable[[Any], None]) -> None:
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                emit(item)
+        finally:
+            # Closing the source releases its cursor or connection.
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    return produce
+
+
+def drain_iterables(iterables: list[Iterable[T]], depth: int, name: str) -> Iterator[T]:
+    return drain_producers([iterable_producer(iterable) for iterable in iterables], depth, name)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+
+def _load(path: Path) -> dict[str, Any]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def compare(baseline: dict[str, Any], candidate: dict[str, Any]) -> list[dict[str, Any]]:
+    before = {stage["name"]: stage for stage in baseline["stages"]}
+    rows: list[dict[str, Any]] = []
+    for stage in candidate["stages"]:
+        previous = before.get(stage["name"])
+        if previous is None:
+            continue
+        old_p50 = previous["latency_ms"]["p50"]
+        new_p50 = stage["latency_ms"]["p50"]
+        rows.append(
+            {
+                "name": stage["name"],
+                "p50_before_ms": old_p50,
+                "p50_after_ms": new_p50,
+                "speedup": round(old_p50 / new_p50, 2) if new_p50 else None,
+                "peak_before_bytes": previous["peak_memory_bytes"],
+                "peak_after_bytes": stage["peak_memory_bytes"],
+            }
+        )
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    args = parser.parse_args(argv)
+
+    baseline = _load(args.baseline)
+    candidate = _load(args.candidate)
+    for label, results in (("baseline", baseline), ("candidate", candidate)):
+        meta = results["meta"]
+        print(f"{label:<10} {meta.get('git_revision')}  {meta['created_at']}  rows={meta['rows']}")
+    if baseline["meta"]["synthetic"] != candidate["meta"]["synthetic"]:
+        print("warning: runs used different synthetic data settings")
+
+    for row in compare(baseline, candidate):
+        speedup = f"{row['speedup']:.2f}x" if row["speedup"] else "-"
+        print(
+            f"{row['name']:<52} {row['p50_before_ms']:>10.1f} -> {row['p50_after_ms']:>10.1f} ms"
+            f"  {speedup:>8}  peak {row['peak_before_bytes'] / 1048576:>7.1f} -> "
+            f"{row['peak_after_bytes'] / 1048576:>7.1f} MiB"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+
+from app.config_store import generate_rules_from_stations, save_rules_to_file
+from app.pool import ConnectionPool
+from app.settings import SETTINGS, sqlserver_pool_options
+from benchmarks.run import RESULTS_DIR, _git_revision, percentile
+from benchmarks.synthetic import (
+    SyntheticConfig,
+    SyntheticRepository,
+    generate_records,
+    generate_rules,
+    generate_stations,
+)
+
+# Request kinds the load test can mix, by name: (path, extra query params).
+# Report-style requests are sent for a month picked from LoadConfig.months.
+TRAFFIC: dict[str, tuple[str, dict[str, Any]]] = {
+    "report": ("/api/report/monthly", {}),
+    "report_page": ("/api/report/monthly", {"sort": "rate", "offset": 0, "limit": 200}),
+    "report_full": ("/api/report/monthly", {"refresh": "full"}),
+    "export": ("/api/report/monthly/export", {"format": "csv"}),
+    "config": ("/api/config", {}),
+    "stations": ("/api/stations/cache", {}),
+}
+DEFAULT_MIX = {"report": 6, "report_page": 2, "report_full": 1, "export": 1, "config": 2}
+
+
+class SimulatedDatabaseError(RuntimeError):
+    pass
+
+
+@dataclass
+class DatabaseProfile:
+    # Median round trip of one query; the actual delay is log-normal around it,
+    # which gives the long tail a real server shows under load.
+    latency_ms: float = 40.0
+    latency_sigma: float = 0.6
+    # Rows streamed per second over one connection.
+    rows_per_second: float = 300_000.0
+    # Fraction of queries that fail after their round trip.
+    failure_rate: float = 0.0
+    pool_size: int = SETTINGS.db_pool_size
+    pool_timeout: float = SETTINGS.db_pool_timeout
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class _SimulatedConnection:
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class LatencyRepository(SyntheticRepository):
+    # SyntheticRepository behind a real ConnectionPool sized like the service's,
+    # where every query holds a connection for a simulated round trip plus the
+    # time to stream its rows, and may fail. Pool waits and timeouts therefore
+    # show up exactly as they would against SQL Server.
+    def __init__(
+        self,
+        stations: list[dict[str, Any]],
+        ordered: list[tuple[str, datetime]],
+        late: list[tuple[str, datetime]] | None = None,
+        profile: DatabaseProfile | None = None,
+        seed: int = 0,
+    ):
+        super().__init__(stations, ordered, late)
+        self.profile = profile or DatabaseProfile()
+        options = sqlserver_pool_options()
+        options.update(
+            max_size=self.profile.pool_size,
+            checkout_timeout=self.profile.pool_timeout,
+            pre_ping=False,
+            name="load-test",
+        )
+        self.pool = ConnectionPool(_SimulatedConnection, **options)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.queries = 0
+        self.failed_queries = 0
+
+    @classmethod
+    def from_config(
+        cls, config: SyntheticConfig, profile: DatabaseProfile | None = None
+    ) -> LatencyRepository:
+        stations = generate_stations(config)
+        return cls(stations, *generate_records(config, stations), profile=profile, seed=config.seed)
+
+    def _round_trip(self) -> None:
+        profile = self.profile
+        with self._rng_lock:
+            self.queries += 1
+            spread = math.exp(self._rng.gauss(0.0, profile.latency_sigma))
+            delay = profile.latency_ms / 1000 * spread
+            failed = self._rng.random() < profile.failure_rate
+            if failed:
+                self.failed_queries += 1
+        time.sleep(delay)
+        if failed:
+            raise SimulatedDatabaseError("simulated database failure")
+
+    def _transfer(self, rows: int) -> None:
+        if rows and self.profile.rows_per_second > 0:
+            time.sleep(rows / self.profile.rows_per_second)
+
+    def fetch_stations(self) -> list[dict[str, Any]]:
+        with self.pool.connection():
+            self._round_trip()
+            stations = super().fetch_stations()
+            self._transfer(len(stations))
+        return stations
+
+    def probe_stations(self) -> tuple[int, int]:
+        with self.pool.connection():
+            self._round_trip()
+            return super().probe_stations()
+
+    def fetch_records(self, start, end, sourcetype_filter: str) -> list[dict[str, Any]]:
+        with self.pool.connection():
+            self._round_trip()
+            records = super().fetch_records(start, end, sourcetype_filter)
+            self._transfer(len(records))
+        return records
+
+    def iter_record_batches(
+        self, start, end, sourcetype_filter: str, batch_size: int = 5000
+    ) -> Iterator[list[tuple[str, datetime]]]:
+        # The connection stays checked out while the caller consumes the stream.
+        with self.pool.connection():
+            self._round_trip()
+            for batch in super().iter_record_batches(start, end, sourcetype_filter, batch_size):
+                self._transfer(len(batch))
+                yield batch
+
+    def fetch_slot_counts(
+        self,
+        start,
+        end,
+        sourcetype_filter: str,
+        station_expected: dict[str, int],
+        day_start_hour: int,
+    ) -> list[dict[str, Any]]:
+        with self.pool.connection():
+            self._round_trip()
+            counts = super().fetch_slot_counts(
+                start, end, sourcetype_filter, station_expected, day_start_hour
+            )
+            # The server scans every row but only ships the per-day counts.
+            self._transfer(len(counts))
+        return counts
+
+
+@dataclass
+class LoadConfig:
+    users: int = 16
+    duration: float = 30.0
+    workers: int = 1
+    # Months the report traffic is spread over, newest first; only the first
+    # (the synthetic month) has rows, older ones cost a query and an empty build.
+    months: int = 3
+    mix: dict[str, int] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    think_ms: float = 0.0
+    seed: int = 1
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def parse_mix(items: list[str]) -> dict[str, int]:
+    mix: dict[str, int] = {}
+    for item in items:
+        for part in item.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if not name:
+                continue
+            if name not in TRAFFIC:
+                raise ValueError(f"unknown request kind {name!r}, expected one of {list(TRAFFIC)}")
+            mix[name] = int(weight or 1)
+    if not mix or not any(weight > 0 for weight in mix.values()):
+        raise ValueError("the traffic mix needs at least one request kind with a positive weight")
+    return mix
+
+
+def _report_months(synthetic: SyntheticConfig, count: int) -> list[tuple[int, int]]:
+    months: list[tuple[int, int]] = []
+    year, month = synthetic.year, synthetic.month
+    for _ in range(max(1, count)):
+        months.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months
+
+
+def _drive_worker(
+    synthetic: SyntheticConfig,
+    profile: DatabaseProfile,
+    load: LoadConfig,
+    workdir: str,
+    worker: int,
+) -> dict[str, Any]:
+    # One service process: its own app, pool and in-process caches, sharing the
+    # rules file and report cache with the other workers as deployed.
+    from fastapi.testclient import TestClient
+
+    from app.incremental import IncrementalReportStore
+    from app.main import create_app
+    from app.report_cache import ReportCache
+    from app.shared_cache import SharedCache
+
+    repo = LatencyRepository.from_config(synthetic, profile)
+    shared_cache = None
+    if SETTINGS.shared_cache_enabled:
+        shared_cache = SharedCache(
+            Path(workdir) / "shared.sqlite3",
+            lease_seconds=SETTINGS.shared_lease_seconds,
+            wait_seconds=SETTINGS.shared_build_wait,
+        )
+    app = create_app(
+        config_path=Path(workdir) / "report_rules.json",
+        repository_factory=lambda: repo,
+        report_cache=ReportCache(Path(workdir) / "reports.sqlite3"),
+        incremental_store=IncrementalReportStore(),
+        shared_cache=shared_cache,
+    )
+    users = load.users // load.workers + (1 if worker < load.users % load.workers else 0)
+    months = _report_months(synthetic, load.months)
+    kinds = [name for name, weight in load.mix.items() if weight > 0]
+    weights = [load.mix[name] for name in kinds]
+    samples: list[tuple[str, float, int]] = []
+    samples_lock = threading.Lock()
+
+    with TestClient(app, raise_server_exceptions=False) as client:
+
+        def user(index: int, deadline: float) -> None:
+            rng = random.Random(load.seed * 1000 + worker * 100 + index)
+            while time.monotonic() < deadline:
+                kind = rng.choices(kinds, weights)[0]
+                path, params = TRAFFIC[kind]
+                if path.startswith("/api/report/"):
+                    year, month = rng.choice(months)
+                    params = {"year": year, "month": month, **params}
+                started = time.perf_counter()
+                try:
+                    status = client.get(path, params=params).status_code
+                except Exception:
+                    status = 0
+                elapsed = time.perf_counter() - started
+                with samples_lock:
+                    samples.append((kind, elapsed, status))
+                if load.think_ms > 0:
+                    time.sleep(rng.expovariate(1000 / load.think_ms))
+
+        started = time.monotonic()
+        deadline = started + load.duration
+        threads = [
+            threading.Thread(target=user, args=(index, deadline), name=f"load-user-{index}")
+            for index in range(users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        scheduler = client.get("/api/report/scheduler").json()
+
+    return {
+        "worker": worker,
+        "users": users,
+        "elapsed": elapsed,
+        "samples": samples,
+        "pool": repo.pool.stats(),
+        "scheduler": scheduler,
+        "db_queries": repo.queries,
+        "db_failures": repo.failed_queries,
+    }
+
+
+def summarize(samples: list[tuple[str, float, int]], elapsed: float) -> list[dict[str, Any]]:
+    by_kind: dict[str, list[tuple[float, int]]] = {}
+    for kind, seconds, status in sorted(samples, key=lambda sample: sample[0]):
+        by_kind.setdefault(kind, []).append((seconds, status))
+    by_kind["all"] = [(seconds, status) for _, seconds, status in samples]
+
+    summary: list[dict[str, Any]] = []
+    for kind, items in by_kind.items():
+        if not items:
+            continue
+        latencies = [seconds for seconds, _ in items]
+        statuses: dict[str, int] = {}
+        for _, status in items:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        # 304 is a successful revalidation; 0 means the request itself failed.
+        errors = sum(1 for _, status in items if status == 0 or status >= 400)
+        summary.append(
+            {
+                "name": kind,
+                "requests": len(items),
+                "errors": errors,
+                "error_rate": round(errors / len(items), 4),
+                "throughput_per_s": round(len(items) / elapsed, 2) if elapsed > 0 else None,
+                "statuses": dict(sorted(statuses.items())),
+                "latency_ms": {
+                    "min": round(min(latencies) * 1000, 3),
+                    "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+                    "p50": round(percentile(latencies, 0.50) * 1000, 3),
+                    "p95": round(percentile(latencies, 0.95) * 1000, 3),
+                    "p99": round(percentile(latencies, 0.99) * 1000, 3),
+                    "max": round(max(latencies) * 1000, 3),
+                },
+            }
+        )
+    return summary
+
+
+def run_load(
+    synthetic: SyntheticConfig,
+    profile: DatabaseProfile | None = None,
+    load: LoadConfig | None = None,
+) -> dict[str, Any]:
+    profile = profile or DatabaseProfile()
+    load = load or LoadConfig()
+    if load.workers < 1 or load.users < load.workers:
+        raise ValueError("need at least one worker and one user per worker")
+
+    with tempfile.TemporaryDirectory(prefix="hydro-load-") as workdir:
+        stations = generate_stations(synthetic)
+        save_rules_to_file(
+            Path(workdir) / "report_rules.json",
+            generate_rules_from_stations(stations, generate_rules(synthetic)),
+        )
+        arguments = [(synthetic, profile, load, workdir, worker) for worker in range(load.workers)]
+        if load.workers == 1:
+            workers = [_drive_worker(*arguments[0])]
+        else:
+            # Separate processes, like uvicorn workers: no shared memory, GIL or pool.
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(load.workers) as processes:
+                workers = processes.starmap(_drive_worker, arguments)
+
+    samples = [sample for worker in workers for sample in worker["samples"]]
+    elapsed = max(worker["elapsed"] for worker in workers)
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "synthetic": synthetic.to_dict(),
+            "database": profile.to_dict(),
+            "load": load.to_dict(),
+            "settings": {
+                "report_max_concurrent": SETTINGS.report_max_concurrent,
+                "report_max_pending": SETTINGS.report_max_pending,
+                "report_aggregation": SETTINGS.report_aggregation,
+                "report_engine": SETTINGS.report_engine,
+                "shared_cache_enabled": SETTINGS.shared_cache_enabled,
+            },
+            "elapsed_seconds": round(elapsed, 3),
+        },
+        "endpoints": summarize(samples, elapsed),
+        "workers": [
+            {key: value for key, value in worker.items() if key != "samples"}
+            | {"requests": len(worker["samples"])}
+            for worker in workers
+        ],
+    }
+
+
+def _print_summary(results: dict[str, Any]) -> None:
+    meta = results["meta"]
+    load = meta["load"]
+    print(
+        f"{load['workers']} worker(s), {load['users']} users, {meta['elapsed_seconds']:.1f}s, "
+        f"db latency {meta['database']['latency_ms']:g} ms, "
+        f"pool {meta['database']['pool_size']} per worker"
+    )
+    for item in results["endpoints"]:
+        latency = item["latency_ms"]
+        print(
+            f"{item['name']:<12} {item['requests']:>7} req  {item['throughput_per_s']:>8.1f}/s"
+            f"  p50 {latency['p50']:>9.1f} ms  p95 {latency['p95']:>9.1f} ms"
+            f"  p99 {latency['p99']:>9.1f} ms  errors {item['error_rate']:>6.1%}"
+        )
+    for worker in results["workers"]:
+        pool = worker["pool"]
+        print(
+            f"worker {worker['worker']}: pool waits {pool['wait_count']}"
+            f" (max {pool['wait_seconds_max'] * 1000:.0f} ms), timeouts {pool['timeouts']},"
+            f" db queries {worker['db_queries']}, db failures {worker['db_failures']}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Hydro monthly report concurrent load test")
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--year", type=int, default=2026)
+    parser.add_argument("--month", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=SyntheticConfig.seed)
+    parser.add_argument("--users", type=int, default=LoadConfig.users)
+    parser.add_argument("--duration", type=float, default=LoadConfig.duration, help="seconds")
+    parser.add_argument("--workers", type=int, default=LoadConfig.workers)
+    parser.add_argument("--months", type=int, default=LoadConfig.months)
+    parser.add_argument(
+        "--mix",
+        action="append",
+        metavar="KIND=WEIGHT",
+        help=f"request mix, repeatable or comma separated; kinds: {', '.join(TRAFFIC)}",
+    )
+    parser.add_argument("--think-ms", type=float, default=LoadConfig.think_ms)
+    parser.add_argument("--db-latency-ms", type=float, default=DatabaseProfile.latency_ms)
+    parser.add_argument("--db-latency-sigma", type=float, default=DatabaseProfile.latency_sigma)
+    parser.add_argument("--db-rows-per-second", type=float, default=DatabaseProfile.rows_per_second)
+    parser.add_argument("--db-failure-rate", type=float, default=DatabaseProfile.failure_rate)
+    parser.add_argument("--db-pool-size", type=int, default=DatabaseProfile.pool_size)
+    parser.add_argument("--db-pool-timeout", type=float, default=DatabaseProfile.pool_timeout)
+    parser.add_argument("--output", type=Path, help="result JSON path (default benchmarks/results/)")
+    args = parser.parse_args(argv)
+
+    synthetic = SyntheticConfig(
+        stations=args.stations, year=args.year, month=args.month, seed=args.seed
+    )
+    profile = DatabaseProfile(
+        latency_ms=args.db_latency_ms,
+        latency_sigma=args.db_latency_sigma,
+        rows_per_second=args.db_rows_per_second,
+        failure_rate=args.db_failure_rate,
+        pool_size=args.db_pool_size,
+        pool_timeout=args.db_pool_timeout,
+    )
+    load = LoadConfig(
+        users=args.users,
+        duration=args.duration,
+        workers=args.workers,
+        months=args.months,
+        mix=parse_mix(args.mix) if args.mix else dict(DEFAULT_MIX),
+        think_ms=args.think_ms,
+    )
+
+    results = run_load(synthetic, profile, load)
+    _print_summary(results)
+
+    output = args.output or RESULTS_DIR / f"load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
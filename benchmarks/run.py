@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import math
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from app.config_store import generate_rules_from_stations, save_rules_to_file
+from app.db import month_range
+from app.export import build_report_export
+from app.report_logic import (
+    build_monthly_report,
+    compile_rules,
+    resolve_daily_expected,
+    slot_index,
+)
+from app.report_vectorized import numpy_available
+from benchmarks.synthetic import SyntheticConfig, SyntheticRepository, generate_rules
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    # Nearest-rank, so small sample counts still report an observed value.
+    rank = max(1, min(len(ordered), math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+
+def measure(
+    name: str,
+    func: Callable[[], Any],
+    repeat: int = 5,
+    warmup: int = 1,
+    items: int | None = None,
+    unit: str = "rows",
+) -> dict[str, Any]:
+    for _ in range(warmup):
+        func()
+
+    samples: list[float] = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+
+    # Peak memory is taken from a separate traced run: tracemalloc slows
+    # allocation-heavy code enough to distort the timings above.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    p50 = percentile(samples, 0.50)
+    result: dict[str, Any] = {
+        "name": name,
+        "runs": repeat,
+        "latency_ms": {
+            "min": round(min(samples) * 1000, 3),
+            "mean": round(sum(samples) / len(samples) * 1000, 3),
+            "p50": round(p50 * 1000, 3),
+            "p95": round(percentile(samples, 0.95) * 1000, 3),
+            "p99": round(percentile(samples, 0.99) * 1000, 3),
+            "max": round(max(samples) * 1000, 3),
+        },
+        "peak_memory_bytes": peak,
+    }
+    if items is not None:
+        result["items"] = items
+        result["unit"] = unit
+        result["throughput_per_s"] = round(items / p50, 1) if p50 > 0 else None
+    return result
+
+
+def _git_revision() -> str | None:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def _stage_benchmarks(
+    repo: SyntheticRepository, config: SyntheticConfig, repeat: int
+) -> list[dict[str, Any]]:
+    stations = repo.fetch_stations()
+    rules = compile_rules(generate_rules_from_stations(stations, generate_rules(config)))
+    start, end = month_range(config.year, config.month, day_start_hour=config.day_start_hour)
+    records = repo.fetch_records(start, end, "1")
+    times = [record["datatime"] for record in records]
+
+    def run_slot_index() -> None:
+        for data_time in times:
+            slot_index(data_time, 48, config.day_start_hour)
+
+    def run_resolve_daily_expected() -> None:
+        for station in stations:
+            resolve_daily_expected(station["station_id"], station["ctype"], rules)
+
+    report = build_monthly_report(stations, records, config.year, config.month, rules)
+
+    return [
+        measure("slot_index", run_slot_index, repeat, items=len(times), unit="calls"),
+        measure(
+            "resolve_daily_expected",
+            run_resolve_daily_expected,
+            repeat,
+            items=len(stations),
+            unit="stations",
+        ),
+        measure(
+            "build_monthly_report",
+            lambda: build_monthly_report(stations, records, config.year, config.month, rules),
+            repeat,
+            items=len(records),
+        ),
+        measure(
+            "export_xlsx",
+            lambda: build_report_export(report, "xlsx"),
+            repeat,
+            items=len(report["rows"]),
+            unit="stations",
+        ),
+        measure(
+            "export_csv",
+            lambda: build_report_export(report, "csv"),
+            repeat,
+            items=len(report["rows"]),
+            unit="stations",
+        ),
+    ]
+
+
+def _endpoint_benchmarks(
+    repo: SyntheticRepository,
+    config: SyntheticConfig,
+    repeat: int,
+    aggregations: list[str],
+    engines: list[str],
+    workdir: Path,
+) -> list[dict[str, Any]]:
+    from fastapi.testclient import TestClient
+
+    from app.incremental import IncrementalReportStore
+    from app.main import create_app
+    from app.report_cache import ReportCache
+
+    config_path = workdir / "report_rules.json"
+    save_rules_to_file(
+        config_path, generate_rules_from_stations(repo.fetch_stations(), generate_rules(config))
+    )
+    params = {"year": config.year, "month": config.month}
+    results: list[dict[str, Any]] = []
+
+    for aggregation in aggregations:
+        for engine in engines:
+            if aggregation == "sql" and engine != "python":
+                continue
+            app = create_app(
+                config_path=config_path,
+                repository_factory=lambda: repo,
+                report_aggregation=aggregation,
+                report_engine=engine,
+                report_cache=ReportCache(workdir / f"cache-{aggregation}-{engine}.sqlite3"),
+                incremental_store=IncrementalReportStore(),
+            )
+            with TestClient(app) as client:
+
+                def cold() -> None:
+                    full = {**params, "refresh": "full"}
+                    client.get("/api/report/monthly", params=full).raise_for_status()
+
+                def cached() -> None:
+                    client.get("/api/report/monthly", params=params).raise_for_status()
+
+                def export() -> None:
+                    client.get("/api/report/monthly/export", params=params).raise_for_status()
+
+                label = f"{aggregation}/{engine}"
+                results.append(
+                    measure(
+                        f"GET /api/report/monthly [{label}, full]",
+                        cold,
+                        repeat,
+                        items=repo.row_count,
+                    )
+                )
+                results.append(measure(f"GET /api/report/monthly [{label}, cached]", cached, repeat))
+                if aggregation == aggregations[0] and engine == engines[0]:
+                    results.append(measure("GET /api/report/monthly/export [cached]", export, repeat))
+    return results
+
+
+def run(
+    config: SyntheticConfig,
+    repeat: int = 5,
+    aggregations: list[str] | None = None,
+    engines: list[str] | None = None,
+    endpoints: bool = True,
+) -> dict[str, Any]:
+    aggregations = aggregations or ["python", "stream", "sql"]
+    engines = engines or (["python", "numpy"] if numpy_available() else ["python"])
+
+    started = time.perf_counter()
+    repo = SyntheticRepository.from_config(config)
+    generation_seconds = time.perf_counter() - started
+
+    stages = _stage_benchmarks(repo, config, repeat)
+    if endpoints:
+        with tempfile.TemporaryDirectory(prefix="hydro-bench-") as workdir:
+            stages += _endpoint_benchmarks(
+                repo, config, repeat, aggregations, engines, Path(workdir)
+            )
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": numpy_available(),
+            "repeat": repeat,
+            "synthetic": config.to_dict(),
+            "rows": repo.row_count,
+            "generation_seconds": round(generation_seconds, 3),
+        },
+        "stages": stages,
+    }
+
+
+def _print_summary(results: dict[str, Any]) -> None:
+    meta = results["meta"]
+    print(f"{meta['synthetic']['stations']} stations, {meta['rows']} rows, repeat={meta['repeat']}")
+    for stage in results["stages"]:
+        latency = stage["latency_ms"]
+        throughput = stage.get("throughput_per_s")
+        rate = f"{throughput:>14,.0f} {stage['unit']}/s" if throughput else " " * 20
+        print(
+            f"{stage['name']:<52} p50 {latency['p50']:>10.1f} ms  p95 {latency['p95']:>10.1f} ms"
+            f"  {rate}  peak {stage['peak_memory_bytes'] / 1024 / 1024:>8.1f} MiB"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Hydro monthly report benchmarks")
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--year", type=int, default=2026)
+    parser.add_argument("--month", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=SyntheticConfig.seed)
+    parser.add_argument("--jitter-minutes", type=float, default=SyntheticConfig.jitter_minutes)
+    parser.add_argument("--duplicate-rate", type=float, default=SyntheticConfig.duplicate_rate)
+    parser.add_argument("--gap-rate", type=float, default=SyntheticConfig.gap_rate)
+    parser.add_argument("--late-rate", type=float, default=SyntheticConfig.late_rate)
+    parser.add_argument(
+        "--frequency",
+        action="append",
+        metavar="CTYPE=PER_DAY",
+        help="reports per day for a station type, repeatable (default 01=24 ZZ=48 RR=12 PP=288)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--aggregation", action="append", choices=["python", "stream", "sql"])
+    parser.add_argument("--engine", action="append", choices=["python", "numpy"])
+    parser.add_argument("--skip-endpoints", action="store_true")
+    parser.add_argument("--output", type=Path, help="result JSON path (default benchmarks/results/)")
+    args = parser.parse_args(argv)
+
+    config = SyntheticConfig(
+        stations=args.stations,
+        year=args.year,
+        month=args.month,
+        seed=args.seed,
+        jitter_minutes=args.jitter_minutes,
+        duplicate_rate=args.duplicate_rate,
+        gap_rate=args.gap_rate,
+        late_rate=args.late_rate,
+    )
+    if args.frequency:
+        frequencies: dict[str, int] = {}
+        for item in args.frequency:
+            ctype, _, per_day = item.partition("=")
+            frequencies[ctype.strip()] = int(per_day)
+        config.ctype_frequencies = frequencies
+        config.ctype_weights = {ctype: 1.0 for ctype in frequencies}
+
+    results = run(
+        config,
+        repeat=args.repeat,
+        aggregations=args.aggregation,
+        engines=args.engine,
+        endpoints=not args.skip_endpoints,
+    )
+    _print_summary(results)
+
+    output = args.output or RESULTS_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    print(f"results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import calendar
+import hashlib
+import random
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Iterator
+
+from app.report_logic import slot_index
+
+
+@dataclass
+class SyntheticConfig:
+    stations: int = 500
+    year: int = 2026
+    month: int = 1
+    # Reporting frequency (reports per day) by station type; stations are spread
+    # over these types with the given weights.
+    ctype_frequencies: dict[str, int] = field(
+        default_factory=lambda: {"01": 24, "ZZ": 48, "RR": 12, "PP": 288}
+    )
+    ctype_weights: dict[str, float] = field(
+        default_factory=lambda: {"01": 0.5, "ZZ": 0.25, "RR": 0.2, "PP": 0.05}
+    )
+    jitter_minutes: float = 3.0
+    duplicate_rate: float = 0.05
+    gap_rate: float = 0.03
+    outage_day_rate: float = 0.01
+    late_rate: float = 0.02
+    day_start_hour: int = 8
+    seed: int = 20260101
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def generate_stations(config: SyntheticConfig) -> list[dict[str, Any]]:
+    rng = random.Random(config.seed)
+    ctypes = list(config.ctype_frequencies)
+    weights = [config.ctype_weights.get(ctype, 1.0) for ctype in ctypes]
+    return [
+        {
+            "station_id": f"{60000000 + index:08d}",
+            "cname": f"测站{index:05d}",
+            "ctype": rng.choices(ctypes, weights)[0],
+        }
+        for index in range(config.stations)
+    ]
+
+
+def generate_rules(config: SyntheticConfig) -> dict[str, Any]:
+    return {
+        "default_daily_expected": 24,
+        "ctype_defaults": {**config.ctype_frequencies, "*": 24},
+        "sourcetype_filter": "1",
+        "day_start_hour": config.day_start_hour,
+    }
+
+
+def generate_records(
+    config: SyntheticConfig, stations: list[dict[str, Any]]
+) -> tuple[list[tuple[str, datetime]], list[tuple[str, datetime]]]:
+    # One report per expected slot of the hydro month, perturbed by jitter, with
+    # random gaps, whole-day outages and duplicate rows. Returns the time-ordered
+    # rows and, separately, the late rows that arrive after them in insertion
+    # order.
+    rng = random.Random(config.seed + 1)
+    days = calendar.monthrange(config.year, config.month)[1]
+    month_start = datetime(config.year, config.month, 1, config.day_start_hour)
+    jitter = config.jitter_minutes
+    on_time: list[tuple[str, datetime]] = []
+    late: list[tuple[str, datetime]] = []
+
+    for station in stations:
+        station_id = station["station_id"]
+        per_day = config.ctype_frequencies.get(station["ctype"], 24)
+        interval = 1440 / per_day
+        for day in range(days):
+            if rng.random() < config.outage_day_rate:
+                continue
+            day_start = month_start + timedelta(days=day)
+            for slot in range(per_day):
+                if rng.random() < config.gap_rate:
+                    continue
+                offset = slot * interval + rng.uniform(-jitter, jitter)
+                data_time = (day_start + timedelta(minutes=offset)).replace(second=0, microsecond=0)
+                target = late if rng.random() < config.late_rate else on_time
+                target.append((station_id, data_time))
+                if rng.random() < config.duplicate_rate:
+                    target.append((station_id, data_time + timedelta(minutes=rng.randint(0, 2))))
+
+    on_time.sort(key=lambda row: row[1])
+    return on_time, late
+
+
+class SyntheticRepository:
+    # In-process RepositoryProtocol over pre-generated rows. Range filtering uses
+    # bisect on the time-ordered part and a scan of the late tail, so the fake
+    # "database" cost stays small next to the code under measurement.
+    def __init__(
+        self,
+        stations: list[dict[str, Any]],
+        ordered: list[tuple[str, datetime]],
+        late: list[tuple[str, datetime]] | None = None,
+    ):
+        self.stations = stations
+        self._ordered = ordered
+        self._late = late or []
+        self._ordered_times = [row[1] for row in ordered]
+
+    @classmethod
+    def from_config(cls, config: SyntheticConfig) -> SyntheticRepository:
+        stations = generate_stations(config)
+        return cls(stations, *generate_records(config, stations))
+
+    @property
+    def row_count(self) -> int:
+        return len(self._ordered) + len(self._late)
+
+    def fetch_stations(self) -> list[dict[str, Any]]:
+        return [dict(station) for station in self.stations]
+
+    def probe_stations(self) -> tuple[int, int]:
+        # Stable across processes (unlike hash()), so every worker sees the same probe.
+        ids = "\n".join(station["station_id"] for station in self.stations)
+        digest = hashlib.blake2b(ids.encode("utf-8"), digest_size=8).digest()
+        return len(self.stations), int.from_bytes(digest, "big")
+
+    def _rows_between(self, start: datetime, end: datetime) -> Iterator[tuple[str, datetime]]:
+        first = bisect_left(self._ordered_times, start)
+        last = bisect_left(self._ordered_times, end)
+        yield from self._ordered[first:last]
+        for row in self._late:
+            if start <= row[1] < end:
+                yield row
+
+    def fetch_records(self, start, end, sourcetype_filter: str) -> list[dict[str, Any]]:
+        return [
+            {"station_id": station_id, "datatime": data_time}
+            for station_id, data_time in self._rows_between(start, end)
+        ]
+
+    def iter_record_batches(
+        self, start, end, sourcetype_filter: str, batch_size: int = 5000
+    ) -> Iterator[list[tuple[str, datetime]]]:
+        batch: list[tuple[str, datetime]] = []
+        for row in self._rows_between(start, end):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def fetch_slot_counts(
+        self,
+        start,
+        end,
+        sourcetype_filter: str,
+        station_expected: dict[str, int],
+        day_start_hour: int,
+    ) -> list[dict[str, Any]]:
+        slots: set[tuple[str, int, int]] = set()
+        for station_id, data_time in self._rows_between(start, end):
+            expected = station_expected.get(station_id)
+            if expected is None:
+                continue
+            day = (data_time - timedelta(hours=day_start_hour)).day
+            slots.add((station_id, day, slot_index(data_time, expected, day_start_hour)))
+
+        counts: dict[tuple[str, int], int] = {}
+        for station_id, day, _ in slots:
+            counts[(station_id, day)] = counts.get((station_id, day), 0) + 1
+        return [
+            {"station_id": station_id, "day": day, "actual": actual}
+            for (station_id, day), actual in counts.items()
+        ]
@@ -16,6 +16,7 @@ if not defined APP_HOST set "APP_HOST=0.0.0.0"
 if not defined APP_PORT set "APP_PORT=8000"
 if not defined RUN_MODE set "RUN_MODE=prod"
 if not defined APP_WORKERS set "APP_WORKERS=2"
+if not defined SHARED_CACHE_ENABLED set "SHARED_CACHE_ENABLED=1"
 if not defined LOG_LEVEL set "LOG_LEVEL=info"
 if not defined UV_SYNC_ARGS set "UV_SYNC_ARGS=--extra dev"
 if not defined SKIP_SYNC set "SKIP_SYNC=0"
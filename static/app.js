@@ -24,48 +24,274 @@ function getCurrentYearMonth() {
   return { year, month };
 }
 
-function renderTable(data) {
+const reportWrap = document.getElementById("reportWrap");
+const sortPicker = document.getElementById("sortPicker");
+const ctypeFilter = document.getElementById("ctypeFilter");
+const stationPrefixFilter = document.getElementById("stationPrefixFilter");
+const maxRateFilter = document.getElementById("maxRateFilter");
+
+// Rows are fetched a page at a time and only the rows in view (plus a margin)
+// are in the DOM; spacer rows keep the scroll height of the full table.
+const PAGE_SIZE = 200;
+const ROW_HEIGHT = 26;
+const OVERSCAN = 12;
+
+let report = null;
+let renderQueued = false;
+
+function reportQuery() {
+  const { year, month } = getCurrentYearMonth();
+  const params = new URLSearchParams({ year, month, shape: "columnar", limit: PAGE_SIZE });
+  if (sortPicker.value) {
+    params.set("sort", sortPicker.value);
+  }
+  if (ctypeFilter.value.trim()) {
+    params.set("ctype", ctypeFilter.value.trim());
+  }
+  if (stationPrefixFilter.value.trim()) {
+    params.set("station_prefix", stationPrefixFilter.value.trim());
+  }
+  if (maxRateFilter.value !== "") {
+    params.set("max_rate", maxRateFilter.value);
+  }
+  return { year, month, params };
+}
+
+async function fetchPage(state, pageIndex) {
+  const params = new URLSearchParams(state.params);
+  params.set("offset", pageIndex * PAGE_SIZE);
+  // "no-cache" makes the browser revalidate with If-None-Match; an unchanged
+  // page comes back as 304 and is served from the HTTP cache.
+  const response = await fetch(`/api/report/monthly?${params}`, { cache: "no-cache" });
+  if (!response.ok) {
+    const err = await response.json();
+    throw new Error(err.detail || "查询失败");
+  }
+  return { etag: response.headers.get("ETag") || "", data: await response.json() };
+}
+
+function loadPage(pageIndex) {
+  const state = report;
+  if (state.pages.has(pageIndex) || state.pending.has(pageIndex)) {
+    return;
+  }
+  state.pending.add(pageIndex);
+  fetchPage(state, pageIndex)
+    .then(({ data }) => {
+      state.pages.set(pageIndex, data);
+      if (state === report) {
+        scheduleRender();
+      }
+    })
+    .catch((error) => setMessage(error.message || "查询失败"))
+    .finally(() => state.pending.delete(pageIndex));
+}
+
+function renderHeader(data) {
   const headers = ["站名", ...data.day_headers, "应到报", "实到报", "到报率(%)"];
+  const cells = headers.map((head) => `<th>${head}</th>`).join("");
+  reportTable.innerHTML = `<thead><tr>${cells}</tr></thead><tbody></tbody>`;
+}
 
-  let html = "<thead><tr>";
-  headers.forEach((head) => {
-    html += `<th>${head}</th>`;
-  });
-  html += "</tr></thead><tbody>";
+function spacerRow(height, columns) {
+  return height > 0
+    ? `<tr class="spacer"><td colspan="${columns}" style="height:${height}px"></td></tr>`
+    : "";
+}
 
-  data.rows.forEach((row) => {
-    html += "<tr>";
-    html += `<td>${row.station_name}</td>`;
-    row.daily_actual.forEach((value) => {
-      html += `<td>${value}</td>`;
-    });
-    html += `<td>${row.expected_total}</td>`;
-    html += `<td>${row.actual_total}</td>`;
-    html += `<td>${row.rate}</td>`;
-    html += "</tr>";
+function renderRow(page, index) {
+  const { columns } = page;
+  let html = `<tr><td>${columns.station_name[index]}</td>`;
+  page.daily_actual[index].forEach((value) => {
+    html += `<td>${value}</td>`;
   });
+  html += `<td>${columns.expected_total[index]}</td>`;
+  html += `<td>${columns.actual_total[index]}</td>`;
+  html += `<td>${columns.rate[index]}</td></tr>`;
+  return html;
+}
 
-  html += "</tbody>";
-  reportTable.innerHTML = html;
+function renderVisibleRows() {
+  renderQueued = false;
+  const state = report;
+  if (!state) {
+    return;
+  }
+  const columnCount = state.dayCount + 4;
+  const first = Math.max(0, Math.floor(reportWrap.scrollTop / ROW_HEIGHT) - OVERSCAN);
+  const visible = Math.ceil(reportWrap.clientHeight / ROW_HEIGHT) + OVERSCAN * 2;
+  const last = Math.min(state.total, first + visible);
+
+  let html = spacerRow(first * ROW_HEIGHT, columnCount);
+  for (let row = first; row < last; row += 1) {
+    const pageIndex = Math.floor(row / PAGE_SIZE);
+    const page = state.pages.get(pageIndex);
+    if (page) {
+      html += renderRow(page, row - pageIndex * PAGE_SIZE);
+    } else {
+      loadPage(pageIndex);
+      html += `<tr><td colspan="${columnCount}" class="loading">加载中...</td></tr>`;
+    }
+  }
+  html += spacerRow((state.total - last) * ROW_HEIGHT, columnCount);
+  reportTable.tBodies[0].innerHTML = html;
+}
+
+function scheduleRender() {
+  if (!renderQueued) {
+    renderQueued = true;
+    window.requestAnimationFrame(renderVisibleRows);
+  }
 }
 
 async function fetchReport() {
-  const { year, month } = getCurrentYearMonth();
+  const { year, month, params } = reportQuery();
+  const key = params.toString();
   setMessage("正在加载...", false);
   try {
-    const response = await fetch(`/api/report/monthly?year=${year}&month=${month}`);
-    if (!response.ok) {
-      const err = await response.json();
-      throw new Error(err.detail || "查询失败");
+    const state = {
+      key,
+      params,
+      pages: new Map(),
+      pending: new Set(),
+      total: 0,
+      dayCount: 0,
+      etag: "",
+    };
+    const { etag, data } = await fetchPage(state, 0);
+    if (etag && report && report.key === key && report.etag === etag) {
+      setMessage(`数据未变化：${year}年${month}月`, false);
+      return;
+    }
+    state.etag = etag;
+    state.total = data.total_rows;
+    state.dayCount = data.day_headers.length;
+    state.pages.set(0, data);
+    report = state;
+    renderHeader(data);
+    reportWrap.scrollTop = 0;
+    renderVisibleRows();
+    if (data.partial) {
+      const failed = data.sources.filter((source) => !source.ok).map((source) => source.name);
+      setMessage(`数据源未响应：${failed.join("、")}，以下结果不完整`);
+      return;
     }
-    const data = await response.json();
-    renderTable(data);
-    setMessage(`加载完成：${year}年${month}月`, false);
+    const shown = data.total_rows === data.station_count ? "" : `（共 ${data.station_count} 站）`;
+    setMessage(`加载完成：${year}年${month}月，${data.total_rows} 站${shown}`, false);
   } catch (error) {
     setMessage(error.message || "查询失败");
   }
 }
 
+const toggleLiveBtn = document.getElementById("toggleLiveBtn");
+const livePanel = document.getElementById("livePanel");
+const liveStatus = document.getElementById("liveStatus");
+const liveTable = document.getElementById("liveTable");
+
+// Live view of the current hydro day: a snapshot followed by the slots that
+// arrive; stations are listed by how many of the slots already past are missing.
+const LIVE_MAX_ROWS = 200;
+
+let liveSource = null;
+let liveTimer = null;
+let live = null;
+
+function slotStartLabel(dayStart, slot, perDay) {
+  const minutes = Math.ceil((slot * 1440) / perDay);
+  const time = new Date(dayStart.getTime() + minutes * 60000);
+  return `${String(time.getHours()).padStart(2, "0")}:${String(time.getMinutes()).padStart(2, "0")}`;
+}
+
+function renderLive() {
+  if (!live) {
+    return;
+  }
+  const now = Date.now() + live.clockOffset;
+  const elapsedMinutes = Math.min(Math.max((now - live.dayStart.getTime()) / 60000, 0), 1440);
+  const rows = [];
+  let complete = 0;
+  live.stations.forEach((station) => {
+    // Slots before the one containing "now" are over and should have arrived.
+    const perDay = station.expected_per_day;
+    const due = Math.min(Math.floor((elapsedMinutes * perDay) / 1440), perDay);
+    const missing = [];
+    for (let slot = 0; slot < due; slot += 1) {
+      if (!station.present.has(slot)) {
+        missing.push(slot);
+      }
+    }
+    if (missing.length === 0) {
+      complete += 1;
+      return;
+    }
+    rows.push({ station, due, missing });
+  });
+  rows.sort((a, b) => b.missing.length - a.missing.length);
+
+  let html = "<thead><tr><th>站名</th><th>已到/应到</th><th>缺报时段</th></tr></thead><tbody>";
+  rows.slice(0, LIVE_MAX_ROWS).forEach(({ station, due, missing }) => {
+    const labels = missing
+      .slice(0, 12)
+      .map((slot) => slotStartLabel(live.dayStart, slot, station.expected_per_day));
+    const more = missing.length > 12 ? ` 等 ${missing.length} 个` : "";
+    html += `<tr><td>${station.station_name}</td><td>${due - missing.length}/${due}</td>`;
+    html += `<td>${labels.join("、")}${more}</td></tr>`;
+  });
+  html += "</tbody>";
+  liveTable.innerHTML = html;
+  const shown = rows.length > LIVE_MAX_ROWS ? `，仅显示前 ${LIVE_MAX_ROWS} 站` : "";
+  liveStatus.textContent =
+    `统计日 ${live.hydroDay}：${complete} 站已到齐，${rows.length} 站有缺报${shown}` +
+    `（数据截至 ${live.watermark || "-"}）`;
+}
+
+function applyLiveSnapshot(data) {
+  live = {
+    hydroDay: data.hydro_day,
+    dayStart: new Date(data.day_start),
+    clockOffset: new Date(data.now).getTime() - Date.now(),
+    watermark: data.watermark,
+    stations: data.stations.map((station) => ({ ...station, present: new Set(station.present) })),
+  };
+  live.byId = new Map(live.stations.map((station) => [station.station_id, station]));
+  renderLive();
+}
+
+function applyLiveArrivals(data) {
+  if (!live || data.hydro_day !== live.hydroDay) {
+    return;
+  }
+  data.arrivals.forEach(([stationId, slot]) => {
+    const station = live.byId.get(stationId);
+    if (station) {
+      station.present.add(slot);
+    }
+  });
+  live.watermark = data.watermark;
+  renderLive();
+}
+
+function startLive() {
+  liveStatus.textContent = "正在连接...";
+  liveSource = new EventSource("/api/live/stream");
+  liveSource.addEventListener("snapshot", (event) => applyLiveSnapshot(JSON.parse(event.data)));
+  liveSource.addEventListener("arrivals", (event) => applyLiveArrivals(JSON.parse(event.data)));
+  liveSource.onerror = () => {
+    liveStatus.textContent = "连接中断，正在重连...";
+  };
+  // Slots fall due as time passes even when nothing arrives.
+  liveTimer = window.setInterval(renderLive, 60000);
+}
+
+function stopLive() {
+  if (liveSource) {
+    liveSource.close();
+    liveSource = null;
+  }
+  window.clearInterval(liveTimer);
+  live = null;
+}
+
 function exportReport() {
   const { year, month } = getCurrentYearMonth();
   window.location.href = `/api/report/monthly/export?year=${year}&month=${month}`;
@@ -156,12 +382,31 @@ function initYearMonthPickers() {
 }
 
 queryBtn.addEventListener("click", fetchReport);
+sortPicker.addEventListener("change", fetchReport);
+[ctypeFilter, stationPrefixFilter, maxRateFilter].forEach((input) => {
+  input.addEventListener("keydown", (event) => {
+    if (event.key === "Enter") {
+      fetchReport();
+    }
+  });
+});
+reportWrap.addEventListener("scroll", scheduleRender);
+window.addEventListener("resize", scheduleRender);
 exportBtn.addEventListener("click", exportReport);
 
 reloadConfigBtn.addEventListener("click", loadConfig);
 saveConfigBtn.addEventListener("click", saveConfig);
 regenerateConfigBtn.addEventListener("click", regenerateConfig);
 
+toggleLiveBtn.addEventListener("click", () => {
+  livePanel.classList.toggle("hidden");
+  if (livePanel.classList.contains("hidden")) {
+    stopLive();
+  } else {
+    startLive();
+  }
+});
+
 toggleConfigBtn.addEventListener("click", async () => {
   configPanel.classList.toggle("hidden");
   if (!configPanel.classList.contains("hidden")) {
@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.config_store import save_rules_to_file
+from app.main import _build_range_report, _build_report, create_app, month_span
+
+
+class FakeRepo:
+    def __init__(self):
+        self.calls: list[str] = []
+
+    def fetch_stations(self):
+        return [
+            {"station_id": "A001", "cname": "甲站", "ctype": "01"},
+            {"station_id": "B001", "cname": "乙站", "ctype": "99"},
+        ]
+
+    def fetch_records(self, start, end, sourcetype_filter):
+        self.calls.append("records")
+        return [
+            {"station_id": "A001", "datatime": datetime(2026, 1, 1, 9, 5)},
+            {"station_id": "A001", "datatime": datetime(2026, 1, 1, 9, 40)},
+            {"station_id": "A001", "datatime": datetime(2026, 1, 2, 8, 59)},
+            {"station_id": "B001", "datatime": datetime(2026, 1, 1, 9, 5)},
+            {"station_id": "B001", "datatime": datetime(2026, 1, 1, 9, 31)},
+            {"station_id": "B001", "datatime": datetime(2026, 2, 1, 8, 0)},
+        ]
+
+    def iter_record_batches(self, start, end, sourcetype_filter, batch_size=5000):
+        self.calls.append("batches")
+        rows = [
+            (record["station_id"], record["datatime"])
+            for record in self.fetch_records(start, end, sourcetype_filter)
+        ]
+        for offset in range(0, len(rows), 2):
+            yield rows[offset : offset + 2]
+
+    def fetch_slot_counts(self, start, end, sourcetype_filter, station_expected, day_start_hour):
+        self.calls.append("slot_counts")
+        slots: set[tuple[str, int, int]] = set()
+        for record in self.fetch_records(start, end, sourcetype_filter):
+            shifted = record["datatime"] - timedelta(hours=day_start_hour)
+            minute_of_day = shifted.hour * 60 + shifted.minute
+            expected = station_expected[record["station_id"]]
+            slots.add((record["station_id"], shifted.day, minute_of_day * expected // 1440))
+
+        counts: dict[tuple[str, int], int] = {}
+        for station_id, day, _ in slots:
+            counts[(station_id, day)] = counts.get((station_id, day), 0) + 1
+        return [
+            {"station_id": station_id, "day": day, "actual": actual}
+            for (station_id, day), actual in counts.items()
+        ]
+
+
+def test_sql_aggregation_matches_python_aggregation(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24, "*": 48}, "day_start_hour": 9})
+
+    python_repo = FakeRepo()
+    sql_repo = FakeRepo()
+    python_report = _build_report(python_repo, config_file, 2026, 1, "python")
+    sql_report = _build_report(sql_repo, config_file, 2026, 1, "sql")
+
+    assert python_repo.calls == ["records"]
+    assert sql_repo.calls[0] == "slot_counts"
+    assert sql_report == python_report
+    assert python_report["rows"][0]["daily_actual"][0] == 2
+    assert python_report["rows"][1]["daily_actual"][0] == 2
+    assert python_report["rows"][1]["daily_actual"][30] == 1
+
+
+def test_stream_aggregation_matches_python_aggregation(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24, "*": 48}, "day_start_hour": 9})
+
+    stream_repo = FakeRepo()
+    stream_report = _build_report(stream_repo, config_file, 2026, 1, "stream")
+
+    assert stream_repo.calls[0] == "batches"
+    assert stream_report == _build_report(FakeRepo(), config_file, 2026, 1, "python")
+
+
+def test_numpy_engine_matches_python_engine_for_each_aggregation(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24, "*": 48}, "day_start_hour": 9})
+
+    expected = _build_report(FakeRepo(), config_file, 2026, 1, "python")
+    for aggregation in ("python", "stream"):
+        assert _build_report(FakeRepo(), config_file, 2026, 1, aggregation, "numpy") == expected
+
+
+def test_range_report_fetches_stations_once_and_summarizes(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24, "*": 48}, "day_start_hour": 9})
+
+    class CountingRepo(FakeRepo):
+        station_fetches = 0
+
+        def fetch_stations(self):
+            CountingRepo.station_fetches += 1
+            return super().fetch_stations()
+
+    months = month_span(2025, 12, 2026, 2)
+    report = _build_range_report(CountingRepo(), config_file, months, max_workers=3)
+
+    assert months == [(2025, 12), (2026, 1), (2026, 2)]
+    assert CountingRepo.station_fetches == 1
+    assert report["month_headers"] == ["2025-12", "2026-01", "2026-02"]
+
+    january = _build_report(FakeRepo(), config_file, 2026, 1)
+    assert report["months"][1]["actual_total"] == sum(row["actual_total"] for row in january["rows"])
+
+    row = report["rows"][0]
+    assert row["station_id"] == "A001"
+    assert row["monthly_expected"] == [24 * 31, 24 * 31, 24 * 28]
+    assert row["monthly_actual"][1] == january["rows"][0]["actual_total"]
+    assert row["expected_total"] == 24 * 90
+    assert report["expected_total"] == sum(item["expected_total"] for item in report["rows"])
+
+
+def test_explain_endpoint_passes_hydro_month_window_to_repository(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"day_start_hour": 9, "sourcetype_filter": "2"})
+
+    class ExplainingRepo(FakeRepo):
+        def explain_record_query(self, start, end, sourcetype_filter):
+            return {"start": str(start), "end": str(end), "sourcetype_filter": sourcetype_filter}
+
+    client = TestClient(create_app(config_path=config_file, repository_factory=ExplainingRepo))
+    response = client.get("/api/db/explain", params={"year": 2026, "month": 2})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "start": "2026-02-01 09:00:00",
+        "end": "2026-03-01 09:00:00",
+        "sourcetype_filter": "2",
+    }
+
+    client = TestClient(create_app(config_path=config_file, repository_factory=FakeRepo))
+    assert client.get("/api/db/explain", params={"year": 2026, "month": 2}).status_code == 404
+
+
+def test_monthly_endpoint_pages_sorts_and_filters_rows(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24, "*": 48}, "day_start_hour": 9})
+    client = TestClient(create_app(config_path=config_file, repository_factory=FakeRepo))
+
+    params = {"year": 2026, "month": 1, "sort": "-expected_total", "limit": 1}
+    response = client.get("/api/report/monthly", params=params)
+    body = response.json()
+    assert [row["station_id"] for row in body["rows"]] == ["B001"]
+    assert body["total_rows"] == 2 and body["station_count"] == 2
+
+    second = client.get("/api/report/monthly", params={**params, "offset": 1, "shape": "columnar"})
+    assert second.json()["columns"]["station_id"] == ["A001"]
+    assert second.headers["ETag"] != response.headers["ETag"]
+
+    filtered = client.get(
+        "/api/report/monthly", params={"year": 2026, "month": 1, "ctype": "99", "max_rate": 10}
+    ).json()
+    assert [row["station_id"] for row in filtered["rows"]] == ["B001"]
+
+    assert client.get("/api/report/monthly", params={**params, "sort": "cname"}).status_code == 422
@@ -0,0 +1,125 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.db import month_range
+from benchmarks.load import (
+    DatabaseProfile,
+    LatencyRepository,
+    LoadConfig,
+    SimulatedDatabaseError,
+    parse_mix,
+    run_load,
+)
+from benchmarks.run import percentile, run
+from benchmarks.synthetic import (
+    SyntheticConfig,
+    SyntheticRepository,
+    generate_records,
+    generate_stations,
+)
+
+
+def test_synthetic_data_is_deterministic_for_a_seed():
+    config = SyntheticConfig(stations=5, seed=7)
+
+    first = generate_records(config, generate_stations(config))
+    second = generate_records(config, generate_stations(config))
+    other = generate_records(config, generate_stations(SyntheticConfig(stations=5, seed=8)))
+
+    assert first == second
+    assert first != other
+    assert first[1]  # some rows arrive late
+
+
+def test_synthetic_repository_returns_rows_inside_the_range():
+    config = SyntheticConfig(stations=3, seed=1)
+    repo = SyntheticRepository.from_config(config)
+    start, end = month_range(2026, 1, day_start_hour=8)
+
+    records = repo.fetch_records(start, end, "1")
+    batches = repo.iter_record_batches(start, end, "1", batch_size=100)
+    batched = [row for batch in batches for row in batch]
+
+    assert records and all(start <= record["datatime"] < end for record in records)
+    assert len(batched) == len(records)
+
+
+def test_synthetic_station_probe_is_stable_across_processes():
+    code = (
+        "from benchmarks.synthetic import SyntheticConfig, SyntheticRepository;"
+        "print(SyntheticRepository.from_config(SyntheticConfig(stations=5)).probe_stations())"
+    )
+    probes = {
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).resolve().parents[1],
+            env={"PYTHONHASHSEED": seed},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for seed in ("1", "2")
+    }
+
+    assert len(probes) == 1
+
+
+def test_percentile_uses_nearest_rank():
+    samples = [float(value) for value in range(1, 101)]
+
+    assert percentile(samples, 0.5) == 50.0
+    assert percentile(samples, 0.95) == 95.0
+    assert percentile([3.0], 0.99) == 3.0
+
+
+def test_benchmark_run_covers_stages_and_endpoints():
+    results = run(
+        SyntheticConfig(stations=3), repeat=1, aggregations=["python"], engines=["python"]
+    )
+
+    names = [stage["name"] for stage in results["stages"]]
+    assert "build_monthly_report" in names
+    assert "GET /api/report/monthly [python/python, full]" in names
+    assert results["meta"]["rows"] > 0
+    assert all(stage["peak_memory_bytes"] >= 0 for stage in results["stages"])
+
+
+def test_latency_repository_holds_a_pool_connection_and_injects_failures():
+    config = SyntheticConfig(stations=3, seed=1)
+    start, end = month_range(2026, 1, day_start_hour=8)
+    slow = LatencyRepository.from_config(
+        config, DatabaseProfile(latency_ms=1, latency_sigma=0, pool_size=1)
+    )
+
+    batches = slow.iter_record_batches(start, end, "1", batch_size=100)
+    next(batches)
+    assert slow.pool.stats()["in_use"] == 1
+    batches.close()
+    assert slow.pool.stats()["in_use"] == 0
+
+    broken = LatencyRepository.from_config(config, DatabaseProfile(latency_ms=0, failure_rate=1))
+    with pytest.raises(SimulatedDatabaseError):
+        broken.fetch_stations()
+    assert broken.failed_queries == 1
+
+
+def test_load_run_reports_latency_and_errors_per_endpoint():
+    results = run_load(
+        SyntheticConfig(stations=5),
+        DatabaseProfile(latency_ms=1),
+        LoadConfig(users=3, duration=0.5, mix=parse_mix(["report=2,export", "config=1"])),
+    )
+
+    endpoints = {item["name"]: item for item in results["endpoints"]}
+    assert set(endpoints) == {"report", "export", "config", "all"}
+    assert endpoints["all"]["requests"] == sum(
+        endpoints[name]["requests"] for name in ("report", "export", "config")
+    )
+    assert endpoints["all"]["errors"] == 0
+    assert endpoints["report"]["latency_ms"]["p99"] >= endpoints["report"]["latency_ms"]["p50"]
+    assert results["workers"][0]["pool"]["checkouts"] >= 1
+    with pytest.raises(ValueError):
+        parse_mix(["reports=1"])
@@ -1,7 +1,25 @@
+import json
+import os
 from pathlib import Path
 
-from app.config_store import DEFAULT_RULES, load_rules_from_file, normalize_rules, save_rules_to_file
-from app.db import month_range
+import pytest
+
+from app.config_store import (
+    DEFAULT_RULES,
+    load_rules_from_file,
+    normalize_rules,
+    rules_version,
+    save_rules_to_file,
+)
+from app.db import (
+    SQLServerRepository,
+    merge_concurrently,
+    month_range,
+    partition_range,
+    prefetch,
+    summarize_showplan,
+)
+from app.pool import ConnectionPool
 
 
 def test_normalize_rules_includes_station_daily_expected_and_ctype_defaults():
@@ -42,8 +60,257 @@ def test_save_then_load_rules_roundtrip(tmp_path: Path):
     assert loaded == rules
 
 
+def test_loaded_rules_are_cached_until_the_file_changes(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"day_start_hour": 8})
+    version = rules_version(config_file)
+
+    first = load_rules_from_file(config_file)
+    assert load_rules_from_file(config_file) is first
+    assert rules_version(config_file) == version
+
+    stat = config_file.stat()
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert rules_version(config_file) == version  # touched, same content
+
+    config_file.write_text(json.dumps({"day_start_hour": 7}), encoding="utf-8")
+    assert load_rules_from_file(config_file)["day_start_hour"] == 7
+    assert rules_version(config_file) > version
+
+
+def test_save_rules_replaces_file_atomically_and_bumps_version(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    assert rules_version(config_file) == 0
+
+    save_rules_to_file(config_file, {"day_start_hour": 8})
+    first_version = rules_version(config_file)
+    save_rules_to_file(config_file, {"day_start_hour": 10})
+
+    assert rules_version(config_file) > first_version > 0
+    assert load_rules_from_file(config_file)["day_start_hour"] == 10
+    assert [path.name for path in tmp_path.iterdir()] == ["report_rules.json"]
+
+
+def test_save_rules_keeps_the_file_mode(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    umask = os.umask(0o022)
+    try:
+        save_rules_to_file(config_file, {"day_start_hour": 8})
+    finally:
+        os.umask(umask)
+    assert config_file.stat().st_mode & 0o777 == 0o644
+
+    config_file.chmod(0o640)
+    save_rules_to_file(config_file, {"day_start_hour": 10})
+    assert config_file.stat().st_mode & 0o777 == 0o640
+
+
 def test_month_range_for_december_cross_year():
     start, end = month_range(2026, 12, day_start_hour=9)
 
     assert str(start) == "2026-12-01 09:00:00"
     assert str(end) == "2027-01-01 09:00:00"
+
+
+def test_prefetch_yields_all_items_in_order():
+    assert list(prefetch(iter(range(10)), depth=2)) == list(range(10))
+
+
+def test_prefetch_propagates_producer_errors():
+    def batches():
+        yield [1]
+        raise RuntimeError("connection lost")
+
+    consumed = []
+    with pytest.raises(RuntimeError, match="connection lost"):
+        for batch in prefetch(batches()):
+            consumed.append(batch)
+
+    assert consumed == [[1]]
+
+
+def test_prefetch_closes_source_when_consumer_stops_early():
+    closed = []
+
+    def batches():
+        try:
+            for index in range(100):
+                yield [index]
+        finally:
+            closed.append(True)
+
+    iterator = prefetch(batches(), depth=1)
+    assert next(iterator) == [0]
+    iterator.close()
+
+    assert closed == [True]
+
+
+def test_partition_range_cuts_on_whole_days():
+    start, end = month_range(2026, 2, day_start_hour=8)
+
+    windows = partition_range(start, end, 4)
+
+    assert [(str(a), str(b)) for a, b in windows] == [
+        ("2026-02-01 08:00:00", "2026-02-08 08:00:00"),
+        ("2026-02-08 08:00:00", "2026-02-15 08:00:00"),
+        ("2026-02-15 08:00:00", "2026-02-22 08:00:00"),
+        ("2026-02-22 08:00:00", "2026-03-01 08:00:00"),
+    ]
+    assert partition_range(start, end, 1) == [(start, end)]
+    assert len(partition_range(start, end, 100)) == 28
+
+
+def test_merge_concurrently_yields_every_item_and_propagates_errors():
+    merged = merge_concurrently([iter(range(0, 50)), iter(range(50, 100)), iter(range(100, 120))])
+    assert sorted(merged) == list(range(120))
+
+    def failing():
+        yield 1
+        raise RuntimeError("partition failed")
+
+    with pytest.raises(RuntimeError, match="partition failed"):
+        list(merge_concurrently([iter(range(5)), failing()]))
+
+
+def test_merge_concurrently_closes_all_sources_when_consumer_stops_early():
+    closed = []
+
+    def source(name):
+        try:
+            while True:
+                yield name
+        finally:
+            closed.append(name)
+
+    iterator = merge_concurrently([source("a"), source("b")], depth=1)
+    assert next(iterator) in {"a", "b"}
+    iterator.close()
+
+    assert sorted(closed) == ["a", "b"]
+
+
+SHOWPLAN_XML = """<?xml version="1.0" encoding="utf-16"?>
+<ShowPlanXML xmlns="http://schemas.microsoft.com/sqlserver/2004/07/showplan" Version="1.6">
+  <BatchSequence><Batch><Statements>
+    <StmtSimple StatementText="SELECT stationid, datatime FROM dbo.OneDayData"
+                StatementEstRows="1234.5" StatementSubTreeCost="0.75">
+      <QueryPlan>
+        <RelOp PhysicalOp="Index Seek" LogicalOp="Index Seek" EstimateRows="1234.5">
+          <IndexScan Ordered="true">
+            <Object Database="[CSRRDB]" Schema="[dbo]" Table="[OneDayData]"
+                    Index="[IX_OneDayData_datatime]" />
+          </IndexScan>
+        </RelOp>
+      </QueryPlan>
+    </StmtSimple>
+  </Statements></Batch></BatchSequence>
+</ShowPlanXML>"""
+
+
+def test_summarize_showplan_reports_rows_and_index_seek():
+    summary = summarize_showplan(SHOWPLAN_XML.replace('encoding="utf-16"', ""))
+
+    assert summary["index_seek"] is True
+    assert summary["statements"][0]["estimated_rows"] == 1234.5
+    assert summary["operators"] == [
+        {
+            "physical_op": "Index Seek",
+            "logical_op": "Index Seek",
+            "estimated_rows": 1234.5,
+            "table": "OneDayData",
+            "index": "IX_OneDayData_datatime",
+        }
+    ]
+
+
+class RecordingCursor:
+    def __init__(self, log, rows_by_start):
+        self.log = log
+        self.rows_by_start = rows_by_start
+        self.arraysize = 1
+        self.showplan = False
+        self._rows = []
+
+    def execute(self, query, *params):
+        self.log.append((query, params))
+        if query.startswith("SET SHOWPLAN_XML"):
+            self.showplan = query.endswith("ON")
+        elif self.showplan:
+            self._rows = [(SHOWPLAN_XML.replace('encoding="utf-16"', ""),)]
+        else:
+            self._rows = list(self.rows_by_start.get(params[0], []))
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0)
+
+
+def _recording_repository(rows_by_start, **options):
+    log = []
+
+    class Connection:
+        def cursor(self):
+            return RecordingCursor(log, rows_by_start)
+
+        def commit(self):
+            pass
+
+        def close(self):
+            pass
+
+    pool = ConnectionPool(Connection, max_size=4, pre_ping=False)
+    return SQLServerRepository("DSN=test", pool=pool, **options), log
+
+
+def test_repository_uses_sargable_sourcetype_predicate_by_default():
+    repo, log = _recording_repository({})
+    start, end = month_range(2026, 1, day_start_hour=8)
+
+    assert list(repo.iter_record_batches(start, end, "1")) == []
+
+    query, params = log[0]
+    assert "Sourcetype = CAST(? AS VARCHAR(64))" in query
+    assert "LTRIM(RTRIM(Sourcetype))" not in query
+    assert params == (start, end, "1")
+
+    trim_repo, trim_log = _recording_repository({}, query_strategy="trim")
+    list(trim_repo.iter_record_batches(start, end, "1"))
+    assert "LTRIM(RTRIM(Sourcetype)) = ?" in trim_log[0][0]
+
+    with pytest.raises(ValueError):
+        SQLServerRepository("DSN=test", pool=repo.pool, query_strategy="like")
+
+
+def test_repository_scans_partitions_concurrently_and_merges_batches():
+    start, end = month_range(2026, 1, day_start_hour=8)
+    windows = partition_range(start, end, 3)
+    rows_by_start = {
+        window_start: [(f"S{index}", window_start) for _ in range(3)]
+        for index, (window_start, _) in enumerate(windows)
+    }
+    repo, log = _recording_repository(rows_by_start, partitions=3)
+
+    batches = list(repo.iter_record_batches(start, end, "1", batch_size=2))
+
+    assert sorted(row for batch in batches for row in batch) == sorted(
+        row for rows in rows_by_start.values() for row in rows
+    )
+    assert sorted(params[:2] for _, params in log) == windows
+
+
+def test_explain_record_query_summarizes_each_partition_plan():
+    start, end = month_range(2026, 1, day_start_hour=8)
+    repo, log = _recording_repository({}, partitions=2)
+
+    explained = repo.explain_record_query(start, end, "1")
+
+    assert explained["query_strategy"] == "sargable"
+    assert explained["partitions"] == 2
+    assert explained["index_seek"] is True
+    assert explained["estimated_rows"] == 2469.0
+    assert [query for query, _ in log][0] == "SET SHOWPLAN_XML ON"
+    assert [query for query, _ in log][-1] == "SET SHOWPLAN_XML OFF"
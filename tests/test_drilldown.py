@@ -0,0 +1,132 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.config_store import save_rules_to_file
+from app.drilldown import slot_minute_windows
+from app.main import create_app
+from app.report_cache import ReportCache
+from app.report_logic import slot_index
+
+
+class FakeRepo:
+    def __init__(self, delay=0.0):
+        self.calls: list[str] = []
+        self.delay = delay
+
+    def fetch_stations(self):
+        return [
+            {"station_id": "A001", "cname": "甲站", "ctype": "01"},
+            {"station_id": "B001", "cname": "乙站", "ctype": "99"},
+        ]
+
+    def fetch_records(self, start, end, sourcetype_filter):
+        self.calls.append("records")
+        return [
+            {"station_id": "A001", "datatime": datetime(2026, 1, 1, 9, 5)},
+            {"station_id": "A001", "datatime": datetime(2026, 1, 1, 9, 40)},
+            {"station_id": "A001", "datatime": datetime(2026, 1, 2, 8, 59)},
+            {"station_id": "B001", "datatime": datetime(2026, 1, 1, 9, 5)},
+            {"station_id": "B001", "datatime": datetime(2026, 1, 1, 9, 31)},
+        ]
+
+    def iter_record_batches(self, start, end, sourcetype_filter, batch_size=5000):
+        self.calls.append("batches")
+        time.sleep(self.delay)
+        records = self.fetch_records(start, end, sourcetype_filter)
+        yield [(record["station_id"], record["datatime"]) for record in records]
+
+
+def test_slot_windows_agree_with_slot_index():
+    for reports_per_day in (1, 7, 24, 48, 288, 1440):
+        windows = slot_minute_windows(reports_per_day)
+        assert len(windows) == reports_per_day
+        assert windows[0][0] == 0 and windows[-1][1] == 1440
+        for slot, (start, end) in enumerate(windows):
+            for minute in range(start, end):
+                data_time = datetime(2026, 1, 1, 9) + timedelta(minutes=minute)
+                assert slot_index(data_time, reports_per_day, 9) == slot
+
+
+def _client(tmp_path: Path, repo: FakeRepo, aggregation: str = "python") -> TestClient:
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24, "*": 48}, "day_start_hour": 9})
+    app = create_app(
+        config_path=config_file,
+        repository_factory=lambda: repo,
+        report_aggregation=aggregation,
+        report_cache=ReportCache(tmp_path / "reports.sqlite3"),
+    )
+    return TestClient(app)
+
+
+def test_drilldown_answers_from_the_report_aggregation(tmp_path: Path):
+    repo = FakeRepo()
+    client = _client(tmp_path, repo, "stream")
+    client.get("/api/report/monthly", params={"year": 2026, "month": 1}).raise_for_status()
+    calls = list(repo.calls)
+
+    params = {"station_id": "A001", "start": "2026-01-01", "end": "2026-01-02"}
+    response = client.get("/api/report/slots", params=params)
+
+    assert response.status_code == 200
+    assert repo.calls == calls
+    body = response.json()
+    assert body["expected_per_day"] == 24
+    first, second = body["days"]
+    assert [item["slot"] for item in first["present"]] == [0, 23]
+    assert first["present"][0] == {
+        "slot": 0,
+        "start": "2026-01-01T09:00:00",
+        "end": "2026-01-01T10:00:00",
+    }
+    assert first["present"][1]["end"] == "2026-01-02T09:00:00"
+    assert [item["slot"] for item in first["missing"]] == list(range(1, 23))
+    assert second["actual"] == 0 and len(second["missing"]) == 24
+    assert client.get("/api/report/slots/index").json()["hits"] == 1
+
+
+def test_drilldown_indexes_unloaded_month_once(tmp_path: Path):
+    repo = FakeRepo()
+    client = _client(tmp_path, repo)
+
+    params = {"station_id": "B001", "start": "2026-01-01"}
+    first = client.get("/api/report/slots", params=params).json()
+    second = client.get("/api/report/slots", params=params).json()
+
+    assert repo.calls == ["batches", "records"]
+    assert first == second
+    assert first["expected_per_day"] == 48
+    assert [item["slot"] for item in first["days"][0]["present"]] == [0, 1]
+
+    assert client.get("/api/report/slots", params={**params, "station_id": "X"}).status_code == 404
+    reversed_range = {**params, "end": "2025-12-31"}
+    assert client.get("/api/report/slots", params=reversed_range).status_code == 400
+
+
+def test_concurrent_requests_for_a_cold_month_share_one_scan(tmp_path: Path):
+    repo = FakeRepo(delay=0.2)
+    app = _client(tmp_path, repo).app
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *[
+                    client.get(
+                        "/api/report/slots", params={"station_id": station_id, "start": "2026-01-01"}
+                    )
+                    for station_id in ("A001", "B001", "A001", "B001")
+                ]
+            )
+
+    responses = asyncio.run(main())
+
+    assert [response.status_code for response in responses] == [200] * 4
+    assert repo.calls.count("batches") == 1
+    assert [response.json()["days"][0]["actual"] for response in responses] == [2, 2, 2, 2]
+    assert app.state.report_scheduler.stats()["coalesced"] == 3
@@ -0,0 +1,145 @@
+import csv
+import io
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from app.export import build_report_export, iter_report_export, parquet_available, stream_writer
+from app.main import create_app
+from app.report_cache import ReportCache
+
+
+def _report(station_count: int = 3) -> dict:
+    return {
+        "year": 2026,
+        "month": 2,
+        "day_start_hour": 8,
+        "days_in_month": 2,
+        "day_headers": [1, 2],
+        "rows": [
+            {
+                "station_id": f"A{index:03d}",
+                "station_name": f"甲站<{index}>&",
+                "ctype": "01",
+                "expected_per_day": 24,
+                "daily_actual": [index, 24],
+                "expected_total": 48,
+                "actual_total": index + 24,
+                "rate": round((index + 24) * 100 / 48, 2),
+            }
+            for index in range(station_count)
+        ],
+    }
+
+
+def test_xlsx_export_round_trips_through_openpyxl():
+    workbook = load_workbook(io.BytesIO(build_report_export(_report(), "xlsx")))
+    sheet = workbook.active
+
+    assert sheet.title == "月到报统计"
+    assert list(sheet.values) == [
+        ("站名", "1", "2", "应到报", "实到报", "到报率(%)"),
+        ("甲站<0>&", 0, 24, 48, 24, 50.0),
+        ("甲站<1>&", 1, 24, 48, 25, 52.08),
+        ("甲站<2>&", 2, 24, 48, 26, 54.17),
+    ]
+
+
+def test_xlsx_export_drops_characters_xml_does_not_allow():
+    report = _report(1)
+    report["rows"][0]["station_name"] = "甲\x01站\x0b\t"
+
+    sheet = load_workbook(io.BytesIO(build_report_export(report, "xlsx"))).active
+
+    assert list(sheet.values)[1][0] == "甲站\t"
+
+
+def test_xlsx_export_emits_chunks_before_the_whole_file_is_written():
+    chunks = list(iter_report_export(_report(5000), "xlsx", chunk_size=4096))
+
+    assert len(chunks) > 2
+    sheet = load_workbook(io.BytesIO(b"".join(chunks)), read_only=True).active
+    assert (sheet.max_row, sheet.max_column) == (5001, 6)
+
+
+def test_csv_export_has_bom_and_same_columns_as_excel():
+    content = build_report_export(_report(), "csv")
+
+    assert content.startswith(b"\xef\xbb\xbf")
+    rows = list(csv.reader(io.StringIO(content.decode("utf-8-sig"))))
+    assert rows[0] == ["站名", "1", "2", "应到报", "实到报", "到报率(%)"]
+    assert rows[2] == ["甲站<1>&", "1", "24", "48", "25", "52.08"]
+
+
+@pytest.mark.skipif(not parquet_available(), reason="pyarrow is not installed")
+def test_parquet_export_has_one_column_per_day():
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(io.BytesIO(build_report_export(_report(), "parquet")))
+
+    assert table.num_rows == 3
+    assert table.column("day_01").to_pylist() == [0, 1, 2]
+    assert table.column("station_id").to_pylist() == ["A000", "A001", "A002"]
+
+
+def test_unknown_export_format_is_rejected():
+    with pytest.raises(ValueError):
+        iter_report_export(_report(), "pdf")
+
+
+def test_stream_writer_propagates_errors_and_stops_when_closed_early():
+    def failing(sink):
+        sink.write(b"partial")
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError, match="disk full"):
+        list(stream_writer(failing, chunk_size=1))
+
+    written = []
+
+    def endless(sink):
+        while True:
+            sink.write(b"x" * 16)
+            written.append(1)
+
+    chunks = stream_writer(endless, chunk_size=16, depth=2)
+    assert next(chunks) == b"x" * 16
+    chunks.close()
+    # The producer thread was joined, so it stopped after a bounded number of writes.
+    assert len(written) < 10
+
+
+def test_export_endpoint_streams_requested_format(tmp_path: Path):
+    class FakeRepo:
+        def fetch_stations(self):
+            return [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+
+        def fetch_records(self, start, end, sourcetype_filter):
+            return [{"station_id": "A001", "datatime": datetime(2026, 1, 1, 10, 0)}]
+
+    app = create_app(
+        config_path=tmp_path / "report_rules.json",
+        repository_factory=FakeRepo,
+        report_cache=ReportCache(tmp_path / "reports.sqlite3"),
+    )
+    client = TestClient(app)
+
+    xlsx = client.get("/api/report/monthly/export", params={"year": 2026, "month": 1})
+    assert xlsx.status_code == 200
+    assert 'filename="monthly-report-2026-01.xlsx"' in xlsx.headers["content-disposition"]
+    assert list(load_workbook(io.BytesIO(xlsx.content)).active.values)[1][0] == "甲站"
+
+    response = client.get(
+        "/api/report/monthly/export", params={"year": 2026, "month": 1, "format": "csv"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.content.decode("utf-8-sig").splitlines()[1].startswith("甲站,")
+
+    rejected = client.get(
+        "/api/report/monthly/export", params={"year": 2026, "month": 1, "format": "pdf"}
+    )
+    assert rejected.status_code == 422
@@ -0,0 +1,153 @@
+import json
+import time
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from app.config_store import save_rules_to_file
+from app.federated import FederatedRepository, ReportSource, source_failures
+from app.main import _build_report
+from app.report_cache import ReportCache
+from app.settings import SETTINGS, report_source_settings
+
+
+class FakeRepo:
+    def __init__(self, station_ids, delay=0.0, error=None):
+        self.station_ids = station_ids
+        self.delay = delay
+        self.error = error
+
+    def _wait(self):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+
+    def fetch_stations(self):
+        return [
+            {"station_id": station_id, "cname": station_id, "ctype": "01"}
+            for station_id in self.station_ids
+        ]
+
+    def fetch_records(self, start, end, sourcetype_filter):
+        self._wait()
+        return [
+            {"station_id": station_id, "datatime": datetime(2026, 1, 1, 9, 5)}
+            for station_id in self.station_ids
+        ]
+
+    def iter_record_batches(self, start, end, sourcetype_filter, batch_size=5000):
+        self._wait()
+        yield [(station_id, datetime(2026, 1, 1, 9, 5)) for station_id in self.station_ids]
+
+    def fetch_slot_counts(self, start, end, sourcetype_filter, station_expected, day_start_hour):
+        self._wait()
+        return [
+            {"station_id": station_id, "day": 1, "actual": 1}
+            for station_id in station_expected
+            if station_id in self.station_ids
+        ]
+
+
+def _federation(slow=None, timeout=5.0):
+    return FederatedRepository(
+        [
+            ReportSource("east", FakeRepo(["A001", "A002"])),
+            ReportSource("west", slow or FakeRepo(["A001"]), prefix="W-"),
+        ],
+        timeout=timeout,
+    )
+
+
+def test_federation_tags_and_merges_sources():
+    repo = _federation()
+
+    stations = repo.fetch_stations()
+    assert [(item["station_id"], item["source"]) for item in stations] == [
+        ("A001", "east"),
+        ("A002", "east"),
+        ("W-A001", "west"),
+    ]
+    records = repo.fetch_records(None, None, "1")
+    assert sorted(record["station_id"] for record in records) == ["A001", "A002", "W-A001"]
+    batches = list(repo.iter_record_batches(None, None, "1"))
+    assert sorted(station_id for batch in batches for station_id, _ in batch) == [
+        "A001",
+        "A002",
+        "W-A001",
+    ]
+    counts = repo.fetch_slot_counts(None, None, "1", {"A001": 24, "W-A001": 24}, 9)
+    assert sorted(item["station_id"] for item in counts) == ["A001", "W-A001"]
+    assert repo.failed_sources() == {}
+
+
+def test_slow_source_gives_partial_report_that_is_not_cached(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24}, "day_start_hour": 9})
+    cache = ReportCache(tmp_path / "reports.sqlite3")
+    repo = _federation(slow=FakeRepo(["A001"], delay=1.0), timeout=0.2)
+
+    report = _build_report(repo, config_file, 2026, 1, "stream", cache=cache)
+
+    assert report["partial"] is True
+    assert [item["ok"] for item in report["sources"]] == [True, False]
+    assert "timed out" in report["sources"][1]["error"]
+    assert [row["actual_total"] for row in report["rows"]] == [1, 1, 0]
+    assert cache.stats()["entries"] == 0
+
+    complete = _build_report(_federation(), config_file, 2026, 1, "python", cache=cache)
+    assert complete["partial"] is False
+    assert cache.stats()["entries"] == 1
+
+
+def test_steady_source_is_not_cut_off_by_the_timeout():
+    class SteadyRepo(FakeRepo):
+        def iter_record_batches(self, start, end, sourcetype_filter, batch_size=5000):
+            for minute in range(6):
+                time.sleep(0.1)
+                yield [("A001", datetime(2026, 1, 1, 9, minute))]
+
+    repo = _federation(slow=SteadyRepo(["A001"]), timeout=0.3)
+
+    batches = list(repo.iter_record_batches(None, None, "1"))
+
+    assert sum(1 for batch in batches for station_id, _ in batch if station_id == "W-A001") == 6
+    assert repo.failed_sources() == {}
+
+
+def test_failed_source_is_skipped_unless_all_fail():
+    repo = _federation(slow=FakeRepo(["A001"], error=RuntimeError("login failed")))
+    assert len(repo.fetch_records(None, None, "1")) == 2
+    assert repo.failed_sources() == {"west": "RuntimeError: login failed"}
+
+    broken = FederatedRepository(
+        [ReportSource("east", FakeRepo(["A001"], error=RuntimeError("down")))]
+    )
+    with pytest.raises(RuntimeError):
+        list(broken.iter_record_batches(None, None, "1"))
+
+
+def test_only_partial_result_repositories_report_source_failures():
+    class CountingRepo(FakeRepo):
+        failures = 3
+
+    assert source_failures(CountingRepo(["A001"])) == {}
+    repo = _federation(slow=FakeRepo(["A001"], error=RuntimeError("login failed")))
+    list(repo.iter_record_batches(None, None, "1"))
+    assert source_failures(repo) == {"west": "RuntimeError: login failed"}
+
+
+def test_report_sources_from_settings():
+    settings = replace(
+        SETTINGS,
+        db_sources=json.dumps(
+            [{"name": "east", "host": "10.0.0.1"}, {"name": "west", "port": 1444, "prefix": "W-"}]
+        ),
+    )
+    sources = report_source_settings(settings)
+
+    assert [(name, prefix) for name, prefix, _ in sources] == [("east", ""), ("west", "W-")]
+    assert sources[0][2].db_host == "10.0.0.1" and sources[0][2].db_port == SETTINGS.db_port
+    assert sources[1][2].db_port == "1444" and sources[1][2].db_name == SETTINGS.db_name
+    assert report_source_settings(replace(SETTINGS, db_sources="")) == []
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from app.incremental import IncrementalReportStore
+from app.report_logic import build_monthly_report, compile_rules
+
+STATIONS = [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+
+
+class FakeRepo:
+    def __init__(self, records):
+        self.records = records
+        self.queries: list[tuple[datetime, datetime]] = []
+
+    def fetch_records(self, start, end, sourcetype_filter):
+        self.queries.append((start, end))
+        return [record for record in self.records if start <= record["datatime"] < end]
+
+
+def _record(*args):
+    return {"station_id": "A001", "datatime": datetime(*args)}
+
+
+def test_incremental_refresh_reads_only_after_watermark():
+    rules = compile_rules({"ctype_defaults": {"01": 24}, "day_start_hour": 9})
+    repo = FakeRepo([_record(2026, 3, 1, 9, 5), _record(2026, 3, 2, 12, 0)])
+    store = IncrementalReportStore(overlap_minutes=10)
+
+    store.refresh(repo, STATIONS, rules, "1", 2026, 3)
+    repo.records += [_record(2026, 3, 2, 11, 55), _record(2026, 3, 2, 13, 0)]
+    report = store.refresh(repo, STATIONS, rules, "1", 2026, 3)
+
+    assert repo.queries[0][0] == datetime(2026, 3, 1, 9, 0)
+    assert repo.queries[1][0] == datetime(2026, 3, 2, 11, 50)
+    assert report == build_monthly_report(STATIONS, repo.records, 2026, 3, rules)
+    assert report["rows"][0]["actual_total"] == 4
+
+
+def test_incremental_refresh_rebuilds_on_rules_change_or_demand():
+    repo = FakeRepo([_record(2026, 3, 2, 12, 0)])
+    store = IncrementalReportStore(overlap_minutes=10)
+    rules = compile_rules({"ctype_defaults": {"01": 24}, "day_start_hour": 9})
+
+    store.refresh(repo, STATIONS, rules, "1", 2026, 3)
+    repo.records.append(_record(2026, 3, 1, 10, 0))
+    missed = store.refresh(repo, STATIONS, rules, "1", 2026, 3)
+    rebuilt = store.refresh(repo, STATIONS, rules, "1", 2026, 3, full=True)
+
+    assert missed["rows"][0]["actual_total"] == 1
+    assert rebuilt["rows"][0]["actual_total"] == 2
+
+    changed = compile_rules({"ctype_defaults": {"01": 48}, "day_start_hour": 9})
+    report = store.refresh(repo, STATIONS, changed, "1", 2026, 3)
+
+    assert repo.queries[-1][0] == datetime(2026, 3, 1, 9, 0)
+    assert report["rows"][0]["expected_per_day"] == 48
+    assert store.stats()[0]["watermark"] == "2026-03-02T12:00:00"
+
+
+def test_future_dated_row_does_not_skip_later_arrivals():
+    rules = compile_rules({"ctype_defaults": {"01": 24}, "day_start_hour": 9})
+    # A station with a skewed clock reports a row two days ahead.
+    repo = FakeRepo([_record(2026, 3, 2, 10, 0), _record(2026, 3, 4, 10, 0)])
+    now = [datetime(2026, 3, 2, 10, 30)]
+    store = IncrementalReportStore(overlap_minutes=10, now=lambda: now[0])
+    indexed = []
+
+    store.refresh(repo, STATIONS, rules, "1", 2026, 3, slot_sink=indexed.append)
+    repo.records.append(_record(2026, 3, 2, 11, 0))
+    now[0] = datetime(2026, 3, 2, 11, 30)
+    report = store.refresh(repo, STATIONS, rules, "1", 2026, 3, slot_sink=indexed.append)
+
+    assert repo.queries[1][0] == datetime(2026, 3, 2, 10, 20)
+    assert report["rows"][0]["actual_total"] == 3
+    assert store.stats()[0]["watermark"] == "2026-03-02T11:30:00"
+    assert indexed[0] is not indexed[1]
+    assert [item.slots.count("A001", 2) for item in indexed] == [1, 2]
@@ -0,0 +1,96 @@
+import asyncio
+import json
+from datetime import datetime
+
+from app.live import LiveArrivalMonitor, live_events
+from app.report_logic import compile_rules
+
+STATIONS = [
+    {"station_id": "A001", "cname": "甲站", "ctype": "01"},
+    {"station_id": "B001", "cname": "乙站", "ctype": "ZZ"},
+]
+RULES = compile_rules({"ctype_defaults": {"01": 24, "ZZ": 48}, "day_start_hour": 8})
+
+
+class FakeRepo:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries: list[tuple[datetime, datetime]] = []
+
+    def iter_record_batches(self, start, end, sourcetype_filter, batch_size=5000):
+        self.queries.append((start, end))
+        yield [row for row in self.rows if start <= row[1] < end]
+
+
+def _monitor(repo, now):
+    return LiveArrivalMonitor(
+        lambda: (repo, STATIONS, RULES, "1"), poll_seconds=60, overlap_minutes=10, now=lambda: now
+    )
+
+
+def test_poll_reads_after_watermark_and_reports_new_slots_only():
+    repo = FakeRepo([("A001", datetime(2026, 3, 2, 8, 25)), ("A001", datetime(2026, 3, 2, 7, 59))])
+    monitor = _monitor(repo, datetime(2026, 3, 2, 11, 0))
+
+    assert monitor.poll_once() == 1
+    repo.rows += [("A001", datetime(2026, 3, 2, 8, 30)), ("B001", datetime(2026, 3, 2, 10, 45))]
+    assert monitor.poll_once() == 1
+
+    assert repo.queries[0] == (datetime(2026, 3, 2, 8), datetime(2026, 3, 3, 8))
+    assert repo.queries[1][0] == datetime(2026, 3, 2, 8, 15)
+    snapshot = monitor.snapshot()
+    assert snapshot["hydro_day"] == "2026-03-02"
+    assert [item["present"] for item in snapshot["stations"]] == [[0], [5]]
+    assert monitor.stats()["watermark"] == "2026-03-02T10:45:00"
+
+
+def test_stream_sends_snapshot_then_arrivals_from_shared_poller():
+    repo = FakeRepo([("A001", datetime(2026, 3, 2, 8, 5))])
+    monitor = _monitor(repo, datetime(2026, 3, 2, 11, 0))
+
+    def parse(chunk):
+        lines = chunk.decode("utf-8").strip().split("\n")
+        return lines[0].removeprefix("event: "), json.loads(lines[1].removeprefix("data: "))
+
+    async def run():
+        first = live_events(monitor, heartbeat_seconds=0.05)
+        second = live_events(monitor, heartbeat_seconds=0.05)
+        assert await anext(first) == b"retry: 5000\n\n"
+        event, snapshot = parse(await asyncio.wait_for(anext(first), 2))
+        assert event == "snapshot" and snapshot["stations"][0]["present"] == [0]
+
+        await anext(second)
+        assert parse(await anext(second))[0] == "snapshot"
+        assert monitor.stats()["subscribers"] == 2
+
+        repo.rows.append(("B001", datetime(2026, 3, 2, 9, 0)))
+        monitor.poll_once()
+        for stream in (first, second):
+            event, data = parse(await asyncio.wait_for(anext(stream), 2))
+            assert event == "arrivals" and data["arrivals"] == [["B001", 2]]
+        assert await anext(first) == b": keep-alive\n\n"
+
+        await first.aclose()
+        await second.aclose()
+
+    asyncio.run(run())
+    assert len(repo.queries) == 2
+    assert monitor.stats()["subscribers"] == 0
+    monitor.stop()
+    assert monitor.stats()["running"] is False
+
+
+def test_future_dated_row_does_not_move_watermark_past_now():
+    repo = FakeRepo([("A001", datetime(2026, 3, 2, 20, 0))])
+    now = [datetime(2026, 3, 2, 9, 0)]
+    monitor = LiveArrivalMonitor(
+        lambda: (repo, STATIONS, RULES, "1"), poll_seconds=60, overlap_minutes=10, now=lambda: now[0]
+    )
+
+    assert monitor.poll_once() == 1
+    repo.rows.append(("A001", datetime(2026, 3, 2, 9, 30)))
+    now[0] = datetime(2026, 3, 2, 10, 0)
+    assert monitor.poll_once() == 1
+
+    assert repo.queries[1][0] == datetime(2026, 3, 2, 8, 50)
+    assert monitor.stats()["watermark"] == "2026-03-02T10:00:00"
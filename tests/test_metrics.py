@@ -0,0 +1,93 @@
+from datetime import datetime
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.db import prefetch
+from app.main import create_app
+from app.metrics import (
+    Histogram,
+    collect_stages,
+    configure_metrics,
+    record_stage,
+    stage,
+)
+from app.report_cache import ReportCache
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, "fetch")
+
+    lines = histogram.render()
+
+    assert 'demo_seconds_bucket{stage="fetch",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="fetch",le="1.0"} 3' in lines
+    assert 'demo_seconds_bucket{stage="fetch",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{stage="fetch"} 4' in lines
+    assert 'demo_seconds_sum{stage="fetch"} 4.25' in lines
+
+
+def test_collect_stages_merges_repeated_stages_and_sees_worker_threads():
+    def batches():
+        record_stage("fetch_records", 0.002, 10)
+        yield [1]
+        record_stage("fetch_records", 0.003, 5)
+        yield [2]
+
+    with collect_stages() as timer:
+        with stage("aggregate") as timing:
+            timing.rows = sum(len(batch) for batch in prefetch(batches()))
+
+    summary = {item["stage"]: item for item in timer.summary()}
+    assert summary["fetch_records"]["count"] == 2
+    assert summary["fetch_records"]["rows"] == 15
+    assert summary["aggregate"]["rows"] == 2
+    header = timer.server_timing({"queue": 0.001})
+    assert 'fetch_records;dur=5.0;desc="n=2 rows=15"' in header
+    assert header.endswith("queue;dur=1.0")
+
+
+def test_disabled_metrics_record_nothing():
+    configure_metrics(False)
+    try:
+        with collect_stages() as timer:
+            with stage("aggregate") as timing:
+                timing.rows = 3
+            record_stage("fetch_records", 1.0, 1)
+    finally:
+        configure_metrics(True)
+
+    assert timer.summary() == []
+
+
+def test_report_endpoint_sets_server_timing_and_metrics_exposes_histograms(tmp_path: Path):
+    class FakeRepo:
+        def fetch_stations(self):
+            return [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+
+        def fetch_records(self, start, end, sourcetype_filter):
+            return [{"station_id": "A001", "datatime": datetime(2026, 1, 1, 10, 0)}]
+
+    app = create_app(
+        config_path=tmp_path / "report_rules.json",
+        repository_factory=FakeRepo,
+        report_cache=ReportCache(tmp_path / "reports.sqlite3"),
+    )
+    client = TestClient(app)
+
+    response = client.get("/api/report/monthly", params={"year": 2026, "month": 1})
+
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    for name in ("rules", "aggregate", "assemble", "queue", "serialize"):
+        assert f"{name};dur=" in timing
+
+    metrics = client.get("/metrics")
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'hydro_report_stage_duration_seconds_count{stage="aggregate"}' in metrics.text
+    assert (
+        'hydro_http_request_duration_seconds_count{method="GET",route="/api/report/monthly",status="200"}'
+        in metrics.text
+    )
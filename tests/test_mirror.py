@@ -0,0 +1,150 @@
+from datetime import datetime
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.config_store import save_rules_to_file
+from app.main import _build_report, create_app
+from app.mirror import MirrorRepository, RecordMirror, slot_counts_from_batches
+from app.report_cache import ReportCache
+from benchmarks.synthetic import SyntheticConfig, SyntheticRepository
+
+
+class CountingRepo(SyntheticRepository):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.windows: list[tuple[datetime, datetime]] = []
+
+    def iter_record_batches(self, start, end, sourcetype_filter, batch_size=5000):
+        self.windows.append((start, end))
+        yield from super().iter_record_batches(start, end, sourcetype_filter, batch_size)
+
+    def fetch_records(self, start, end, sourcetype_filter):
+        self.windows.append((start, end))
+        return super().fetch_records(start, end, sourcetype_filter)
+
+    def fetch_slot_counts(self, start, end, *args):
+        self.windows.append((start, end))
+        return super().fetch_slot_counts(start, end, *args)
+
+
+def _synthetic_repo() -> CountingRepo:
+    return CountingRepo.from_config(SyntheticConfig(stations=12, year=2026, month=1, seed=7))
+
+
+def test_sync_mirrors_incrementally_with_resync_window(tmp_path: Path):
+    live = _synthetic_repo()
+    mirror = RecordMirror(tmp_path / "mirror.sqlite3", resync_days=2, chunk_days=10)
+
+    first = mirror.sync(live, "1", since=datetime(2026, 1, 1), until=datetime(2026, 1, 20, 12))
+    assert first["start"] == "2026-01-01T00:00:00"
+    assert len(live.windows) == 2
+    assert mirror.coverage("1") == (datetime(2026, 1, 1), datetime(2026, 1, 20, 12))
+
+    live.windows.clear()
+    mirror.sync(live, "1", until=datetime(2026, 2, 3))
+    assert live.windows[0][0] == datetime(2026, 1, 18)
+
+    expected = live.fetch_records(datetime(2026, 1, 1), datetime(2026, 2, 3), "1")
+    mirrored = [
+        row
+        for batch in mirror.iter_record_batches(datetime(2026, 1, 1), datetime(2026, 2, 3), "1")
+        for row in batch
+    ]
+    assert sorted(mirrored) == sorted(
+        (record["station_id"], record["datatime"]) for record in expected
+    )
+    assert mirror.fetch_stations() == sorted(live.fetch_stations(), key=lambda s: s["station_id"])
+    assert mirror.stats()["sources"][0]["rows"] == len(expected)
+
+
+def test_mirror_repository_reads_only_the_tail_from_the_live_database(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(
+        config_file,
+        {"ctype_defaults": {"01": 24, "ZZ": 48, "RR": 12, "PP": 288, "*": 24}, "day_start_hour": 8},
+    )
+    live = _synthetic_repo()
+    mirror = RecordMirror(tmp_path / "mirror.sqlite3")
+    mirror.sync(live, "1", since=datetime(2025, 12, 1), until=datetime(2026, 1, 20, 10, 30))
+
+    for aggregation in ("python", "stream", "sql"):
+        expected = _build_report(live, config_file, 2026, 1, aggregation)
+        live.windows.clear()
+        report = _build_report(MirrorRepository(mirror, live), config_file, 2026, 1, aggregation)
+
+        assert report == expected
+        assert len(live.windows) == 1
+        tail_start = live.windows[0][0]
+        assert live.windows[0][1] == datetime(2026, 2, 1, 8)
+        if aggregation == "sql":
+            assert tail_start == datetime(2026, 1, 20, 8)
+        else:
+            assert tail_start == datetime(2026, 1, 20, 10, 30)
+
+
+def test_offline_mirror_repository_serves_stations_and_records(tmp_path: Path):
+    live = _synthetic_repo()
+    mirror = RecordMirror(tmp_path / "mirror.sqlite3")
+    mirror.sync(live, "1", since=datetime(2026, 1, 1), until=datetime(2026, 2, 2))
+
+    offline = MirrorRepository(mirror)
+    start, end = datetime(2026, 1, 1, 8), datetime(2026, 2, 1, 8)
+    assert offline.fetch_stations() == mirror.fetch_stations()
+    assert len(offline.fetch_records(start, end, "1")) == len(live.fetch_records(start, end, "1"))
+    assert offline.fetch_records(start, end, "2") == []
+
+    expected = {station["station_id"]: 24 for station in live.stations}
+    counts = offline.fetch_slot_counts(start, end, "1", expected, 8)
+    assert sorted(counts, key=lambda c: (c["station_id"], c["day"])) == sorted(
+        live.fetch_slot_counts(start, end, "1", expected, 8),
+        key=lambda c: (c["station_id"], c["day"]),
+    )
+
+
+def test_slot_counts_from_batches_matches_synthetic_repository():
+    live = _synthetic_repo()
+    start, end = datetime(2026, 1, 1, 8), datetime(2026, 2, 1, 8)
+    expected = {station["station_id"]: 48 for station in live.stations}
+
+    counts = slot_counts_from_batches(live.iter_record_batches(start, end, "1"), expected, 8)
+
+    key = lambda c: (c["station_id"], c["day"])  # noqa: E731
+    assert sorted(counts, key=key) == sorted(
+        live.fetch_slot_counts(start, end, "1", expected, 8), key=key
+    )
+
+
+def test_mirror_endpoints(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"day_start_hour": 8})
+    live = _synthetic_repo()
+    mirror = RecordMirror(tmp_path / "mirror.sqlite3", now=lambda: datetime(2026, 1, 10))
+    cache = ReportCache(tmp_path / "reports.sqlite3")
+    for year, month in ((2025, 6), (2025, 12), (2026, 1)):
+        report = {"year": year, "month": month, "day_start_hour": 8, "rows": []}
+        cache.put(f"{year}-{month}", report, "1", "rules", "stations")
+    client = TestClient(
+        create_app(
+            config_path=config_file,
+            repository_factory=lambda: live,
+            report_cache=cache,
+            record_mirror=mirror,
+        )
+    )
+
+    assert client.get("/api/mirror").json()["sources"] == []
+    synced = client.post("/api/mirror/sync", params={"since": "2026-01-01"}).json()
+    assert synced["start"] == "2026-01-01T00:00:00"
+    # Reports of the resynced months (the hydro month before included) are dropped.
+    assert cache.get("2025-6") is not None
+    assert cache.get("2025-12") is None and cache.get("2026-1") is None
+    assert client.get("/api/mirror").json()["sources"][0]["synced_until"] == "2026-01-10T00:00:00"
+
+    response = client.get("/api/report/monthly", params={"year": 2026, "month": 1})
+    assert response.status_code == 200
+    assert live.windows[-1][0] == datetime(2026, 1, 10)
+
+    plain = TestClient(create_app(config_path=config_file, repository_factory=lambda: live))
+    assert plain.get("/api/mirror").json() == {"enabled": False}
+    assert plain.post("/api/mirror/sync").status_code == 404
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from app.pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if not self.conn.alive:
+            raise RuntimeError("connection lost")
+
+    def fetchall(self):
+        return [(1,)]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_connections():
+    created: list[FakeConnection] = []
+
+    def connect():
+        created.append(FakeConnection())
+        return created[-1]
+
+    pool = ConnectionPool(connect, max_size=2)
+    for _ in range(5):
+        with pool.connection():
+            pass
+
+    stats = pool.stats()
+    assert len(created) == 1
+    assert stats["checkouts"] == 5
+    assert stats["idle"] == 1
+    assert stats["in_use"] == 0
+
+
+def test_pool_checkout_times_out_when_exhausted():
+    pool = ConnectionPool(FakeConnection, max_size=1, checkout_timeout=0.05)
+    held = pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    pool.release(held)
+    assert pool.stats()["timeouts"] == 1
+    assert pool.acquire() is held
+
+
+def test_pool_waiter_gets_released_connection():
+    pool = ConnectionPool(FakeConnection, max_size=1, checkout_timeout=2.0)
+    held = pool.acquire()
+    result: list[FakeConnection] = []
+
+    waiter = threading.Thread(target=lambda: result.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    pool.release(held)
+    waiter.join(timeout=2.0)
+
+    assert result == [held]
+    assert pool.stats()["wait_count"] == 1
+
+
+def test_pool_pre_ping_replaces_dead_connection():
+    pool = ConnectionPool(FakeConnection, max_size=1)
+    first = pool.acquire()
+    pool.release(first)
+    first.alive = False
+
+    second = pool.acquire()
+
+    assert second is not first
+    assert first.closed
+    assert pool.stats()["discarded"] == 1
+
+
+def test_pool_evicts_idle_connections_and_discards_on_error():
+    pool = ConnectionPool(FakeConnection, max_size=2, idle_timeout=0.01)
+    first = pool.acquire()
+    pool.release(first)
+    time.sleep(0.03)
+
+    second = pool.acquire()
+    assert second is not first
+    assert first.closed
+
+    pool.release(second)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("boom")
+
+    assert pool.stats()["size"] == 0
@@ -0,0 +1,83 @@
+from datetime import datetime
+from pathlib import Path
+
+from app.config_store import save_rules_to_file
+from app.main import _build_report
+from app.report_cache import ReportCache, report_cache_key
+
+
+def _report(year: int, month: int) -> dict:
+    return {
+        "year": year,
+        "month": month,
+        "day_start_hour": 9,
+        "rows": [{"station_id": "A001", "station_name": "甲站"}],
+    }
+
+
+def test_report_cache_roundtrip_and_invalidate(tmp_path: Path):
+    cache = ReportCache(tmp_path / "reports.sqlite3")
+    key = report_cache_key(2026, 1, "1", 9, "rules", "stations")
+
+    assert cache.get(key) is None
+    cache.put(key, _report(2026, 1), "1", "rules", "stations")
+    cache.put(report_cache_key(2026, 2, "1", 9, "rules", "stations"), _report(2026, 2), "1", "rules", "stations")
+
+    assert cache.get(key) == _report(2026, 1)
+    assert cache.invalidate(year=2026, month=1) == 1
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_report_cache_evicts_least_recently_used(tmp_path: Path):
+    probe = ReportCache(tmp_path / "probe.sqlite3")
+    probe.put("probe", _report(2026, 1), "1", "rules", "stations")
+    entry_size = probe.stats()["bytes"]
+
+    cache = ReportCache(tmp_path / "reports.sqlite3", max_bytes=entry_size * 2 + entry_size // 2)
+    keys = [report_cache_key(2026, month, "1", 9, "rules", "stations") for month in (1, 2, 3)]
+
+    cache.put(keys[0], _report(2026, 1), "1", "rules", "stations")
+    cache.put(keys[1], _report(2026, 2), "1", "rules", "stations")
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], _report(2026, 3), "1", "rules", "stations")
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+def test_report_cache_settle_period():
+    cache = ReportCache(Path("unused.sqlite3"), settle_hours=24, now=lambda: datetime(2026, 2, 2, 8, 0))
+
+    assert cache.is_month_closed(2025, 12, 9)
+    assert not cache.is_month_closed(2026, 1, 9)
+    assert not cache.is_month_closed(2026, 2, 9)
+
+
+def test_build_report_serves_closed_month_from_cache(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"*": 24}, "day_start_hour": 9})
+    cache = ReportCache(tmp_path / "reports.sqlite3", now=lambda: datetime(2026, 6, 1))
+
+    class FakeRepo:
+        record_fetches = 0
+
+        def fetch_stations(self):
+            return [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+
+        def fetch_records(self, start, end, sourcetype_filter):
+            FakeRepo.record_fetches += 1
+            return [{"station_id": "A001", "datatime": datetime(2026, 1, 3, 10, 0)}]
+
+    first = _build_report(FakeRepo(), config_file, 2026, 1, cache=cache)
+    second = _build_report(FakeRepo(), config_file, 2026, 1, cache=cache)
+
+    assert second == first
+    assert FakeRepo.record_fetches == 1
+
+    save_rules_to_file(config_file, {"ctype_defaults": {"*": 48}, "day_start_hour": 9})
+    third = _build_report(FakeRepo(), config_file, 2026, 1, cache=cache)
+
+    assert FakeRepo.record_fetches == 2
+    assert third["rows"][0]["expected_per_day"] == 48
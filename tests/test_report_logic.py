@@ -1,6 +1,14 @@
 from datetime import datetime
 
-from app.report_logic import build_monthly_report, resolve_daily_expected, slot_index
+from app.report_logic import (
+    build_monthly_report,
+    build_monthly_report_from_batches,
+    build_monthly_report_from_counts,
+    compile_rules,
+    minute_slot_table,
+    resolve_daily_expected,
+    slot_index,
+)
 
 
 def test_resolve_daily_expected_ctype_then_override():
@@ -74,3 +82,98 @@ def test_report_uses_station_daily_expected():
     row = report["rows"][0]
     assert row["expected_per_day"] == 48
     assert row["expected_total"] == 48 * 28
+
+
+def test_slot_index_exact_for_rates_not_dividing_a_day():
+    assert slot_index(datetime(2026, 3, 1, 12, 0), 14) == 7
+    assert slot_index(datetime(2026, 3, 1, 4, 48), 25) == 5
+    assert slot_index(datetime(2026, 3, 1, 23, 59), 25) == 24
+
+
+def test_report_from_counts_matches_row_level_report():
+    stations = [
+        {"station_id": "A001", "cname": "甲站", "ctype": "01"},
+        {"station_id": "B001 ", "cname": "乙站", "ctype": "99"},
+    ]
+    rules = {
+        "ctype_defaults": {"01": 24, "*": 48},
+        "station_daily_expected": {},
+        "day_start_hour": 9,
+    }
+    records = [
+        {"station_id": "A001", "datatime": datetime(2026, 1, 1, 9, 5)},
+        {"station_id": "A001", "datatime": datetime(2026, 1, 1, 9, 55)},
+        {"station_id": "A001", "datatime": datetime(2026, 1, 2, 8, 30)},
+        {"station_id": "B001", "datatime": datetime(2026, 1, 1, 9, 5)},
+        {"station_id": "B001", "datatime": datetime(2026, 1, 1, 9, 35)},
+        {"station_id": "B001", "datatime": datetime(2026, 1, 31, 23, 0)},
+        {"station_id": "C001", "datatime": datetime(2026, 1, 3, 9, 0)},
+    ]
+    slot_counts = [
+        {"station_id": "A001", "day": 1, "actual": 2},
+        {"station_id": "B001", "day": 1, "actual": 2},
+        {"station_id": "B001", "day": 31, "actual": 1},
+    ]
+
+    from_records = build_monthly_report(stations, records, 2026, 1, rules)
+    from_counts = build_monthly_report_from_counts(stations, slot_counts, 2026, 1, rules)
+
+    assert from_counts == from_records
+
+
+def test_report_from_batches_matches_row_level_report():
+    stations = [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+    rules = {"ctype_defaults": {"01": 24}, "day_start_hour": 9}
+    rows = [
+        ("A001", datetime(2026, 1, 1, 8, 59)),
+        ("A001", datetime(2026, 1, 1, 9, 0)),
+        ("A001", datetime(2026, 1, 1, 9, 30)),
+        ("A001", datetime(2026, 1, 15, 20, 10)),
+        ("Z999", datetime(2026, 1, 15, 20, 10)),
+        ("A001", None),
+    ]
+    records = [{"station_id": station_id, "datatime": value} for station_id, value in rows]
+
+    from_batches = build_monthly_report_from_batches(
+        stations, [rows[:2], rows[2:4], rows[4:]], 2026, 1, rules
+    )
+
+    assert from_batches == build_monthly_report(stations, records, 2026, 1, rules)
+    assert from_batches["rows"][0]["actual_total"] == 2
+
+
+def test_compiled_rules_follow_resolve_precedence():
+    rules = {
+        "default_daily_expected": 12,
+        "ctype_daily_expected": {"RR": 6},
+        "ctype_defaults": {"01": 24},
+        "station_daily_expected": {"A001": 48},
+        "station_overrides": {"A001": 96, "B001": 72},
+    }
+    compiled = compile_rules(rules)
+
+    for station_id, ctype in [("A001", "01"), ("B001", "RR"), ("C001", "01"), ("D001", "RR"), ("E001", "XX")]:
+        assert compiled.expected_for(station_id, ctype) == resolve_daily_expected(station_id, ctype, rules)
+    assert compiled.expected_for("A001", "01") == 48
+    assert compiled.expected_for("D001", "RR") == 6
+    assert compiled.expected_for("E001", "XX") == 12
+
+
+def test_compiled_rules_are_cached_by_content():
+    rules = {"ctype_defaults": {"01": 24}, "station_daily_expected": {"A001": 48}}
+
+    first = compile_rules(rules)
+    assert compile_rules(dict(rules)) is first
+    assert compile_rules(first) is first
+
+    changed = compile_rules({**rules, "station_daily_expected": {"A001": 24}})
+    assert changed is not first
+    assert changed.expected_for("A001", "01") == 24
+
+
+def test_minute_slot_table_matches_slot_index():
+    for reports_per_day in (1, 14, 24, 25, 48, 288):
+        table = minute_slot_table(reports_per_day)
+        for minute_of_day in range(0, 1440, 7):
+            data_time = datetime(2026, 3, 1, minute_of_day // 60, minute_of_day % 60)
+            assert table[minute_of_day] == slot_index(data_time, reports_per_day)
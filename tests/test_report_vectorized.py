@@ -0,0 +1,77 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import report_vectorized
+from app.report_logic import build_monthly_report
+from app.report_vectorized import ColumnarRecords, build_monthly_report_columnar
+
+
+def _sample(seed: int):
+    rng = random.Random(seed)
+    stations = [
+        {"station_id": f"S{index:03d}", "cname": f"站{index}", "ctype": rng.choice(["01", "99", "ZZ"])}
+        for index in range(12)
+    ]
+    stations.append({"station_id": "S000", "cname": "重复站", "ctype": "01"})
+    rules = {
+        "ctype_defaults": {"01": 24, "*": 48},
+        "station_daily_expected": {"S001": 14, "S002": 25, "S003": 288},
+        "day_start_hour": 9,
+    }
+    base = datetime(2026, 2, 1, 0, 0)
+    records = []
+    for _ in range(3000):
+        records.append(
+            {
+                "station_id": rng.choice([station["station_id"] for station in stations] + ["X999"]),
+                "datatime": base + timedelta(minutes=rng.randrange(-2000, 42000), seconds=rng.randrange(60)),
+            }
+        )
+    records.append({"station_id": "S004", "datatime": None})
+    return stations, records, rules
+
+
+def test_numpy_engine_matches_python_engine():
+    pytest.importorskip("numpy")
+    for seed in range(3):
+        stations, records, rules = _sample(seed)
+        columns = report_vectorized.columnar_from_records(records)
+
+        assert build_monthly_report_columnar(stations, columns, 2026, 2, rules) == (
+            build_monthly_report(stations, records, 2026, 2, rules)
+        )
+
+
+def test_numpy_engine_batches_intern_station_ids():
+    pytest.importorskip("numpy")
+    batches = [
+        [("A001", datetime(2026, 2, 1, 9, 0)), ("B001", datetime(2026, 2, 1, 9, 0))],
+        [],
+        [("B001", datetime(2026, 2, 1, 10, 0)), ("A001", None)],
+    ]
+
+    columns = report_vectorized.columnar_from_batches(batches)
+
+    assert columns.station_ids == ["A001", "B001"]
+    assert columns.station_codes.tolist() == [0, 1, 1]
+    assert len(columns) == 3
+
+
+def test_columnar_report_falls_back_without_numpy(monkeypatch):
+    stations = [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+    rules = {"ctype_defaults": {"01": 24}, "day_start_hour": 9}
+    times = [datetime(2026, 2, 1, 9, 0), datetime(2026, 2, 1, 9, 30), datetime(2026, 2, 2, 8, 0)]
+    columns = ColumnarRecords(
+        station_ids=["A001"],
+        station_codes=[0, 0, 0],
+        epoch_minutes=[int((value - report_vectorized.EPOCH).total_seconds() // 60) for value in times],
+    )
+    monkeypatch.setattr(report_vectorized, "_import_numpy", lambda: None)
+
+    report = build_monthly_report_columnar(stations, columns, 2026, 2, rules)
+
+    records = [{"station_id": "A001", "datatime": value} for value in times]
+    assert report == build_monthly_report(stations, records, 2026, 2, rules)
+    assert report["rows"][0]["daily_actual"][0] == 2
@@ -0,0 +1,63 @@
+import pytest
+
+from app.report_view import ReportView, apply_report_view, parse_ctypes
+
+
+def _row(station_id, ctype, expected_total, actual_total):
+    return {
+        "station_id": station_id,
+        "station_name": station_id,
+        "ctype": ctype,
+        "expected_per_day": 24,
+        "daily_actual": [],
+        "expected_total": expected_total,
+        "actual_total": actual_total,
+        "rate": round(actual_total / expected_total * 100, 1),
+    }
+
+
+REPORT = {
+    "year": 2026,
+    "month": 1,
+    "rows": [
+        _row("A001", "01", 744, 700),
+        _row("A002", "ZZ", 1488, 1488),
+        _row("B001", "01", 744, 372),
+        _row("B002", "RR", 372, 372),
+    ],
+}
+
+
+def test_identity_view_returns_report_unchanged():
+    assert apply_report_view(REPORT, ReportView()) is REPORT
+
+
+def test_view_filters_sorts_and_pages():
+    view = ReportView(parse_ctypes(" ZZ,01, "), sort="-rate", offset=1, limit=1)
+    paged = apply_report_view(REPORT, view)
+
+    assert [row["station_id"] for row in paged["rows"]] == ["A001"]
+    assert paged["total_rows"] == 3
+    assert paged["station_count"] == 4
+    assert (paged["offset"], paged["limit"]) == (1, 1)
+    assert paged["year"] == 2026 and len(REPORT["rows"]) == 4
+
+    prefix = apply_report_view(REPORT, ReportView(station_prefix="B", sort="expected_total"))
+    assert [row["station_id"] for row in prefix["rows"]] == ["B002", "B001"]
+
+    below = apply_report_view(REPORT, ReportView(max_rate=100, sort="-actual_total"))
+    assert [row["station_id"] for row in below["rows"]] == ["A001", "B001"]
+    at_least = apply_report_view(REPORT, ReportView(min_rate=100))
+    assert [row["station_id"] for row in at_least["rows"]] == ["A002", "B002"]
+
+
+def test_descending_sort_keeps_report_order_for_ties():
+    paged = apply_report_view(REPORT, ReportView(sort="-rate"))
+    assert [row["station_id"] for row in paged["rows"]] == ["A002", "B002", "A001", "B001"]
+
+
+def test_view_rejects_unknown_sort_and_bad_page():
+    with pytest.raises(ValueError):
+        ReportView(sort="cname")
+    with pytest.raises(ValueError):
+        ReportView(limit=0)
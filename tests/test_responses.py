@@ -0,0 +1,189 @@
+import gzip
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.config_store import save_rules_to_file
+from app.main import create_app
+from app.report_cache import ReportCache
+from app.responses import (
+    ROW_COLUMNS,
+    columnar_report,
+    encode_json,
+    etag_matches,
+    json_response,
+    negotiate_encoding,
+)
+
+
+def _report():
+    return {
+        "year": 2026,
+        "month": 1,
+        "day_start_hour": 8,
+        "days_in_month": 2,
+        "day_headers": [1, 2],
+        "rows": [
+            {
+                "station_id": f"S{index:04d}",
+                "station_name": f"测站{index}",
+                "ctype": "01",
+                "expected_per_day": 24,
+                "daily_actual": [24, index % 24],
+                "expected_total": 48,
+                "actual_total": 24 + index % 24,
+                "rate": round((24 + index % 24) / 48 * 100, 2),
+            }
+            for index in range(200)
+        ],
+    }
+
+
+def test_columnar_report_round_trips_rows():
+    report = _report()
+    columnar = columnar_report(report)
+
+    assert columnar["shape"] == "columnar"
+    assert columnar["day_headers"] == [1, 2]
+    rebuilt = [
+        {
+            **{column: columnar["columns"][column][index] for column in ROW_COLUMNS},
+            "daily_actual": columnar["daily_actual"][index],
+        }
+        for index in range(len(report["rows"]))
+    ]
+    assert rebuilt == report["rows"]
+    assert len(encode_json(columnar)) < len(encode_json(report)) * 0.6
+
+
+def test_negotiate_encoding_respects_quality_values():
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("deflate, gzip;q=0") is None
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("*") in {"br", "gzip"}
+
+
+def test_json_response_compresses_and_tags_each_coding():
+    response, timings = json_response(_report(), accept_encoding="gzip", etag_from_content=True)
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].endswith('-gzip"')
+    assert gzip.decompress(response.body) == encode_json(_report())
+    assert set(timings) == {"serialize", "compress"}
+
+    plain, _ = json_response({"rows": []}, accept_encoding="gzip", etag_from_content=True)
+    assert "content-encoding" not in plain.headers
+    assert etag_matches(response.headers["etag"], plain.headers["etag"]) is False
+    assert etag_matches(response.headers["etag"], response.headers["etag"].replace("-gzip", ""))
+
+
+class CountingRepo:
+    def __init__(self, station_errors=0):
+        self.record_fetches = 0
+        self.station_errors = station_errors
+        self.minutes = [0]
+
+    def fetch_stations(self):
+        if self.station_errors:
+            self.station_errors -= 1
+            raise ConnectionError("database unavailable")
+        return [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+
+    def fetch_records(self, start, end, sourcetype_filter):
+        self.record_fetches += 1
+        return [
+            {"station_id": "A001", "datatime": start + timedelta(minutes=minutes)}
+            for minutes in self.minutes
+        ]
+
+
+def _client(tmp_path: Path, repo: CountingRepo) -> TestClient:
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24}, "day_start_hour": 8})
+    app = create_app(
+        config_path=config_file,
+        repository_factory=lambda: repo,
+        report_aggregation="python",
+        report_cache=ReportCache(tmp_path / "reports.sqlite3"),
+    )
+    return TestClient(app)
+
+
+def test_settled_month_revalidates_without_rebuilding(tmp_path: Path):
+    repo = CountingRepo()
+    client = _client(tmp_path, repo)
+    params = {"year": 2025, "month": 1, "shape": "columnar"}
+
+    first = client.get("/api/report/monthly", params=params)
+    assert first.status_code == 200
+    assert first.json()["columns"]["station_id"] == ["A001"]
+    assert first.headers["cache-control"] == "no-cache"
+    assert repo.record_fetches == 1
+
+    second = client.get(
+        "/api/report/monthly", params=params, headers={"If-None-Match": first.headers["etag"]}
+    )
+    assert second.status_code == 304
+    assert second.headers["etag"].strip('"') in first.headers["etag"]
+    assert repo.record_fetches == 1
+
+    rows = client.get(
+        "/api/report/monthly",
+        params={**params, "shape": "rows"},
+        headers={"If-None-Match": first.headers["etag"]},
+    )
+    assert rows.status_code == 200
+    assert rows.json()["rows"][0]["station_id"] == "A001"
+
+
+def test_invalidated_month_is_not_revalidated_with_the_old_tag(tmp_path: Path):
+    repo = CountingRepo()
+    client = _client(tmp_path, repo)
+    params = {"year": 2025, "month": 1}
+    first = client.get("/api/report/monthly", params=params)
+
+    # A late backfill, then the operator drops the cached month.
+    repo.minutes.append(60)
+    client.delete("/api/report/cache", params=params).raise_for_status()
+    stale = client.get(
+        "/api/report/monthly", params=params, headers={"If-None-Match": first.headers["etag"]}
+    )
+
+    assert stale.status_code == 200
+    assert stale.json()["rows"][0]["actual_total"] == 2
+    assert stale.headers["etag"] != first.headers["etag"]
+    again = client.get(
+        "/api/report/monthly", params=params, headers={"If-None-Match": stale.headers["etag"]}
+    )
+    assert again.status_code == 304
+    assert repo.record_fetches == 2
+
+
+def test_failed_settled_precheck_falls_through_to_the_build(tmp_path: Path):
+    repo = CountingRepo(station_errors=1)
+    client = _client(tmp_path, repo)
+
+    response = client.get(
+        "/api/report/monthly", params={"year": 2025, "month": 1}, headers={"If-None-Match": '"x"'}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["rows"][0]["station_id"] == "A001"
+    assert repo.record_fetches == 1
+
+
+def test_open_month_is_tagged_from_its_content(tmp_path: Path):
+    repo = CountingRepo()
+    client = _client(tmp_path, repo)
+    now = datetime.now()
+    params = {"year": now.year, "month": now.month}
+
+    first = client.get("/api/report/monthly", params=params)
+    second = client.get(
+        "/api/report/monthly", params=params, headers={"If-None-Match": first.headers["etag"]}
+    )
+
+    assert second.status_code == 304
+    assert repo.record_fetches == 2
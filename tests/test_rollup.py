@@ -0,0 +1,129 @@
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.config_store import save_rules_to_file
+from app.main import _build_report, create_app
+from app.report_cache import ReportCache
+from app.report_logic import compile_rules
+from app.rollup import DailyRollupStore, RollupScheduler, roll_up_closed_days, rollup_key
+from benchmarks.synthetic import SyntheticConfig, SyntheticRepository
+
+RULES = {"ctype_defaults": {"01": 24, "ZZ": 48, "RR": 12, "PP": 288, "*": 24}, "day_start_hour": 8}
+
+
+class CountingRepo(SyntheticRepository):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slot_count_windows: list[tuple[datetime, datetime]] = []
+
+    def fetch_slot_counts(self, start, end, *args):
+        self.slot_count_windows.append((start, end))
+        return super().fetch_slot_counts(start, end, *args)
+
+
+def _repo() -> CountingRepo:
+    return CountingRepo.from_config(SyntheticConfig(stations=10, year=2026, month=1, seed=3))
+
+
+def test_hydro_day_close_times_include_settle_delay(tmp_path: Path):
+    store = DailyRollupStore(
+        tmp_path / "rollups.sqlite3", settle_minutes=30, now=lambda: datetime(2026, 1, 20, 8, 29)
+    )
+
+    assert store.last_closed_day(8) == date(2026, 1, 18)
+    assert store.is_day_closed(date(2026, 1, 18), 8)
+    assert not store.is_day_closed(date(2026, 1, 19), 8)
+    assert store.next_close(8) == datetime(2026, 1, 20, 8, 30)
+
+
+def test_month_is_assembled_from_rollups_and_an_open_tail(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, RULES)
+    store = DailyRollupStore(tmp_path / "rollups.sqlite3", now=lambda: datetime(2026, 1, 20, 10))
+    repo = _repo()
+
+    expected = _build_report(repo, config_file, 2026, 1, "python")
+    assert _build_report(repo, config_file, 2026, 1, rollups=store) == expected
+    assert repo.slot_count_windows == [
+        (datetime(2026, 1, 1, 8), datetime(2026, 1, 20, 8)),
+        (datetime(2026, 1, 20, 8), datetime(2026, 2, 1, 8)),
+    ]
+
+    repo.slot_count_windows.clear()
+    assert _build_report(repo, config_file, 2026, 1, rollups=store) == expected
+    assert repo.slot_count_windows == [(datetime(2026, 1, 20, 8), datetime(2026, 2, 1, 8))]
+
+
+def test_rollups_are_versioned_by_expected_rates(tmp_path: Path):
+    repo = _repo()
+    stations = repo.fetch_stations()
+    rules = compile_rules(RULES)
+
+    renamed = [{**station, "cname": "x"} for station in stations]
+    assert rollup_key(rules, renamed, "1") == rollup_key(rules, stations, "1")
+    assert rollup_key(rules, stations, "2") != rollup_key(rules, stations, "1")
+    changed = compile_rules({**RULES, "ctype_defaults": {"*": 96}})
+    assert rollup_key(changed, stations, "1") != rollup_key(rules, stations, "1")
+
+
+def test_backfill_splits_queries_at_month_boundaries_and_skips_stored_days(tmp_path: Path):
+    store = DailyRollupStore(tmp_path / "rollups.sqlite3", now=lambda: datetime(2026, 2, 3, 12))
+    repo = _repo()
+    stations = repo.fetch_stations()
+    rules = compile_rules(RULES)
+
+    computed = roll_up_closed_days(store, repo, stations, rules, "1", date(2026, 1, 30))
+
+    assert computed == [date(2026, 1, 30), date(2026, 1, 31), date(2026, 2, 1), date(2026, 2, 2)]
+    assert repo.slot_count_windows == [
+        (datetime(2026, 1, 30, 8), datetime(2026, 2, 1, 8)),
+        (datetime(2026, 2, 1, 8), datetime(2026, 2, 3, 8)),
+    ]
+    assert roll_up_closed_days(store, repo, stations, rules, "1", date(2026, 1, 30)) == []
+    assert store.stats()["versions"][0]["days"] == 4
+
+
+def test_scheduler_reports_next_run_and_errors():
+    now = datetime(2026, 1, 20, 9)
+    calls = []
+
+    def run():
+        calls.append(True)
+        if len(calls) == 2:
+            raise RuntimeError("database unavailable")
+        return datetime(2026, 1, 21, 8, 30)
+
+    scheduler = RollupScheduler(run, max_sleep_seconds=3600, retry_seconds=60, now=lambda: now)
+    scheduler.run_once()
+    assert scheduler.stats()["next_run"] == "2026-01-20T10:00:00"
+    assert scheduler.stats()["last_error"] is None
+
+    scheduler.run_once()
+    assert scheduler.stats()["next_run"] == "2026-01-20T09:01:00"
+    assert scheduler.stats()["last_error"] == "RuntimeError: database unavailable"
+
+
+def test_rollup_scheduler_runs_with_the_app_lifespan(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, RULES)
+    store = DailyRollupStore(tmp_path / "rollups.sqlite3")
+    repo = _repo()
+    app = create_app(
+        config_path=config_file,
+        repository_factory=lambda: repo,
+        report_cache=ReportCache(tmp_path / "reports.sqlite3"),
+        daily_rollups=store,
+    )
+
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 5
+        while app.state.rollup_scheduler.stats()["runs"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = client.get("/api/report/rollups").json()
+        assert stats["scheduler"]["runs"] == 1
+        assert stats["scheduler"]["last_error"] is None
+        assert stats["versions"][0]["days"] == 3
+        assert client.delete("/api/report/rollups").json() == {"deleted_days": 3}
@@ -0,0 +1,161 @@
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.config_store import save_rules_to_file
+from app.incremental import IncrementalReportStore
+from app.main import _build_report, create_app
+from app.report_cache import ReportCache
+from app.shared_cache import SharedCache
+from app.station_catalog import StationCatalog
+
+
+class FakeRepo:
+    def __init__(self, delay=0.0):
+        self.stations = [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+        self.delay = delay
+        self.fetches = 0
+        self.queries = 0
+
+    def fetch_stations(self):
+        self.fetches += 1
+        return list(self.stations)
+
+    def probe_stations(self):
+        return len(self.stations), "checksum"
+
+    def fetch_records(self, start, end, sourcetype_filter):
+        self.queries += 1
+        time.sleep(self.delay)
+        return [{"station_id": "A001", "datatime": datetime(2026, 1, 1, 9, 5)}]
+
+
+def test_lease_gives_single_flight_across_cache_handles(tmp_path: Path):
+    # Separate handles on one file behave like separate worker processes.
+    path = tmp_path / "shared.sqlite3"
+    workers = [SharedCache(path, poll_seconds=0.01) for _ in range(4)]
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda cache=cache: results.append(cache.get_or_build("report", "k", build, 60))
+        )
+        for cache in workers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [{"value": 42}] * 4
+    assert len(builds) == 1
+    assert sum(cache.stats()["process"]["waited"] for cache in workers) == 3
+    assert workers[0].stats()["namespaces"] == [
+        {"namespace": "report", "entries": 1, "bytes": workers[0].stats()["namespaces"][0]["bytes"]}
+    ]
+    assert workers[0].stats()["active_leases"] == 0
+
+
+def test_uncacheable_results_expired_entries_and_stale_leases(tmp_path: Path):
+    now = [1000.0]
+    cache = SharedCache(tmp_path / "shared.sqlite3", lease_seconds=30, clock=lambda: now[0])
+
+    def complete(report):
+        return not report["partial"]
+
+    partial = cache.get_or_build("report", "k", lambda: {"partial": True}, 60, cacheable=complete)
+    assert partial == {"partial": True}
+    assert cache.get("report", "k") is None
+    cache.get_or_build("report", "k", lambda: {"partial": False}, 60, cacheable=complete)
+    assert cache.get("report", "k") == {"partial": False}
+
+    cache.put("report", "k", {"partial": False}, ttl=10)
+    now[0] += 11
+    assert cache.get("report", "k") is None
+    assert cache.stats()["namespaces"] == []
+
+    # A worker that died holding a lease does not block the others for good.
+    assert cache.acquire("report:k") is not None
+    assert cache.acquire("report:k") is None
+    now[0] += 31
+    assert cache.acquire("report:k") is not None
+
+
+def test_catalog_reuses_stations_loaded_by_another_worker(tmp_path: Path):
+    shared = SharedCache(tmp_path / "shared.sqlite3")
+    repo = FakeRepo()
+    first = StationCatalog(ttl_seconds=60, shared=shared)
+    second = StationCatalog(ttl_seconds=60, shared=shared)
+
+    first.get(repo)
+    assert second.get(repo) == repo.stations
+    assert repo.fetches == 1
+    assert second.stats()["shared_hits"] == 1
+
+    repo.stations = repo.stations + [{"station_id": "B001", "cname": "乙站", "ctype": "01"}]
+    third = StationCatalog(ttl_seconds=60, shared=shared)
+    assert len(third.get(repo)) == 2
+    assert repo.fetches == 2
+
+
+def test_report_built_by_one_worker_is_reused_by_another(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24}, "day_start_hour": 9})
+    path = tmp_path / "shared.sqlite3"
+    repo = FakeRepo(delay=0.1)
+
+    def worker():
+        return _build_report(
+            repo,
+            config_file,
+            2026,
+            1,
+            incremental=IncrementalReportStore(),
+            catalog=StationCatalog(shared=SharedCache(path)),
+            shared=SharedCache(path, poll_seconds=0.01),
+        )
+
+    reports = []
+    threads = [threading.Thread(target=lambda: reports.append(worker())) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert repo.queries == 1
+    assert [report["rows"][0]["actual_total"] for report in reports] == [1, 1, 1]
+
+    _build_report(repo, config_file, 2026, 1, full_refresh=True, shared=SharedCache(path))
+    assert repo.queries == 2
+
+
+def test_invalidating_a_month_keeps_other_months_shared_reports(tmp_path: Path):
+    shared = SharedCache(tmp_path / "shared.sqlite3")
+    for key in ("2025-01/k", "2026-01/k", "2026-02/k"):
+        shared.put("report", key, {"rows": []}, ttl=60)
+    shared.put("stations", "2026-01/k", {"rows": []}, ttl=60)
+    client = TestClient(
+        create_app(
+            config_path=tmp_path / "report_rules.json",
+            repository_factory=FakeRepo,
+            report_cache=ReportCache(tmp_path / "reports.sqlite3"),
+            shared_cache=shared,
+        )
+    )
+
+    assert client.delete("/api/report/cache", params={"month": 1}).json()["removed"] == 2
+    assert shared.get("report", "2026-02/k") == {"rows": []}
+    assert shared.get("stations", "2026-01/k") == {"rows": []}
+    assert client.delete("/api/report/cache", params={"year": 2026}).json()["removed"] == 1
+    assert shared.stats()["namespaces"] == [
+        {"namespace": "stations", "entries": 1, "bytes": shared.stats()["namespaces"][0]["bytes"]}
+    ]
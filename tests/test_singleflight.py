@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.report_cache import ReportCache
+from app.singleflight import ReportOverloadedError, SingleFlightScheduler
+
+
+def test_identical_requests_share_one_build():
+    calls = []
+
+    def build():
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        return {"rows": []}
+
+    async def main():
+        scheduler = SingleFlightScheduler(max_concurrent=2)
+        results = await asyncio.gather(*[scheduler.run(("monthly", 2026, 1), build) for _ in range(5)])
+        return scheduler, results
+
+    scheduler, results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert scheduler.stats()["coalesced"] == 4
+    assert scheduler.stats()["inflight"] == 0
+
+
+def test_scheduler_rejects_when_queue_is_full():
+    release = threading.Event()
+
+    def build():
+        release.wait(timeout=2)
+        return "done"
+
+    async def main():
+        scheduler = SingleFlightScheduler(max_concurrent=1, max_pending=1)
+        first = asyncio.ensure_future(scheduler.run("a", build))
+        second = asyncio.ensure_future(scheduler.run("b", build))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ReportOverloadedError):
+            await scheduler.run("c", build)
+        release.set()
+        return await asyncio.gather(first, second), scheduler.stats()
+
+    results, stats = asyncio.run(main())
+
+    assert results == ["done", "done"]
+    assert stats["rejected"] == 1
+
+
+def test_scheduler_errors_reach_every_waiter():
+    def build():
+        time.sleep(0.02)
+        raise RuntimeError("db down")
+
+    async def main():
+        scheduler = SingleFlightScheduler()
+        return await asyncio.gather(
+            scheduler.run("k", build), scheduler.run("k", build), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+
+    assert [str(result) for result in results] == ["db down", "db down"]
+
+
+def test_monthly_endpoint_runs_through_scheduler(tmp_path: Path):
+    class FakeRepo:
+        def fetch_stations(self):
+            return [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+
+        def fetch_records(self, start, end, sourcetype_filter):
+            return [{"station_id": "A001", "datatime": datetime(2026, 1, 1, 10, 0)}]
+
+    app = create_app(
+        config_path=tmp_path / "report_rules.json",
+        repository_factory=FakeRepo,
+        report_cache=ReportCache(tmp_path / "reports.sqlite3"),
+    )
+    client = TestClient(app)
+
+    response = client.get("/api/report/monthly", params={"year": 2026, "month": 1})
+
+    assert response.status_code == 200
+    assert response.json()["rows"][0]["actual_total"] == 1
+    assert client.get("/api/report/scheduler").json()["started"] == 1
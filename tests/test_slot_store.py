@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+
+from app.report_logic import SlotAggregator
+from app.slot_store import SlotBitmap
+
+
+def test_slot_bitmap_counts_and_lists_slots():
+    bitmap = SlotBitmap(["A001", "B001"], days=31, max_slots=96)
+
+    for slot in (0, 5, 5, 63, 64, 95):
+        assert bitmap.add_slot("B001", 31, slot)
+    assert not bitmap.add_slot("C001", 1, 0)
+    assert not bitmap.add_slot("A001", 32, 0)
+    assert not bitmap.add_slot("A001", 1, 96)
+
+    assert bitmap.words_per_cell == 2
+    assert bitmap.count("B001", 31) == 5
+    assert bitmap.slots("B001", 31) == [0, 5, 63, 64, 95]
+    assert bitmap.contains("B001", 31, 64)
+    assert not bitmap.contains("A001", 31, 64)
+    assert list(bitmap.iter_counts()) == [("B001", 31, 5)]
+
+
+def test_slot_bitmap_union_and_roundtrip():
+    left = SlotBitmap(["A001", "B001"], days=28, max_slots=48)
+    right = SlotBitmap(["A001", "B001"], days=28, max_slots=48)
+    left.add_slot("A001", 1, 3)
+    right.add_slot("A001", 1, 3)
+    right.add_slot("A001", 1, 47)
+    right.add_slot("B001", 28, 0)
+
+    left |= right
+
+    assert left.daily_counts("A001")[0] == 2
+    assert left.count("B001", 28) == 1
+
+    restored = SlotBitmap.from_bytes(["A001", "B001"], 28, 48, left.to_bytes())
+    assert list(restored.iter_counts()) == list(left.iter_counts())
+
+    with pytest.raises(ValueError):
+        left.union_update(SlotBitmap(["A001"], days=28, max_slots=48))
+
+
+def test_slot_aggregators_merge_partial_results():
+    expected = {"A001": 24, "B001": 48}
+    first = SlotAggregator(expected, 2026, 1, 9)
+    second = SlotAggregator(expected, 2026, 1, 9)
+    first.add_batch([("A001", datetime(2026, 1, 1, 9, 10)), ("B001", datetime(2026, 1, 5, 9, 10))])
+    second.add_batch([("A001", datetime(2026, 1, 1, 9, 50)), ("A001", datetime(2026, 1, 1, 10, 0))])
+
+    merged = first.merge(second)
+
+    assert merged.daily_counts() == {("A001", 1): 2, ("B001", 5): 1}
+    assert merged.rows_seen == 4
+    assert merged.max_data_time == datetime(2026, 1, 5, 9, 10)
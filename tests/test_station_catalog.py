@@ -0,0 +1,108 @@
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.config_store import save_rules_to_file
+from app.main import create_app
+from app.report_cache import ReportCache
+from app.station_catalog import StationCatalog
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRepo:
+    def __init__(self):
+        self.stations = [{"station_id": "A001", "cname": "甲站", "ctype": "01"}]
+        self.fetches = 0
+        self.probes = 0
+
+    def fetch_stations(self):
+        self.fetches += 1
+        return list(self.stations)
+
+    def probe_stations(self):
+        self.probes += 1
+        return len(self.stations), hash(tuple(s["station_id"] for s in self.stations))
+
+    def fetch_records(self, start, end, sourcetype_filter):
+        return []
+
+
+def test_catalog_serves_cached_stations_within_ttl():
+    clock = FakeClock()
+    catalog = StationCatalog(ttl_seconds=60, clock=clock)
+    repo = FakeRepo()
+
+    first = catalog.get(repo)
+    clock.now = 59
+    second = catalog.get(repo)
+
+    assert first is second
+    assert (repo.fetches, repo.probes) == (1, 1)
+    assert catalog.stats()["hits"] == 1
+
+
+def test_catalog_probes_after_ttl_and_refetches_only_on_change():
+    clock = FakeClock()
+    catalog = StationCatalog(ttl_seconds=60, clock=clock)
+    repo = FakeRepo()
+    catalog.get(repo)
+
+    clock.now = 61
+    assert catalog.get(repo)[0]["station_id"] == "A001"
+    assert repo.fetches == 1
+    assert catalog.version == 1
+
+    repo.stations.append({"station_id": "B001", "cname": "乙站", "ctype": "99"})
+    clock.now = 200
+    assert len(catalog.get(repo)) == 2
+    assert repo.fetches == 2
+    assert catalog.version == 2
+
+
+def test_catalog_without_probe_refetches_after_ttl():
+    class NoProbeRepo:
+        fetches = 0
+
+        def fetch_stations(self):
+            NoProbeRepo.fetches += 1
+            return [{"station_id": "A001"}]
+
+    clock = FakeClock()
+    catalog = StationCatalog(ttl_seconds=10, clock=clock)
+    catalog.get(NoProbeRepo())
+    catalog.get(NoProbeRepo())
+    clock.now = 11
+    catalog.get(NoProbeRepo())
+
+    assert NoProbeRepo.fetches == 2
+
+
+def test_config_endpoint_skips_stations_when_rules_file_exists(tmp_path: Path):
+    config_file = tmp_path / "report_rules.json"
+    save_rules_to_file(config_file, {"ctype_defaults": {"01": 24, "*": 48}})
+    repo = FakeRepo()
+    app = create_app(
+        config_path=config_file,
+        repository_factory=lambda: repo,
+        report_cache=ReportCache(tmp_path / "reports.sqlite3"),
+    )
+    client = TestClient(app)
+
+    assert client.get("/api/config").status_code == 200
+    assert repo.fetches == 0
+
+    for _ in range(3):
+        assert client.get("/api/report/monthly", params={"year": 2026, "month": 1}).status_code == 200
+    assert repo.fetches == 1
+
+    regenerated = client.post("/api/config/regenerate").json()
+    assert regenerated["station_daily_expected"] == {"A001": 24}
+    assert repo.fetches == 1
+    assert client.get("/api/stations/cache").json()["probes"] == 1